@@ -0,0 +1,72 @@
+"""
+Import-time benchmark for the backtest/optimize startup path.
+
+Runs each strategy's imports in a fresh interpreter and reports the median wall time and
+whether pandas_ta was pulled in. With --max-seconds, exits non-zero when a strategy other
+than OBV exceeds the budget, so slow imports creeping back into the registry are caught.
+
+    python benchmarks/import_time.py --runs 5 --max-seconds 1.5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+from strategies import available_strategies
+
+SNIPPET = '''
+import sys, time
+start = time.perf_counter()
+import core.backtester, core.optimizer
+from strategies import get_strategy
+get_strategy({name!r})
+print(time.perf_counter() - start, 'pandas_ta' in sys.modules)
+'''
+
+
+def measure(name: str, runs: int):
+    """Return the per-run import times of a strategy and whether pandas_ta was imported."""
+    times = []
+    loads_pandas_ta = False
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', SNIPPET.format(name=name)], cwd=PYTHON_DIR,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        elapsed, pandas_ta = result.stdout.split()
+        times.append(float(elapsed))
+        loads_pandas_ta = pandas_ta == 'True'
+    return times, loads_pandas_ta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='fail if a non-OBV strategy takes longer than this to import')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'strategy':<20}{'median s':>10}{'min s':>10}  pandas_ta")
+    for name in available_strategies():
+        try:
+            times, loads_pandas_ta = measure(name, args.runs)
+        except RuntimeError as e:
+            print(f'{name:<20}{"error":>10}{"":>10}  {e}')
+            continue
+
+        median = statistics.median(times)
+        print(f'{name:<20}{median:>10.3f}{min(times):>10.3f}  {loads_pandas_ta}')
+
+        if name != 'obv' and (loads_pandas_ta or (args.max_seconds and median > args.max_seconds)):
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of the NSGA-II selection step: pairwise versus sweep non-dominated sorting, and loop
+versus NumPy crowding distance, per population size. Objectives are random with ties and a share
+of penalized (-inf, inf) individuals, like an optimizer population; both versions are checked to
+return the same fronts and distances.
+
+    python benchmarks/nsga2_sorting.py --sizes 500 1000 2000 5000
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.genetic_utils import (calculate_crowding_distance, calculate_crowding_distance_loop,
+                                non_dominated_sorting, non_dominated_sorting_pairwise)
+from models.result import BacktestResult
+
+
+def random_population(size: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    pnls = np.round(rng.normal(0, 20, size), 1).tolist()
+    drawdowns = np.round(np.abs(rng.normal(0, 10, size)), 1).tolist()
+    population = []
+    for pnl, drawdown, penalized in zip(pnls, drawdowns, rng.random(size) < 0.05):
+        individual = BacktestResult()
+        individual.pnl, individual.max_drawdown = (-float('inf'), float('inf')) if penalized else (pnl, drawdown)
+        population.append(individual)
+    return population
+
+
+def select(population: list, sorting, crowding) -> tuple:
+    start = time.perf_counter()
+    fronts = sorting(dict(enumerate(population)))
+    sorted_at = time.perf_counter()
+    for front in fronts:
+        crowding(front)
+    done = time.perf_counter()
+    return fronts, sorted_at - start, done - sorted_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 1000, 2000, 5000])
+    args = parser.parse_args()
+
+    print(f"{'size':>7}{'fronts':>8}{'pairwise s':>12}{'sweep s':>10}{'loop cd s':>11}{'numpy cd s':>12}")
+    for size in args.sizes:
+        reference = random_population(size)
+        population = copy.deepcopy(reference)
+        old_fronts, old_sort, old_crowding = select(reference, non_dominated_sorting_pairwise, calculate_crowding_distance_loop)
+        new_fronts, new_sort, new_crowding = select(population, non_dominated_sorting, calculate_crowding_distance)
+
+        index = {id(individual): i for i, individual in enumerate(reference)}
+        index.update({id(individual): i for i, individual in enumerate(population)})
+        assert [[index[id(x)] for x in front] for front in old_fronts] == [[index[id(x)] for x in front] for front in new_fronts]
+        # Fronts of tied penalized individuals get NaN distances (inf - inf) in both versions
+        assert np.array_equal([x.crowding_distance for x in reference], [x.crowding_distance for x in population],
+                              equal_nan=True)
+
+        print(f'{size:>7}{len(new_fronts):>8}{old_sort:>12.3f}{new_sort:>10.3f}{old_crowding:>11.3f}{new_crowding:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Scaling benchmark for PopulationPool: wall time of evaluating one population per worker count,
+on a synthetic random walk. Pool start-up is timed separately from the evaluation.
+
+Evaluation time should fall close to linearly with the workers, up to the core count.
+
+    python benchmarks/parallel_evaluation.py --strategy support_resistance --population 64 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.parallel import PopulationPool
+from strategies import get_strategy
+from strategies.candles import candle_arrays
+
+
+def random_walk(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = np.cumsum(rng.normal(0, 20, size)) + 30000
+    return pd.DataFrame({'open': close, 'high': close + rng.random(size) * 30, 'low': close - rng.random(size) * 30,
+                         'close': close, 'volume': rng.random(size)},
+                        index=pd.date_range('2020-01-01', periods=size, freq='1min'))
+
+
+def random_population(strategy, size: int) -> list:
+    population = []
+    for _ in range(size):
+        params = {}
+        for code, param in strategy.params.items():
+            if param['type'] == int:
+                params[code] = random.randint(param['min'], param['max'])
+            else:
+                params[code] = round(random.uniform(param['min'], param['max']), param.get('decimal', 2))
+        population.append(strategy.validate_params(params))
+    return population
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strategy', default='support_resistance')
+    parser.add_argument('--candles', type=int, default=50_000)
+    parser.add_argument('--population', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    random.seed(0)
+    candles = candle_arrays(random_walk(args.candles))
+    population = random_population(get_strategy(args.strategy)(), args.population)
+
+    baseline = None
+    print(f"{'workers':>8}{'start s':>10}{'eval s':>10}{'speedup':>10}")
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        with PopulationPool(args.strategy, candles, workers) as pool:
+            # Warm-up: worker start-up, imports and JIT compilation
+            pool.evaluate(population[:workers])
+            started = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = pool.evaluate(population)
+            elapsed = time.perf_counter() - start
+
+        baseline = baseline or (elapsed, results)
+        assert results == baseline[1], 'results depend on the worker count'
+        print(f'{workers:>8}{started:>10.2f}{elapsed:>10.2f}{baseline[0] / elapsed:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
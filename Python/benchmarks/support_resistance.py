@@ -0,0 +1,46 @@
+"""
+Scaling benchmark for SupResStrategy: backtest time per candle count on a synthetic random walk.
+
+Time per candle should stay roughly flat as the history grows.
+
+    python benchmarks/support_resistance.py --sizes 10000 40000 160000 640000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strategies.support_resistance import SupResStrategy
+
+
+def random_walk(size: int, seed: int = 0) -> pd.DataFrame:
+    """1m candles of a random walk around 30000, volatile enough to form and break levels."""
+    rng = np.random.default_rng(seed)
+    close = np.cumsum(rng.normal(0, 20, size)) + 30000
+    return pd.DataFrame({'open': close, 'high': close + rng.random(size) * 30, 'low': close - rng.random(size) * 30,
+                         'close': close, 'volume': 1.0},
+                        index=pd.date_range('2020-01-01', periods=size, freq='1min'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 40_000, 160_000, 640_000])
+    args = parser.parse_args()
+
+    strategy = SupResStrategy()
+    print(f"{'candles':>10}{'seconds':>10}{'us/candle':>12}{'pnl %':>10}")
+    for size in args.sizes:
+        df = random_walk(size)
+        start = time.perf_counter()
+        pnl, _ = strategy.backtest(df)
+        elapsed = time.perf_counter() - start
+        print(f'{size:>10}{elapsed:>10.2f}{elapsed / size * 1e6:>12.2f}{pnl:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
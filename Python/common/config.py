@@ -24,6 +24,54 @@ TIMEFRAMES = {
 
 TIMEFRAME_OPTIONS = list(TIMEFRAMES.keys())
 
-STRATEGIES = ['obv', 'ichimoku', 'support_resistance', 'sma', 'psar']
+ONE_MINUTE_MS = 60000
 
 EXCHANGES = ['binance', 'okx']
+
+# HTTP client: (connect, read) timeouts in seconds, retries with exponential backoff for
+# connection errors and 5xx responses, and keep-alive connections per exchange
+HTTP_SETTINGS = {
+    'timeout': (3.05, 10),
+    'retries': 5,
+    'backoff_factor': 0.5,
+    'pool_size': 16,
+}
+
+# Request budget per exchange: weight units per minute shared by all clients of a
+# process, how many requests the async collector keeps in flight and how many
+# symbols the scheduler collects at once
+RATE_LIMITS = {
+    'binance': {'weight_per_minute': 2400, 'concurrency': 8, 'parallel_symbols': 4},
+    'okx': {'weight_per_minute': 1200, 'concurrency': 8, 'parallel_symbols': 4},
+}
+
+# Exchange symbol lists are cached in data/symbols_<exchange>_<market>.json for this many seconds
+SYMBOL_CACHE_TTL = 24 * 60 * 60
+
+# Memory budget of the per-process indicator cache (strategies/indicators.py)
+INDICATOR_CACHE_BYTES = 512 * 1024 * 1024
+
+# Upper bound on the temporary arrays of one block of a batched backtest (e.g. the SMA grid)
+BATCH_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Processes evaluating an optimizer population (core/parallel.py). 1 evaluates in the main
+# process; a pool is opt-in, as starting it costs seconds that only long runs on large data win
+# back: set the process count, or 0 for every core. Each generation is split into about this
+# many chunks per worker, enough to balance the load while batched strategies still get
+# sizeable batches
+OPTIMIZER_WORKERS = 1
+OPTIMIZER_CHUNKS_PER_WORKER = 4
+
+# Optimizer runs save their population, RNG state and evaluated results to
+# data/checkpoints/ every this many generations (and when they finish), to resume a stopped
+# run or seed a new one from its last Pareto front
+CHECKPOINT_DIR = os.path.join(DATA_DIR, 'checkpoints')
+CHECKPOINT_EVERY = 10
+
+# SQLite store of optimizer results (core/fitness_cache.py), reused by later runs on the same
+# candles; None keeps results in memory for the current run only
+FITNESS_STORE = os.path.join(DATA_DIR, 'fitness.sqlite')
+
+# Candle storage backend: 'hdf5' (data/<exchange>.h5) or 'columnar' (memory-mapped
+# data/<exchange>_columnar/, built from the HDF5 file with the 'convert' mode)
+STORAGE_BACKEND = 'hdf5'
@@ -0,0 +1,16 @@
+"""Optional Numba JIT: kernels are compiled when numba is installed and run as plain Python otherwise."""
+try:
+    from numba import njit, prange, set_num_threads
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def set_num_threads(n: int) -> None:
+        """Stand-in for numba.set_num_threads; there are no kernel threads to limit."""
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda function: function
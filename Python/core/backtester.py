@@ -1,24 +1,10 @@
 """Backtesting module for running strategy backtests."""
 import logging
-from services.database import Hdf5Client
-from common.utils import resample_timeframe
-
-from strategies.obv import ObvStrategy
-from strategies.ichimoku import IchimokuStrategy
-from strategies.support_resistance import SupResStrategy
-from strategies.sma import SmaStrategy
-from strategies.psar import PsarStrategy
+from services.storage import get_storage_client
+from strategies import get_strategy
 
 logger = logging.getLogger()
 
-STRATEGY_MAP = {
-    'obv': ObvStrategy,
-    'ichimoku': IchimokuStrategy,
-    'support_resistance': SupResStrategy,
-    'sma': SmaStrategy,
-    'psar': PsarStrategy
-}
-
 def get_params(strategy_instance) -> dict:
     """Prompt user for strategy parameters."""
     params = {}
@@ -49,23 +35,23 @@ def run(exchange: str, symbol: str, strategy: str, timeframe: str,
     Returns:
         Tuple of (pnl%, max_drawdown%)
     """
-    if strategy not in STRATEGY_MAP:
+    try:
+        strategy_class = get_strategy(strategy)
+    except KeyError:
         logger.error(f"Strategy {strategy} not found")
         return 0.0, 0.0
 
     # Instantiate strategy
-    strategy_instance = STRATEGY_MAP[strategy]()
+    strategy_instance = strategy_class()
 
     # Get data
-    client = Hdf5Client(exchange)
-    df = client.get_data(symbol, start_time, end_time)
+    client = get_storage_client(exchange, readonly=True)
+    df = client.get_data(symbol, start_time, end_time, timeframe)
     
     if df is None or df.empty:
         logger.error(f"No data found for {symbol}")
         return 0.0, 0.0
     
-    df = resample_timeframe(df, timeframe)
-    
     # Get parameters and run
     params = get_params(strategy_instance)
     
@@ -0,0 +1,141 @@
+"""
+Fitness cache for the optimizer.
+
+Parameter sets are reduced to a canonical, hashable key, so duplicates are found with one set
+lookup and each set is backtested at most once per run. With a store path, results also go to
+a SQLite table keyed by the dataset (exchange, symbol, timeframe and the row count, time range
+and a checksum of the candles actually loaded), the strategy with a checksum of its scoring
+code, and the parameters, so repeated and resumed optimizations reuse them, and results of
+older candles or code are never read back.
+"""
+from importlib import metadata
+import inspect
+import json
+import logging
+import sqlite3
+import sys
+import types
+import typing
+import zlib
+
+import numpy as np
+
+from common.config import FITNESS_STORE
+from strategies.base import AbstractStrategy
+
+logger = logging.getLogger()
+
+ParamKey = typing.Tuple[typing.Tuple[str, typing.Any], ...]
+Fitness = typing.Tuple[float, float]
+
+
+def _canonical(value: typing.Any) -> typing.Any:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        # 2 and 2.0 are the same parameter value
+        return int(value)
+    return value
+
+
+def param_key(params: typing.Dict) -> ParamKey:
+    """Hashable key of a parameter set, independent of the dict's order and of numpy/float types."""
+    return tuple(sorted((name, _canonical(value)) for name, value in params.items()))
+
+
+def dataset_version(timestamps: np.ndarray, close: np.ndarray) -> str:
+    """Identifies the candles a result was computed on: row count, time range and a checksum of the closes."""
+    if len(timestamps) == 0:
+        return '0'
+    return f'{len(timestamps)}:{int(timestamps[0])}:{int(timestamps[-1])}:{zlib.crc32(np.ascontiguousarray(close).tobytes())}'
+
+
+def _installed_version(module: types.ModuleType) -> typing.Optional[str]:
+    """__version__ of a module or its package, else the version of the distribution installing it."""
+    package = module.__name__.partition('.')[0]
+    version = getattr(module, '__version__', None) or getattr(sys.modules.get(package), '__version__', None)
+    if version is None:
+        for distribution in metadata.packages_distributions().get(package, []):
+            try:
+                return metadata.version(distribution)
+            except metadata.PackageNotFoundError:
+                continue
+    return version
+
+
+def code_version(strategy: type) -> typing.Optional[str]:
+    """
+    Checksum of the source of the modules defining a strategy class and its bases, and of the
+    shared scoring modules. A module shipped without source (compiled, or in an archive without
+    it) counts by its installed version; None when it has neither, as its changes cannot be told.
+    """
+    bases = strategy.__mro__[:strategy.__mro__.index(AbstractStrategy) + 1]
+    modules = {klass.__module__ for klass in bases} | {'strategies.candles', 'strategies.indicators', 'strategies.metrics'}
+    checksum = 0
+    for name in sorted(modules):
+        module = sys.modules[name]
+        try:
+            code = inspect.getsource(module).encode()
+        except (OSError, TypeError):
+            version = _installed_version(module)
+            if version is None:
+                return None
+            code = f'{name}=={version}'.encode()
+        checksum = zlib.crc32(code, checksum)
+    return f'{checksum:08x}'
+
+
+class FitnessCache:
+    """(pnl, max_drawdown) by parameter key, in memory and optionally in a SQLite store."""
+
+    def __init__(self, context: typing.Dict, path: typing.Optional[str] = FITNESS_STORE):
+        self.context = json.dumps(context, sort_keys=True)
+        self.hits = 0
+        self.misses = 0
+        self._results: typing.Dict[ParamKey, Fitness] = {}
+        self._db = None
+
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS fitness (context TEXT, params TEXT, pnl REAL, '
+                             'max_drawdown REAL, PRIMARY KEY (context, params))')
+            rows = self._db.execute('SELECT params, pnl, max_drawdown FROM fitness WHERE context = ?', (self.context,))
+            for params, pnl, max_drawdown in rows:
+                # SQLite stores NaN as NULL
+                self._results[tuple(tuple(item) for item in json.loads(params))] = (
+                    float('nan') if pnl is None else pnl, float('nan') if max_drawdown is None else max_drawdown)
+            if self._results:
+                logger.info(f'Loaded {len(self._results)} stored results from {path}')
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def items(self) -> typing.ItemsView[ParamKey, Fitness]:
+        return self._results.items()
+
+    def get(self, key: ParamKey) -> typing.Optional[Fitness]:
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put_many(self, results: typing.Dict[ParamKey, Fitness]) -> None:
+        self._results.update(results)
+        if self._db is not None and results:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO fitness VALUES (?, ?, ?, ?)',
+                                     [(self.context, json.dumps(key), pnl, max_drawdown)
+                                      for key, (pnl, max_drawdown) in results.items()])
+
+    def take_stats(self) -> typing.Tuple[int, int]:
+        """Hits and misses since the previous call."""
+        stats = self.hits, self.misses
+        self.hits = self.misses = 0
+        return stats
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
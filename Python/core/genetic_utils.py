@@ -1,13 +1,17 @@
+import bisect
 import typing
 import random
 
+import numpy as np
+
 # Type hint for any object that has 'pnl' and 'max_drawdown' attributes for sorting
 # Using Any or a Protocol would be better, but for simplicity assuming objects have these attrs.
 T = typing.TypeVar('T')
 
-def non_dominated_sorting(population: typing.Dict[int, T]) -> typing.List[typing.List[T]]:
+def non_dominated_sorting_pairwise(population: typing.Dict[int, T]) -> typing.List[typing.List[T]]:
     """
-    Performs fast non-dominated sorting on a population.
+    Performs fast non-dominated sorting on a population by comparing every pair, O(N^2).
+    Reference for non_dominated_sorting, which returns the same fronts in the same order.
     
     Args:
         population: Dictionary mapping IDs to individuals. Individuals must have 
@@ -59,9 +63,10 @@ def non_dominated_sorting(population: typing.Dict[int, T]) -> typing.List[typing
 
     return fronts
 
-def calculate_crowding_distance(population: typing.List[T]) -> typing.List[T]:
+def calculate_crowding_distance_loop(population: typing.List[T]) -> typing.List[T]:
     """
-    Calculates crowding distance for a list of individuals (usually a front).
+    Calculates crowding distance for a list of individuals (usually a front), one attribute at a time.
+    Reference for calculate_crowding_distance.
     
     Args:
         population: List of individuals. Must have 'pnl', 'max_drawdown', 'crowding_distance' attributes.
@@ -94,6 +99,122 @@ def calculate_crowding_distance(population: typing.List[T]) -> typing.List[T]:
 
     return population
 
+def _range_max(values: np.ndarray, start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+    """max(values[start[i]:stop[i]]) for every i (non-empty ranges), from a sparse table."""
+    table = [values]
+    while 2 ** len(table) <= len(values):
+        half = 2 ** (len(table) - 1)
+        table.append(np.maximum(table[-1][:-half], table[-1][half:]))
+
+    level = np.floor(np.log2(stop - start)).astype(np.int64)
+    result = np.empty(len(start), dtype=values.dtype)
+    for j in np.unique(level):
+        rows = np.flatnonzero(level == j)
+        result[rows] = np.maximum(table[j][start[rows]], table[j][stop[rows] - 2 ** j])
+    return result
+
+
+def non_dominated_sorting(population: typing.Dict[int, T]) -> typing.List[typing.List[T]]:
+    """
+    Non-dominated sorting for the two objectives (maximize pnl, minimize max_drawdown) in
+    O(N log N), with the fronts, ranks and member order of non_dominated_sorting_pairwise.
+    'dominates' and 'dominated_by' are reset rather than filled.
+
+    Individuals are swept by pnl (descending); each front keeps the (drawdown, -pnl) of its
+    member with the lowest drawdown, which grows from one front to the next, so the first
+    front not dominating an individual is found by bisection. The pairwise version lists a
+    front in the order its members lose their last dominator, i.e. by the position of their
+    last dominator in the previous front; in a front sorted by pnl the dominators of an
+    individual are a contiguous range, so that position is a range maximum.
+    """
+    individuals = list(population.values())
+    n = len(individuals)
+    if n == 0:
+        return []
+
+    pnl = np.array([indiv.pnl for indiv in individuals], dtype=np.float64)
+    drawdown = np.array([indiv.max_drawdown for indiv in individuals], dtype=np.float64)
+    # NaN objectives compare false both ways: those individuals neither dominate nor are dominated
+    comparable = np.flatnonzero(~(np.isnan(pnl) | np.isnan(drawdown)))
+
+    ranks = np.zeros(n, dtype=np.int64)
+    front_keys = []
+    pnl_list, drawdown_list = pnl.tolist(), drawdown.tolist()
+    for i in comparable[np.lexsort((drawdown[comparable], -pnl[comparable]))].tolist():
+        key = (drawdown_list[i], -pnl_list[i])
+        front = bisect.bisect_left(front_keys, key)
+        if front == len(front_keys):
+            front_keys.append(key)
+        else:
+            front_keys[front] = key
+        ranks[i] = front
+
+    by_rank = np.argsort(ranks, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(ranks))])
+    fronts = [by_rank[bounds[0]:bounds[1]]]
+    position = np.zeros(n, dtype=np.int64)
+    for rank in range(1, len(bounds) - 1):
+        previous = fronts[-1]
+        position[previous] = np.arange(len(previous))
+        previous = previous[~(np.isnan(pnl[previous]) | np.isnan(drawdown[previous]))]
+
+        # Previous front by pnl descending; its drawdowns then descend too
+        sweep = previous[np.lexsort((-drawdown[previous], -pnl[previous]))]
+        members = by_rank[bounds[rank]:bounds[rank + 1]]
+        stop = np.searchsorted(-pnl[sweep], -pnl[members], side='right')
+        start = np.searchsorted(-drawdown[sweep], -drawdown[members], side='left')
+        last_dominator = _range_max(position[sweep], start, stop)
+        fronts.append(members[np.lexsort((members, last_dominator))])
+
+    for indiv, rank in zip(individuals, ranks.tolist()):
+        indiv.rank = rank
+        indiv.dominated_by = 0
+        indiv.dominates = []
+    return [[individuals[i] for i in front.tolist()] for front in fronts]
+
+
+def calculate_crowding_distance(population: typing.List[T]) -> typing.List[T]:
+    """
+    Calculates crowding distance for a list of individuals (usually a front) on objective
+    arrays, with the results of calculate_crowding_distance_loop.
+
+    A NaN objective (a backtest that could not be scored) adds nothing to its individual's
+    distance and is left out of the neighbours, boundaries and range of the others on that
+    objective, so a result without a value is never favoured for its diversity. NaN values sort
+    last; the loop reference leaves them wherever sorted() puts them, so the two only agree on
+    fronts without NaN.
+
+    Args:
+        population: List of individuals. Must have 'pnl', 'max_drawdown', 'crowding_distance' attributes.
+    """
+    if not population:
+        return population
+
+    distance = np.zeros(len(population))
+    order = np.arange(len(population))
+    with np.errstate(invalid='ignore'):
+        for objective in ["pnl", "max_drawdown"]:
+            values = np.array([getattr(indiv, objective) for indiv in population], dtype=np.float64)[order]
+            # Stable, like sorted(), and applied to the previous objective's order; NaN sorts last
+            resort = np.argsort(values, kind='stable')
+            order, values = order[resort], values[resort]
+            length = len(values) - int(np.isnan(values).sum())
+            if length == 0:
+                continue
+
+            # Boundary points have infinite distance
+            distance[order[0]] = float("inf")
+            distance[order[length - 1]] = float("inf")
+
+            denom = values[length - 1] - values[0]
+            if denom == 0:
+                denom = 1  # Avoid div by zero
+            distance[order[1:length - 1]] += (values[2:length] - values[:length - 2]) / denom
+
+    for indiv, value in zip(population, distance.tolist()):
+        indiv.crowding_distance = value
+    return [population[i] for i in order.tolist()]
+
 def select_by_tournament(population: typing.List[T], k: int = 2) -> T:
     """
     Selects the best individual from k random setup using crowded comparison operator.
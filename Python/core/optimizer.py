@@ -1,51 +1,87 @@
+import json
+import logging
+import os
 import random
 import typing
 import copy
 
-from common.utils import resample_timeframe
-from services.database import Hdf5Client
+from services.storage import get_storage_client
 from models.result import BacktestResult
+from common.config import CHECKPOINT_DIR, CHECKPOINT_EVERY, FITNESS_STORE, OPTIMIZER_WORKERS
+from core.fitness_cache import FitnessCache, ParamKey, code_version, dataset_version, param_key
 from core.genetic_utils import non_dominated_sorting, calculate_crowding_distance, select_by_tournament
+from core.parallel import PopulationPool, resolve_workers
+from strategies import get_strategy
+from strategies.candles import candle_arrays
+from strategies.indicators import INDICATOR_CACHE
 
-from strategies.obv import ObvStrategy
-from strategies.ichimoku import IchimokuStrategy
-from strategies.support_resistance import SupResStrategy
-from strategies.sma import SmaStrategy
-from strategies.psar import PsarStrategy
+logger = logging.getLogger()
 
 class Nsga2:
     def __init__(self, exchange: str, symbol: str, strategy: str, tf: str, from_time: int, to_time: int,
-                 population_size: int):
+                 population_size: int, workers: int = OPTIMIZER_WORKERS,
+                 fitness_store: typing.Optional[str] = FITNESS_STORE, checkpoint_path: typing.Optional[str] = None):
         self.exchange = exchange
         self.symbol = symbol
         self.tf = tf
         self.from_time = from_time
         self.to_time = to_time
         self.population_size = population_size
+        self.strategy = strategy
+        # Processes evaluating each population (0 = every core); see core/parallel.py
+        self.workers = resolve_workers(workers)
+        self._pool: typing.Optional[PopulationPool] = None
 
-        self.strategy_map = {
-            'obv': ObvStrategy,
-            'ichimoku': IchimokuStrategy,
-            'support_resistance': SupResStrategy,
-            'sma': SmaStrategy, 
-            'psar': PsarStrategy 
-        }
+        try:
+            self.strategy_instance = get_strategy(strategy)()
+        except KeyError:
+            raise ValueError(f"Strategy {strategy} not implemented.")
 
-        if strategy not in self.strategy_map:
-             raise ValueError(f"Strategy {strategy} not implemented.")
-        
-        self.strategy_instance = self.strategy_map[strategy]()
         self.params_data = self.strategy_instance.params
-        self.population_params = []
+        # Keys of every parameter set created during the run
+        self.population_params: typing.Set[ParamKey] = set()
 
         # Load data
-        h5_db = Hdf5Client(exchange)
-        self.data = h5_db.get_data(symbol, from_time, to_time)
-        self.data = resample_timeframe(self.data, tf)
+        storage = get_storage_client(exchange, readonly=True)
+        self.data = storage.get_data(symbol, from_time, to_time, tf)
+        # Read-only views of the candles, shared by every backtest of the run
+        self.candles = candle_arrays(self.data) if self.data is not None else None
+
+        # Identified by the candles loaded rather than the requested range, whose end is usually "now"
+        version = dataset_version(self.candles.timestamps, self.candles.close) if self.candles is not None else '0'
+        code = code_version(type(self.strategy_instance))
+        if code is None and fitness_store:
+            logger.warning(f'{strategy} has no source or version to key stored results by; '
+                           f'its results are kept for this run only.')
+            fitness_store = None
+        self.fitness = FitnessCache({'exchange': exchange, 'symbol': symbol, 'timeframe': tf, 'data': version,
+                                     'strategy': strategy, 'code': code}, fitness_store)
+
+        # One checkpoint per market and strategy: the latest run's state, or its final front
+        self.checkpoint_path = checkpoint_path or os.path.join(CHECKPOINT_DIR, f'nsga2_{exchange}_{symbol}_{tf}_{strategy}.json')
+
 
+    def close(self) -> None:
+        """Close the fitness store."""
+        self.fitness.close()
 
-    def create_initial_population(self) -> typing.List[BacktestResult]:
+    def __enter__(self) -> 'Nsga2':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def create_initial_population(self, seed: typing.Optional[typing.List[typing.Dict]] = None) -> typing.List[BacktestResult]:
+        """Random individuals, after the parameter sets of `seed` (e.g. a previous Pareto front)."""
         population = []
+        for parameters in (seed or [])[:self.population_size]:
+            backtest = BacktestResult()
+            backtest.parameters = self.strategy_instance.validate_params(dict(parameters))
+            key = param_key(backtest.parameters)
+            if key not in self.population_params:
+                population.append(backtest)
+                self.population_params.add(key)
+
         while len(population) < self.population_size:
             backtest = BacktestResult()
             for p_code, p in self.params_data.items():
@@ -56,9 +92,10 @@ class Nsga2:
 
             backtest.parameters = self.strategy_instance.validate_params(backtest.parameters)
 
-            if backtest not in population:
+            key = param_key(backtest.parameters)
+            if key not in self.population_params:
                 population.append(backtest)
-                self.population_params.append(backtest.parameters)
+                self.population_params.add(key)
 
         return population
 
@@ -110,15 +147,35 @@ class Nsga2:
             # Constraints Check
             new_child.parameters = self.strategy_instance.validate_params(new_child.parameters)
 
-            if new_child.parameters not in self.population_params:
+            key = param_key(new_child.parameters)
+            if key not in self.population_params:
                 offspring_pop.append(new_child)
-                self.population_params.append(new_child.parameters)
+                self.population_params.add(key)
 
         return offspring_pop
 
     def evaluate_population(self, population: typing.List[BacktestResult]) -> typing.List[BacktestResult]:
-        for bt in population:
-            bt.pnl, bt.max_drawdown = self.strategy_instance.backtest(self.data, **bt.parameters)
+        keys = [param_key(bt.parameters) for bt in population]
+        results = {key: self.fitness.get(key) for key in keys}
+
+        # Backtest only the parameter sets without a known result
+        missing = {key: bt.parameters for key, bt in zip(keys, population) if results[key] is None}
+        if missing:
+            params_list = list(missing.values())
+            if self._pool is not None:
+                computed = self._pool.evaluate(params_list)
+            else:
+                computed = self.strategy_instance.backtest_batch(self.candles, params_list)
+            computed = dict(zip(missing, computed))
+            self.fitness.put_many(computed)
+            results.update(computed)
+
+        hits, misses = self.fitness.take_stats()
+        logger.info(f'Fitness cache: {hits}/{hits + misses} hits, {len(self.fitness)} results known')
+
+        for bt, key in zip(population, keys):
+            pnl, max_drawdown = results[key]
+            bt.pnl, bt.max_drawdown = pnl, max_drawdown
             # Penalize invalid results
             if bt.pnl == 0 and bt.max_drawdown == 0:
                  # Assign worst possible fitness to filter out
@@ -126,19 +183,109 @@ class Nsga2:
                 bt.max_drawdown = float("inf")
         return population
 
-    def run(self, generations: int, mutation_rate: float) -> typing.List[BacktestResult]:
-        # Initial Population
-        population = self.create_initial_population()
-        population = self.evaluate_population(population)
-        
-        # Initial Sorting
-        fronts = non_dominated_sorting({i: p for i, p in enumerate(population)})
-        for front in fronts:
-            calculate_crowding_distance(front)
-        
-        parents = population # Initial parents are the first population
+    def _settings(self, mutation_rate: float) -> typing.Dict:
+        return {'population_size': self.population_size, 'mutation_rate': mutation_rate}
+
+    def checkpoint_mismatch(self, state: typing.Dict, mutation_rate: float) -> typing.Optional[str]:
+        """Why the run saved in `state` cannot be continued by this optimizer, or None if it can."""
+        if state['context'] != self.fitness.context:
+            return 'it was saved for other data or strategy code'
+        settings = self._settings(mutation_rate)
+        if state.get('settings') != settings:
+            return f"it was run with {state.get('settings')}, not {settings}"
+        return None
 
-        for gen in range(generations):
+    def save_checkpoint(self, generation: int, parents: typing.List[BacktestResult], mutation_rate: float,
+                        complete: bool = False) -> None:
+        """Write the state after `generation` generations; enough to continue the run as if never stopped."""
+        state = {
+            'context': self.fitness.context,
+            'settings': self._settings(mutation_rate),
+            'generation': generation,
+            'complete': complete,
+            'random_state': random.getstate(),
+            'parents': [{'parameters': bt.parameters, 'pnl': bt.pnl, 'max_drawdown': bt.max_drawdown,
+                         'rank': bt.rank, 'crowding_distance': bt.crowding_distance} for bt in parents],
+            'population_params': list(self.population_params),
+            'fitness': [[key, pnl, max_drawdown] for key, (pnl, max_drawdown) in self.fitness.items()],
+        }
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        with open(self.checkpoint_path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def load_checkpoint(self) -> typing.Optional[typing.Dict]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def pareto_front(self) -> typing.List[typing.Dict]:
+        """Parameter sets of the first front saved in the checkpoint, to seed a new run."""
+        state = self.load_checkpoint()
+        if state is None:
+            return []
+        return [individual['parameters'] for individual in state['parents'] if individual['rank'] == 0]
+
+    def _restore(self, state: typing.Dict) -> typing.List[BacktestResult]:
+        version, internal, gauss = state['random_state']
+        random.setstate((version, tuple(internal), gauss))
+        self.population_params = {tuple(tuple(item) for item in key) for key in state['population_params']}
+        self.fitness.put_many({tuple(tuple(item) for item in key): (pnl, max_drawdown)
+                               for key, pnl, max_drawdown in state['fitness']})
+
+        parents = []
+        for individual in state['parents']:
+            backtest = BacktestResult()
+            backtest.parameters = individual['parameters']
+            backtest.pnl, backtest.max_drawdown = individual['pnl'], individual['max_drawdown']
+            backtest.rank, backtest.crowding_distance = individual['rank'], individual['crowding_distance']
+            parents.append(backtest)
+        return parents
+
+    def run(self, generations: int, mutation_rate: float, resume: bool = False,
+            seed: typing.Optional[typing.List[typing.Dict]] = None) -> typing.List[BacktestResult]:
+        """
+        Optimize for `generations` generations. With `resume`, continue from the checkpoint of an
+        unfinished run on the same data and strategy code, with the same population size and
+        mutation rate; `seed` parameter sets start the initial population.
+        """
+        if self.workers > 1:
+            self._pool = PopulationPool(self.strategy, self.candles, self.workers)
+        try:
+            return self._run(generations, mutation_rate, resume, seed)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def _run(self, generations: int, mutation_rate: float, resume: bool,
+             seed: typing.Optional[typing.List[typing.Dict]]) -> typing.List[BacktestResult]:
+        state = self.load_checkpoint() if resume else None
+        if state is not None:
+            mismatch = self.checkpoint_mismatch(state, mutation_rate)
+            if mismatch is not None:
+                raise ValueError(f'Cannot resume from {self.checkpoint_path}: {mismatch}.')
+
+        if state is not None:
+            parents = self._restore(state)
+            start = state['generation']
+            logger.info(f'Resuming from generation {start} of {self.checkpoint_path}')
+        else:
+            # Initial Population
+            population = self.create_initial_population(seed)
+            population = self.evaluate_population(population)
+
+            # Initial Sorting
+            fronts = non_dominated_sorting({i: p for i, p in enumerate(population)})
+            for front in fronts:
+                calculate_crowding_distance(front)
+
+            parents = population # Initial parents are the first population
+            start = 0
+            self.save_checkpoint(start, parents, mutation_rate)
+
+        for gen in range(start, generations):
             # Create offspring
             offspring = self.create_offspring_population(parents)
             offspring = self.evaluate_population(offspring)
@@ -155,6 +302,10 @@ class Nsga2:
             parents = self.create_new_population(fronts)
             
             print(f"Generation {gen+1}/{generations} complete. Best PnL: {max(p.pnl for p in parents) if parents else 0}")
-            
+
+            if (gen + 1) % CHECKPOINT_EVERY == 0 and gen + 1 < generations:
+                self.save_checkpoint(gen + 1, parents, mutation_rate)
+
+        self.save_checkpoint(max(start, generations), parents, mutation_rate, complete=True)
+        logger.info(f'Indicator cache: {INDICATOR_CACHE.stats()}')
         return parents
-        
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Parallel population evaluation for the optimizer.
+
+The candles are written once to memory-mapped .npy files in a temporary directory; every worker
+process maps them read-only at start-up, so the OS page cache holds a single copy and tasks only
+carry parameter dicts. Each worker keeps its strategy instance and indicator cache for the whole
+run, and results come back in the order of the parameter sets.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import typing
+
+import numpy as np
+
+from common.config import OPTIMIZER_CHUNKS_PER_WORKER, OPTIMIZER_WORKERS
+from common.jit import set_num_threads
+from strategies import get_strategy
+from strategies.candles import COLUMNS, CandleArrays
+
+logger = logging.getLogger()
+
+FIELDS = ('timestamps',) + COLUMNS
+
+# Per worker process: strategy instance and candle arrays, set by _init_worker
+_worker = {}
+
+
+def resolve_workers(workers: int = OPTIMIZER_WORKERS) -> int:
+    """Worker count for a setting where 0 means every core."""
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def _init_worker(strategy: str, directory: str) -> None:
+    # Processes already share the cores, so compiled kernels run single-threaded
+    set_num_threads(1)
+    _worker['strategy'] = get_strategy(strategy)()
+    _worker['candles'] = CandleArrays(*(np.load(os.path.join(directory, f'{field}.npy'), mmap_mode='r')
+                                        for field in FIELDS))
+
+
+def _evaluate_chunk(params_list: typing.List[typing.Dict]) -> typing.List[typing.Tuple[float, float]]:
+    return _worker['strategy'].backtest_batch(_worker['candles'], params_list)
+
+
+class PopulationPool:
+    """Backtests parameter sets of one strategy on a pool of processes sharing the candles."""
+
+    def __init__(self, strategy: str, candles: CandleArrays, workers: int = OPTIMIZER_WORKERS):
+        self.workers = resolve_workers(workers)
+        self.directory = tempfile.mkdtemp(prefix='candles-')
+        for field, array in zip(FIELDS, candles.arrays()):
+            np.save(os.path.join(self.directory, f'{field}.npy'), array)
+
+        # Forking a process that already ran threaded (numba) kernels can deadlock its children
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                                              else 'spawn')
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                             initargs=(strategy, self.directory))
+        logger.info(f'Evaluating populations of {strategy} on {self.workers} processes')
+
+    def evaluate(self, params_list: typing.List[typing.Dict]) -> typing.List[typing.Tuple[float, float]]:
+        """(pnl, max_drawdown) of every parameter set, in order."""
+        size = max(1, math.ceil(len(params_list) / (self.workers * OPTIMIZER_CHUNKS_PER_WORKER)))
+        chunks = [params_list[start:start + size] for start in range(0, len(params_list), size)]
+        return [result for chunk in self._executor.map(_evaluate_chunk, chunks) for result in chunk]
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self) -> 'PopulationPool':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
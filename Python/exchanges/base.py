@@ -1,39 +1,144 @@
 """Base exchange client with common functionality."""
+import itertools
+import json
 import logging
+import os
+import threading
+import time
 import requests
+import numpy as np
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.config import DATA_DIR, HTTP_SETTINGS, SYMBOL_CACHE_TTL
+from .rate_limit import get_rate_limiter
 
 logger = logging.getLogger()
 
+MAX_RATE_LIMIT_RETRIES = 5
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+              'AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/120.0.0.0 Safari/537.36')
+
+# One keep-alive session per base URL, shared by every client in the process
+_SESSIONS: Dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+class ExchangeRequestError(Exception):
+    """A request still failed after retries; callers must not read it as "no more data"."""
+
+
+def get_session(base_url: str) -> requests.Session:
+    """Return the pooled session of a base URL, retrying connection errors and 5xx with backoff."""
+    with _SESSIONS_LOCK:
+        if base_url not in _SESSIONS:
+            retry = Retry(total=HTTP_SETTINGS['retries'], backoff_factor=HTTP_SETTINGS['backoff_factor'],
+                          status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset(['GET']),
+                          respect_retry_after_header=False, raise_on_status=False)  # 429s go to the limiter
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_SETTINGS['pool_size'], max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = USER_AGENT
+            _SESSIONS[base_url] = session
+        return _SESSIONS[base_url]
+
+
+def decode_klines(rows: list, newest_first: bool = False) -> np.ndarray:
+    """
+    Decode kline rows, whose first six fields are open time and OHLCV as numbers or numeric
+    strings, straight into a float64 (n, 6) array in ascending time order. A payload that is not
+    a list of such rows raises ExchangeRequestError.
+    """
+    try:
+        if newest_first:
+            rows = rows[::-1]
+        values = map(float, itertools.chain.from_iterable(row[:6] for row in rows))
+        return np.fromiter(values, dtype=np.float64, count=len(rows) * 6).reshape(-1, 6)
+    except (TypeError, ValueError, KeyError) as e:
+        raise ExchangeRequestError(f'Malformed klines: {e}') from e
+
+
 class BaseExchange(ABC):
     """Abstract base class for exchange clients."""
+
+    name: str = ''
+    page_size: int = 0  # Candles returned per kline request
+    used_weight_header: Optional[str] = None  # Response header reporting weight used this minute
     
     def __init__(self, base_url: str, futures: bool = False):
         self.base_url = base_url
         self.futures = futures
-        self.symbols = self._get_symbols()
+        self.session = get_session(base_url)
+        self.rate_limiter = get_rate_limiter(self.name)
+        self._symbols: Optional[list[str]] = None
+
+    @property
+    def symbols(self) -> list[str]:
+        """
+        Tradable symbols, loaded on first use from the on-disk catalogue and refreshed from the
+        exchange once it is older than SYMBOL_CACHE_TTL. A stale catalogue is still used when
+        the exchange cannot be reached.
+        """
+        if self._symbols is None:
+            path = os.path.join(DATA_DIR, f"symbols_{self.name}_{'futures' if self.futures else 'spot'}.json")
+            cached = None
+            if os.path.exists(path):
+                with open(path) as f:
+                    cached = json.load(f)
+
+            if cached is not None and time.time() - os.path.getmtime(path) < SYMBOL_CACHE_TTL:
+                self._symbols = cached
+            else:
+                symbols = self._get_symbols()
+                if symbols:
+                    with open(path + '.tmp', 'w') as f:
+                        json.dump(symbols, f)
+                    os.replace(path + '.tmp', path)
+                elif cached is not None:
+                    logger.warning(f'Could not refresh {self.name} symbols; using the cached list.')
+                    symbols = cached
+                self._symbols = symbols
+        return self._symbols
     
-    def _make_request(self, endpoint: str, params: dict) -> Optional[dict]:
-        """Make HTTP GET request with error handling."""
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
-                             'AppleWebKit/537.36 (KHTML, like Gecko) '
-                             'Chrome/120.0.0.0 Safari/537.36'
-            }
-            response = requests.get(
-                self.base_url + endpoint,
-                params=params,
-                headers=headers,
-                timeout=10
-            )
+    def _make_request(self, endpoint: str, params: dict, weight: int = 1) -> dict:
+        """
+        Make HTTP GET request within the exchange request budget.
+
+        Connection errors and 5xx responses are retried with backoff by the session; rate limit
+        responses pause the shared limiter and are retried here. Anything still failing raises
+        ExchangeRequestError.
+        """
+        for _ in range(MAX_RATE_LIMIT_RETRIES):
+            self.rate_limiter.acquire(weight)
+            try:
+                response = self.session.get(
+                    self.base_url + endpoint,
+                    params=params,
+                    timeout=HTTP_SETTINGS['timeout']
+                )
+            except requests.RequestException as e:
+                raise ExchangeRequestError(f'Connection error: {endpoint} - {e}') from e
+
+            if self.used_weight_header and self.used_weight_header in response.headers:
+                self.rate_limiter.sync_used(float(response.headers[self.used_weight_header]))
+
+            if response.status_code in (418, 429):
+                retry_after = float(response.headers.get('Retry-After', 1))
+                logger.warning(f'Rate limited: {endpoint} - pausing requests for {retry_after}s')
+                self.rate_limiter.pause(retry_after)
+                continue
+
             if response.status_code == 200:
                 return response.json()
-            logger.error(f'Request failed: {endpoint} - {response.status_code}')
-        except Exception as e:
-            logger.error(f'Connection error: {endpoint} - {e}')
-        return None
+            raise ExchangeRequestError(f'Request failed: {endpoint} - {response.status_code}')
+
+        raise ExchangeRequestError(f'Request failed: {endpoint} - still rate limited after '
+                                   f'{MAX_RATE_LIMIT_RETRIES} attempts')
     
     @abstractmethod
     def _get_symbols(self) -> list[str]:
@@ -43,6 +148,15 @@ class BaseExchange(ABC):
     @abstractmethod
     def get_historical_data(self, symbol: str, 
                             start_time: Optional[int] = None,
-                            end_time: Optional[int] = None) -> Optional[list]:
-        """Fetch historical OHLCV data."""
+                            end_time: Optional[int] = None) -> Optional[np.ndarray]:
+        """Fetch historical OHLCV data as an (n, 6) array in ascending time order."""
         pass
+
+    @abstractmethod
+    def get_first_timestamp(self, symbol: str) -> Optional[int]:
+        """Get the open time of the earliest 1m candle the exchange serves for a symbol."""
+        pass
+
+    def get_candles_between(self, symbol: str, start_time: int, end_time: int) -> Optional[np.ndarray]:
+        """Fetch the candles opening in [start_time, end_time] (at most one page)."""
+        return self.get_historical_data(symbol, start_time=start_time, end_time=end_time)
@@ -1,34 +1,55 @@
 """Binance exchange client."""
+import logging
 from typing import Optional
-from .base import BaseExchange
+
+import numpy as np
+
+from .base import BaseExchange, ExchangeRequestError, decode_klines
+
+logger = logging.getLogger()
 
 class BinanceClient(BaseExchange):
     """Binance API client."""
+
+    name = 'binance'
+    page_size = 1500
+    used_weight_header = 'X-MBX-USED-WEIGHT-1M'
     
-    def __init__(self, futures: bool = False):
-        base_url = 'https://fapi.binance.com' if futures else 'https://api.binance.com'
+    def __init__(self, futures: bool = False, base_url: Optional[str] = None):
+        if base_url is None:
+            base_url = 'https://fapi.binance.com' if futures else 'https://api.binance.com'
         super().__init__(base_url, futures)
     
     def _get_symbols(self) -> list[str]:
         endpoint = '/fapi/v1/exchangeInfo' if self.futures else '/api/v3/exchangeInfo'
-        data = self._make_request(endpoint, {})
+        try:
+            data = self._make_request(endpoint, {}, weight=1 if self.futures else 20)
+        except ExchangeRequestError as e:
+            logger.error(e)
+            return []
         if data:
             return [x['symbol'] for x in data['symbols']]
         return []
     
     def get_historical_data(self, symbol: str,
                             start_time: Optional[int] = None,
-                            end_time: Optional[int] = None) -> Optional[list]:
-        params = {'symbol': symbol, 'interval': '1m', 'limit': 1500}
+                            end_time: Optional[int] = None) -> Optional[np.ndarray]:
+        params = {'symbol': symbol, 'interval': '1m', 'limit': self.page_size}
         if start_time:
             params['startTime'] = start_time
         if end_time:
             params['endTime'] = end_time
         
         endpoint = '/fapi/v1/klines' if self.futures else '/api/v3/klines'
-        raw = self._make_request(endpoint, params)
+        raw = self._make_request(endpoint, params, weight=10 if self.futures else 2)
         
         if raw:
-            return [(float(c[0]), float(c[1]), float(c[2]), 
-                     float(c[3]), float(c[4]), float(c[5])) for c in raw]
+            return decode_klines(raw)
+        return None
+
+    def get_first_timestamp(self, symbol: str) -> Optional[int]:
+        # Klines are returned oldest first from startTime, so the first one is the listing candle
+        candles = self.get_historical_data(symbol, start_time=1)
+        if candles is not None:
+            return int(candles[0][0])
         return None
@@ -1,35 +1,62 @@
 """OKX exchange client."""
+import logging
 from typing import Optional
-from .base import BaseExchange
+
+import numpy as np
+
+from .base import BaseExchange, ExchangeRequestError, decode_klines
+
+logger = logging.getLogger()
 
 
 class OkxClient(BaseExchange):
     """OKX API client."""
+
+    name = 'okx'
+    page_size = 100
     
-    def __init__(self, futures: bool = False):
-        super().__init__('https://www.okx.com', futures)
+    def __init__(self, futures: bool = False, base_url: Optional[str] = None):
+        super().__init__(base_url or 'https://www.okx.com', futures)
     
+    def _request(self, endpoint: str, params: dict) -> list:
+        """Return the data of an OKX response; API errors come back as HTTP 200 with a non-zero code."""
+        raw = self._make_request(endpoint, params)
+        if not raw or raw.get('code') != '0':
+            code, message = (raw.get('code'), raw.get('msg')) if raw else (None, 'empty response')
+            raise ExchangeRequestError(f'Request failed: {endpoint} - OKX error {code}: {message}')
+        return raw['data']
+
     def _get_symbols(self) -> list[str]:
         params = {'instType': 'SWAP' if self.futures else 'SPOT'}
-        data = self._make_request('/api/v5/public/instruments', params)
-        if data and data.get('code') == '0':
-            return [x['instId'] for x in data['data']]
-        return []
+        try:
+            data = self._request('/api/v5/public/instruments', params)
+        except ExchangeRequestError as e:
+            logger.error(e)
+            return []
+        return [x['instId'] for x in data]
     
     def get_historical_data(self, symbol: str,
                             start_time: Optional[int] = None,
-                            end_time: Optional[int] = None) -> Optional[list]:
-        params = {'instId': symbol, 'bar': '1m', 'limit': 100}
+                            end_time: Optional[int] = None) -> Optional[np.ndarray]:
+        params = {'instId': symbol, 'bar': '1m', 'limit': self.page_size}
         if start_time:
             params['before'] = start_time
         if end_time:
             params['after'] = end_time
         
-        raw = self._make_request('/api/v5/market/candles', params)
+        data = self._request('/api/v5/market/candles', params)
         
-        if raw and raw.get('code') == '0':
-            candles = [(float(c[0]), float(c[1]), float(c[2]),
-                        float(c[3]), float(c[4]), float(c[5])) for c in raw['data']]
-            candles.reverse()  # OKX returns newest first
-            return candles
+        if data:
+            return decode_klines(data, newest_first=True)  # OKX returns newest first
+        return None
+
+    def get_first_timestamp(self, symbol: str) -> Optional[int]:
+        params = {'instType': 'SWAP' if self.futures else 'SPOT', 'instId': symbol}
+        data = self._request('/api/v5/public/instruments', params)
+        if data:
+            return int(data[0]['listTime'])
         return None
+
+    def get_candles_between(self, symbol: str, start_time: int, end_time: int) -> Optional[np.ndarray]:
+        # 'before' and 'after' are exclusive bounds on OKX
+        return self.get_historical_data(symbol, start_time=start_time - 1, end_time=end_time + 1)
@@ -0,0 +1,68 @@
+"""Shared request budgets for exchange clients."""
+import threading
+import time
+from typing import Dict
+
+from common.config import RATE_LIMITS
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket holding up to `capacity` weight units, refilled continuously
+    over `period` seconds. Exchange responses can drain it (reported used weight) or pause
+    it entirely (429 / Retry-After).
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.requests = 0  # Total acquisitions, for throughput reporting
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight: float = 1) -> None:
+        """Block until `weight` units are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= weight:
+                        self.tokens -= weight
+                        self.requests += 1
+                        return
+                    wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def sync_used(self, used: float) -> None:
+        """Align with the weight the exchange reports as already used in the current window."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0
+            self.paused_until = max(self.paused_until, now + seconds)
+
+
+_LIMITERS: Dict[str, TokenBucket] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(exchange: str) -> TokenBucket:
+    """Return the process-wide bucket of an exchange, so every client shares one budget."""
+    with _LIMITERS_LOCK:
+        if exchange not in _LIMITERS:
+            _LIMITERS[exchange] = TokenBucket(RATE_LIMITS[exchange]['weight_per_minute'])
+        return _LIMITERS[exchange]
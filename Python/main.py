@@ -1,11 +1,15 @@
 """Main entry point for crypto backtesting application."""
 from datetime import datetime
 from services.data_collector import collect_all
-from exchanges.binance import BinanceClient
-from exchanges.okx import OkxClient
+from services.async_collector import collect_all_async, repair_gaps
+from services.columnar import convert_hdf5
+from services.scheduler import CLIENT_MAP, run_schedule
+from services.storage import get_storage_client
+from services.database import compact_file
 from core.backtester import run
 from core.optimizer import Nsga2
-from common.config import STRATEGIES, TIMEFRAMES, EXCHANGES
+from strategies import available_strategies
+from common.config import TIMEFRAMES, EXCHANGES
 from common.logger import setup_logging
 
 # Logging setup
@@ -31,24 +35,57 @@ def get_timestamp(prompt: str, default: int) -> int:
             logger.warning("Invalid date format. Use yyyy-mm-dd")
 
 def main():
-    mode = input('Mode (data / backtest / optimize): ').lower().strip()
+    mode = input('Mode (data / backfill / repair / schedule / backtest / optimize / compact / convert): ').lower().strip()
+
+    if mode == 'schedule':
+        # Symbols or patterns per exchange, e.g. "BTCUSDT ETHUSDT *BUSD"; empty skips the exchange
+        jobs = {exchange: input(f'{exchange} symbols (space separated, * patterns allowed): ').upper().split()
+                for exchange in EXCHANGES}
+        resume = input('Resume previous run? (y/n): ').lower().strip() != 'n'
+        run_schedule(jobs, resume)
+        return
+
     exchange = get_choice('Exchange (binance / okx): ', EXCHANGES)
+
+    if mode == 'compact':
+        compact_file(exchange)
+        return
+
+    if mode == 'convert':
+        convert_hdf5(exchange)
+        return
     
-    # Map exchange string to Client class
-    CLIENT_MAP = {'binance': BinanceClient, 'okx': OkxClient}
-    client = CLIENT_MAP[exchange](futures=True)
+    if mode in ['backtest', 'optimize']:
+        # Local runs only read stored candles and never touch the network
+        try:
+            symbols = get_storage_client(exchange, readonly=True).get_symbols()
+        except OSError:
+            symbols = []
+        if not symbols:
+            logger.warning(f"No stored data for {exchange}. Collect some with the data or backfill mode first.")
+            return
+    else:
+        client = CLIENT_MAP[exchange](futures=True)
+        symbols = client.symbols
     
     while True:
         symbol = input('Symbol: ').upper().strip()
-        if symbol in client.symbols:
+        if symbol in symbols:
             break
         logger.warning(f"Symbol {symbol} not found")
     
     if mode == 'data':
         collect_all(client, exchange, symbol)
+
+    elif mode == 'backfill':
+        collect_all_async(client, exchange, symbol)
+
+    elif mode == 'repair':
+        repair_gaps(client, exchange, symbol)
     
     elif mode in ['backtest', 'optimize']:
-        strategy = get_choice(f"Strategy ({', '.join(STRATEGIES)}): ", STRATEGIES)
+        strategies = available_strategies()
+        strategy = get_choice(f"Strategy ({', '.join(strategies)}): ", strategies)
         timeframe = get_choice(f"Timeframe ({', '.join(TIMEFRAMES)}): ", TIMEFRAMES)
         start_time = get_timestamp('Start date (yyyy-mm-dd, empty=all): ', 0)
         end_time = get_timestamp('End date (yyyy-mm-dd, empty=now): ', 
@@ -82,8 +119,23 @@ def main():
                 except ValueError:
                     logger.warning("Invalid mutation rate. Use float")
             
-            nsga2 = Nsga2(exchange, symbol, strategy, timeframe, start_time, end_time, population_size)
-            parents = nsga2.run(generations, mutation_rate)
+            with Nsga2(exchange, symbol, strategy, timeframe, start_time, end_time, population_size) as nsga2:
+                # A previous run of this market and strategy: continue it, or start from its best front
+                checkpoint = nsga2.load_checkpoint()
+                resume, seed = False, None
+                if checkpoint is not None and not checkpoint['complete']:
+                    mismatch = nsga2.checkpoint_mismatch(checkpoint, mutation_rate)
+                    if mismatch is None:
+                        resume = get_choice(f"Resume the run stopped after generation {checkpoint['generation']}? "
+                                            f"(y/n): ", ['y', 'n']) == 'y'
+                    else:
+                        logger.warning(f"The run stopped after generation {checkpoint['generation']} cannot be "
+                                       f"resumed: {mismatch}.")
+                if checkpoint is not None and not resume:
+                    if get_choice('Seed the population with the previous Pareto front? (y/n): ', ['y', 'n']) == 'y':
+                        seed = nsga2.pareto_front()
+
+                parents = nsga2.run(generations, mutation_rate, resume=resume, seed=seed)
             
             # Print best result
             if parents:
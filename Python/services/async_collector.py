@@ -0,0 +1,171 @@
+"""Concurrent backfill: splits missing time ranges into windows fetched in parallel."""
+from typing import List, Optional, Tuple, Union
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from exchanges.base import ExchangeRequestError
+from exchanges.binance import BinanceClient
+from exchanges.okx import OkxClient
+from common.config import ONE_MINUTE_MS, RATE_LIMITS
+from common.utils import ms_to_datetime
+from services.storage import get_storage_client
+
+logger = logging.getLogger()
+
+# Candles fetched before each merge into storage; bounds memory during long backfills
+WRITE_BATCH_CANDLES = 200_000
+
+
+def split_windows(from_time: int, to_time: int, page_size: int) -> List[Tuple[int, int]]:
+    """Split [from_time, to_time] into inclusive windows of at most one page of 1m candles."""
+    step = page_size * ONE_MINUTE_MS
+    return [(start, min(start + step - ONE_MINUTE_MS, to_time)) for start in range(from_time, to_time + 1, step)]
+
+
+async def collect_range(client: Union[BinanceClient, OkxClient], storage, symbol: str,
+                        from_time: int, to_time: int, concurrency: int) -> int:
+    """
+    Fetch every window of [from_time, to_time] with up to `concurrency` requests in flight,
+    merging each batch into storage in timestamp order. Requests run in worker threads
+    through the client's own request logic and rate limiter. Returns the candles written.
+    """
+    windows = split_windows(from_time, to_time, client.page_size)
+    written, _ = await collect_windows(client, storage, symbol, windows, concurrency)
+    return written
+
+
+async def collect_windows(client: Union[BinanceClient, OkxClient], storage, symbol: str,
+                          windows: List[Tuple[int, int]], concurrency: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """Fetch the given inclusive windows like collect_range; returns candles written and failed windows."""
+    batch_windows = max(concurrency, WRITE_BATCH_CANDLES // client.page_size)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    failed_windows = []
+
+    async def fetch(window: Tuple[int, int]) -> Optional[np.ndarray]:
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(client.get_candles_between, symbol, *window)
+            except ExchangeRequestError as e:
+                logger.error(f'{symbol}: window {ms_to_datetime(window[0])} failed: {e}')
+                failed_windows.append(window)
+                return None
+
+    written = 0
+    empty_windows = 0
+    start = time.time()
+
+    for offset in range(0, len(windows), batch_windows):
+        batch = windows[offset:offset + batch_windows]
+        results = await asyncio.gather(*(fetch(window) for window in batch))
+
+        pages = [candles for candles in results if candles is not None]
+        empty_windows += len(batch) - len(pages)
+        if pages:
+            written += storage.write_data(symbol, np.concatenate(pages))
+
+        logger.info(f'{symbol}: {offset + len(batch)}/{len(windows)} windows up to '
+                    f'{ms_to_datetime(batch[-1][1])}, {written} candles written '
+                    f'({written / max(time.time() - start, 1e-9):.0f} candles/s).')
+
+    if failed_windows:
+        logger.error(f'{symbol}: {len(failed_windows)} windows failed after retries; '
+                     f'run the collection again to fill them.')
+    if empty_windows > len(failed_windows):
+        logger.warning(f'{symbol}: {empty_windows - len(failed_windows)} windows returned no candles.')
+
+    return written, failed_windows
+
+
+async def _collect_missing(client: Union[BinanceClient, OkxClient], storage, symbol: str,
+                           concurrency: int) -> int:
+    now = int(time.time() * 1000)
+    now -= now % ONE_MINUTE_MS
+
+    try:
+        earliest = await asyncio.to_thread(client.get_first_timestamp, symbol)
+    except ExchangeRequestError as e:
+        logger.error(f'Could not find the first candle of {symbol}: {e}')
+        return 0
+    if earliest is None:
+        logger.warning(f'Could not find the first candle of {symbol}.')
+        return 0
+
+    oldest_db, recent_db = storage.get_first_last_candle(symbol)
+    if oldest_db is None:
+        ranges = [(earliest, now)]
+    else:
+        ranges = [(earliest, int(oldest_db) - ONE_MINUTE_MS), (int(recent_db) + ONE_MINUTE_MS, now)]
+
+    written = 0
+    for from_time, to_time in ranges:
+        if from_time <= to_time:
+            logger.info(f'Collecting {symbol} from {ms_to_datetime(from_time)} to {ms_to_datetime(to_time)}...')
+            written += await collect_range(client, storage, symbol, from_time, to_time, concurrency)
+    return written
+
+
+def collect_all_async(client: Union[BinanceClient, OkxClient], exchange: str, symbol: str,
+                      concurrency: Optional[int] = None) -> int:
+    """
+    Collect the full history of a symbol, fetching the ranges missing before and after the
+    stored data concurrently within the exchange request budget (common.config.RATE_LIMITS).
+    """
+    storage = get_storage_client(exchange)
+    storage.create_dataset(symbol)
+    storage.start_swmr()
+
+    if concurrency is None:
+        concurrency = RATE_LIMITS[exchange]['concurrency']
+
+    written = asyncio.run(_collect_missing(client, storage, symbol, concurrency))
+    logger.info(f'Collected {written} new candles for {exchange} {symbol}.')
+    return written
+
+
+async def _repair(client: Union[BinanceClient, OkxClient], storage, symbol: str, concurrency: int) -> int:
+    gaps = storage.get_gaps(symbol)
+    todo = gaps[gaps[:, 2] == 0]
+    if len(todo) == 0:
+        logger.info(f'No repairable gaps in {symbol} ({len(gaps)} known unfillable).')
+        return 0
+
+    windows = [window for first, last, _ in todo.astype(np.int64)
+               for window in split_windows(int(first), int(last), client.page_size)]
+    logger.info(f'Repairing {len(todo)} gaps of {symbol} '
+                f'({int(((todo[:, 1] - todo[:, 0]) // ONE_MINUTE_MS + 1).sum())} candles, {len(windows)} requests)...')
+
+    written, failed_windows = await collect_windows(client, storage, symbol, windows, concurrency)
+
+    # Holes left inside requested ranges, outside failed windows, are missing on the exchange too
+    remaining = storage.get_gaps(symbol)
+    owner = np.searchsorted(gaps[:, 0], remaining[:, 0], side='right') - 1
+    requested = (owner >= 0) & (gaps[np.maximum(owner, 0), 2] == 0)
+    for first, last in failed_windows:
+        requested &= (remaining[:, 1] < first) | (remaining[:, 0] > last)
+    remaining[requested, 2] = 1
+    storage.set_gaps(symbol, remaining, int(storage.get_metadata(symbol)['row_count']))
+
+    logger.info(f'Repaired {symbol}: {written} candles written, {int(requested.sum())} gaps confirmed '
+                f'missing on the exchange, {len(failed_windows)} requests failed.')
+    return written
+
+
+def repair_gaps(client: Union[BinanceClient, OkxClient], exchange: str, symbol: str,
+                concurrency: Optional[int] = None) -> int:
+    """
+    Fill the holes inside the stored range of a symbol, fetching only the missing minutes
+    listed in its gap index, concurrently within the exchange request budget. Holes the
+    exchange has no candles for are flagged in the index and skipped by later repairs.
+    """
+    storage = get_storage_client(exchange)
+    storage.create_dataset(symbol)
+    storage.start_swmr()
+
+    if concurrency is None:
+        concurrency = RATE_LIMITS[exchange]['concurrency']
+
+    return asyncio.run(_repair(client, storage, symbol, concurrency))
@@ -0,0 +1,331 @@
+"""Memory-mapped columnar candle store, an alternative backend to Hdf5Client."""
+from typing import Dict, Sequence, Tuple, Union
+import contextlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from common.config import DATA_DIR
+from common.utils import resample_timeframe
+from services.database import (CHECKPOINT_GROUP, GAP_GROUP, METADATA_ATTRS, PYRAMID_TIMEFRAMES,
+                               aggregate_candles, clip_buckets, complete_timeframe, day_rows, gap_change,
+                               index_gaps, merge_rows, stored_mask, to_dataframe, unique_candles)
+
+logger = logging.getLogger()
+
+# One raw little-endian file per column: data/<exchange>_columnar/<symbol>/<timeframe>/<column>.bin,
+# named <column>.<generation>.bin once stored rows have been rewritten (see _merge_rows)
+COLUMNS = (
+    ('timestamp', np.dtype('<i8')),
+    ('open', np.dtype('<f8')),
+    ('high', np.dtype('<f8')),
+    ('low', np.dtype('<f8')),
+    ('close', np.dtype('<f8')),
+    ('volume', np.dtype('<f8')),
+)
+
+# Times meta.json is re-read when its column files disappear under the reader (a writer switching
+# generations) before the store is considered damaged
+MAP_ATTEMPTS = 3
+
+
+class ColumnarClient:
+    """
+    Candle store with the Hdf5Client interface, keeping every column in its own flat file.
+
+    Reads map the files read-only with np.memmap, so any number of backtest and optimizer
+    processes share the OS page cache instead of holding private copies. meta.json, replaced
+    atomically after the column files are written, holds the row count and file generation that
+    readers map: appends go past the mapped rows, and writes that change stored rows go to a new
+    generation of files, so a reader never sees a half-written or shifted row. Readers need no
+    locking or refresh: each query maps the current row count.
+    """
+
+    def __init__(self, exchange: str, readonly: bool = False):
+        self.exchange = exchange
+        self.readonly = readonly
+        self.root = os.path.join(DATA_DIR, f'{exchange}_columnar')
+        if not readonly:
+            os.makedirs(self.root, exist_ok=True)
+
+        # (symbol, timeframe) -> ((row_count, generation), {column: memmap})
+        self._maps = {}
+
+    def _directory(self, symbol: str, timeframe: str = '1m') -> str:
+        return os.path.join(self.root, symbol, timeframe)
+
+    def _read_meta(self, symbol: str, timeframe: str = '1m') -> dict:
+        path = os.path.join(self._directory(symbol, timeframe), 'meta.json')
+        if not os.path.exists(path):
+            return {'row_count': 0}
+        with open(path) as f:
+            return json.load(f)
+
+    def _column_path(self, symbol: str, timeframe: str, name: str, generation: int) -> str:
+        suffix = f'.{generation}' if generation else ''
+        return os.path.join(self._directory(symbol, timeframe), f'{name}{suffix}.bin')
+
+    def _write_meta(self, symbol: str, timeframe: str, meta: dict) -> None:
+        path = os.path.join(self._directory(symbol, timeframe), 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def _columns(self, symbol: str, timeframe: str = '1m') -> Dict[str, np.ndarray]:
+        """Return read-only column arrays of a symbol, remapping only when rows were added."""
+        for _ in range(MAP_ATTEMPTS):
+            meta = self._read_meta(symbol, timeframe)
+            version = meta['row_count'], meta.get('generation', 0)
+            cached = self._maps.get((symbol, timeframe))
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+            row_count, generation = version
+            try:
+                columns = {
+                    name: np.memmap(self._column_path(symbol, timeframe, name, generation), dtype=dtype, mode='r',
+                                    shape=(row_count,))
+                    if row_count else np.empty(0, dtype=dtype)
+                    for name, dtype in COLUMNS
+                }
+            except FileNotFoundError as e:
+                # The writer switched to a new generation after meta.json was read
+                missing = e.filename
+                continue
+            self._maps[(symbol, timeframe)] = (version, columns)
+            return columns
+
+        raise FileNotFoundError(f'{symbol} {timeframe} in {self.root} lists {row_count} rows of generation '
+                                f'{generation}, but {missing} is missing; rebuild the store with convert_hdf5.')
+
+    def _rows(self, columns: Dict[str, np.ndarray], start: int, end: int) -> np.ndarray:
+        return np.column_stack([columns[name][start:end].astype(np.float64) for name, _ in COLUMNS])
+
+    def _minute_rows(self, symbol: str, from_time: float, to_time: float) -> np.ndarray:
+        """Return the 1m rows between from_time and to_time (inclusive)."""
+        columns = self._columns(symbol)
+        start = np.searchsorted(columns['timestamp'], from_time, side='left')
+        end = np.searchsorted(columns['timestamp'], to_time, side='right')
+        return self._rows(columns, start, end)
+
+    def _merge_rows(self, symbol: str, timeframe: str, rows: np.ndarray, meta: dict) -> None:
+        """
+        Merge sorted rows into the columns of a timeframe (see merge_rows), replacing rows with the
+        same timestamp, then commit `meta` with the new row count.
+
+        Rows after the committed ones are written in place, since readers only map up to the
+        committed row count, and so is a new last row: on a timeframe it is the open bucket, which
+        is re-aggregated on every append and whose values readers may see change. A merge that
+        moves or replaces earlier committed rows (backfill, gap fills) writes a new generation of
+        the files from the mapped old one, so readers keep their mapping of the old files and a
+        crash before meta.json is replaced leaves the store as it was.
+        """
+        os.makedirs(self._directory(symbol, timeframe), exist_ok=True)
+        generation = self._read_meta(symbol, timeframe).get('generation', 0)
+        columns = self._columns(symbol, timeframe)
+        timestamps = columns['timestamp']
+        rewrite = len(timestamps) > 0 and rows[0, 0] < timestamps[-1]
+        target = generation + 1 if rewrite else generation
+
+        with contextlib.ExitStack() as stack:
+            files = []
+            for name, _ in COLUMNS:
+                path = self._column_path(symbol, timeframe, name, target)
+                if rewrite:
+                    # The rows before the insert position are kept as they are
+                    shutil.copyfile(self._column_path(symbol, timeframe, name, generation), path)
+                files.append(stack.enter_context(open(path, 'r+b' if os.path.exists(path) else 'wb')))
+
+            def write(start: int, block: np.ndarray) -> None:
+                for i, (f, (_, dtype)) in enumerate(zip(files, COLUMNS)):
+                    f.seek(start * dtype.itemsize)
+                    f.write(block[:, i].astype(dtype).tobytes())
+
+            merge_rows(timestamps, rows, lambda start, end: self._rows(columns, start, end), write)
+            for f in files:
+                f.flush()
+                os.fsync(f.fileno())
+
+        row_count = len(timestamps) + int((~stored_mask(timestamps, rows[:, 0])).sum())
+        self._write_meta(symbol, timeframe, {**meta, 'row_count': row_count, 'generation': target})
+        if rewrite:
+            for name, _ in COLUMNS:
+                try:
+                    os.remove(self._column_path(symbol, timeframe, name, generation))
+                except OSError:
+                    # Platforms that cannot unlink a mapped file keep it; nothing references it any more
+                    pass
+
+    def create_dataset(self, symbol: str):
+        if not os.path.exists(os.path.join(self._directory(symbol), 'meta.json')):
+            os.makedirs(self._directory(symbol), exist_ok=True)
+            self._write_meta(symbol, '1m', {'row_count': 0, 'first_timestamp': None, 'last_timestamp': None,
+                                            'gap_count': 0, 'missing_candles': 0})
+
+    def start_swmr(self) -> None:
+        """Readers never block on this store; kept for interface parity with Hdf5Client."""
+
+    def write_data(self, symbol: str, data: Union[np.ndarray, Sequence[Sequence]]) -> int:
+        """Merge candles into the symbol columns; same semantics as Hdf5Client.write_data."""
+        data_array = unique_candles(data)
+        metadata = self.get_metadata(symbol)
+        columns = self._columns(symbol)
+        timestamps = columns['timestamp']
+
+        data_array = data_array[~stored_mask(timestamps, data_array[:, 0])]
+        if len(data_array) == 0:
+            logger.warning(f'No new data found for {symbol}.')
+            return 0
+
+        gaps = gap_change(timestamps, data_array[:, 0])
+        touched = day_rows(timestamps, data_array, lambda start, end: self._rows(columns, start, end))
+
+        # The 1m rows are committed first, like Hdf5Client.write_data: a crash in between leaves
+        # timeframe buckets that can be rebuilt from them, never buckets of candles not stored
+        stored = metadata['row_count'] > 0
+        self._merge_rows(symbol, '1m', data_array, {
+            **self._read_meta(symbol),
+            'first_timestamp': min(metadata['first_timestamp'], data_array[0, 0]) if stored else data_array[0, 0],
+            'last_timestamp': max(metadata['last_timestamp'], data_array[-1, 0]) if stored else data_array[-1, 0],
+            'gap_count': metadata['gap_count'] + gaps[0],
+            'missing_candles': metadata['missing_candles'] + gaps[1],
+        })
+        self._update_timeframes(symbol, touched, data_array[0, 0])
+
+        return len(data_array)
+
+    def _update_timeframes(self, symbol: str, rows: np.ndarray, since: float) -> None:
+        """
+        Re-aggregate the buckets of the days covered by `rows`, which hold every 1m candle of them,
+        from the bucket of `since` (the first new candle) on: earlier buckets are unchanged, and
+        leaving them out keeps an append from rewriting committed rows.
+        """
+        for timeframe, width in PYRAMID_TIMEFRAMES.items():
+            buckets = aggregate_candles(rows, width)
+            self._merge_rows(symbol, timeframe, buckets[buckets[:, 0] >= since - since % width], {})
+
+    def get_metadata(self, symbol: str) -> dict:
+        """Return first/last timestamp, row count and gap summary without reading the rows."""
+        meta = self._read_meta(symbol)
+        return {attr: meta.get(attr, 0) for attr in METADATA_ATTRS}
+
+    def get_data(self, symbol: str, from_time: int, to_time: int,
+                 timeframe: str = '1m') -> Union[None, pd.DataFrame]:
+        """Return candles between from_time and to_time (ms, inclusive), like Hdf5Client.get_data."""
+        base = timeframe if timeframe == '1m' or timeframe in PYRAMID_TIMEFRAMES else '1d'
+
+        if base != '1m' and self._read_meta(symbol, base)['row_count'] == 0:
+            df = self.get_data(symbol, from_time, to_time)
+            return None if df is None else resample_timeframe(df, timeframe)
+
+        start_query = time.time()
+
+        columns = self._columns(symbol, base)
+        timestamps = columns['timestamp']
+
+        if len(timestamps) == 0:
+            return None
+
+        width = PYRAMID_TIMEFRAMES.get(base, 1)
+        start = np.searchsorted(timestamps, from_time - from_time % width, side='left')
+        end = np.searchsorted(timestamps, to_time, side='right')
+
+        if base != '1m':
+            buckets = clip_buckets(self._rows(columns, start, end), width, from_time, to_time,
+                                   lambda first, last: self._minute_rows(symbol, first, last))
+            df = complete_timeframe(to_dataframe(buckets), base, timeframe)
+        else:
+            # Price columns are handed to pandas as views of the mapped files
+            df = pd.DataFrame({name: columns[name][start:end] for name, _ in COLUMNS[1:]},
+                              index=pd.to_datetime(timestamps[start:end], unit='ms'), copy=False)
+            df.index.name = 'date'
+
+        query_time = round(time.time() - start_query, 2)
+        logger.info(f'Retrieved {len(df)} {timeframe} candles for {symbol} from {from_time} to {to_time} '
+                    f'({end - start} rows scanned) in {query_time} seconds.')
+
+        return df
+
+    def get_first_last_candle(self, symbol: str) -> Union[Tuple[None, None], Tuple[float, float]]:
+
+        metadata = self.get_metadata(symbol)
+
+        if metadata['row_count'] == 0:
+            return None, None
+
+        return metadata['first_timestamp'], metadata['last_timestamp']
+
+    def get_symbols(self) -> list:
+        """Return the symbols stored under this exchange."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(symbol for symbol in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self._directory(symbol), 'meta.json')))
+
+    def get_gaps(self, symbol: str) -> np.ndarray:
+        """Return the gap index of a symbol, rescanning it when rows were added; see Hdf5Client.get_gaps."""
+        meta = self._read_meta(symbol)
+        path = os.path.join(self._directory(symbol), 'gaps.npy')
+        previous = np.load(path) if os.path.exists(path) else np.empty((0, 3))
+
+        if meta.get('gaps_row_count') == meta['row_count']:
+            return previous
+
+        gaps = index_gaps(self._columns(symbol)['timestamp'], previous)
+        if not self.readonly:
+            self.set_gaps(symbol, gaps, meta['row_count'])
+        return gaps
+
+    def set_gaps(self, symbol: str, gaps: np.ndarray, row_count: int) -> None:
+        """Store the gap index of a symbol, built from its first `row_count` rows."""
+        path = os.path.join(self._directory(symbol), 'gaps.npy')
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, gaps)
+        os.replace(path + '.tmp', path)
+        self._write_meta(symbol, '1m', {**self._read_meta(symbol), 'gaps_row_count': row_count})
+
+    def get_checkpoint(self, symbol: str) -> Tuple[Union[None, float], bool]:
+        """Return the backfill checkpoint: oldest fetched timestamp (None if never set) and completion."""
+        meta = self._read_meta(symbol)
+        return meta.get('backfill_oldest'), meta.get('backfill_complete', False)
+
+    def set_checkpoint(self, symbol: str, oldest: float, complete: bool = False) -> None:
+        """Record backfill progress. Call only after the candles up to `oldest` are written."""
+        self._write_meta(symbol, '1m', {**self._read_meta(symbol),
+                                        'backfill_oldest': float(oldest), 'backfill_complete': complete})
+
+
+def convert_hdf5(exchange: str) -> None:
+    """Rebuild data/<exchange>_columnar from data/<exchange>.h5, replacing any previous copy."""
+    path = os.path.join(DATA_DIR, f'{exchange}.h5')
+
+    if not os.path.exists(path):
+        logger.warning(f'No data file found for {exchange}.')
+        return
+
+    start = time.time()
+    client = ColumnarClient(exchange)
+
+    with h5py.File(path, 'r') as src:
+        for symbol, dataset in src.items():
+            if not isinstance(dataset, h5py.Dataset):
+                continue
+
+            shutil.rmtree(os.path.join(client.root, symbol), ignore_errors=True)
+            client.create_dataset(symbol)
+            rows = client.write_data(symbol, dataset[:])
+            if f'{GAP_GROUP}/{symbol}' in src:
+                client.set_gaps(symbol, src[f'{GAP_GROUP}/{symbol}'][:], -1)
+            if f'{CHECKPOINT_GROUP}/{symbol}' in src:
+                oldest, complete = src[f'{CHECKPOINT_GROUP}/{symbol}'][:]
+                if not np.isnan(oldest):
+                    client.set_checkpoint(symbol, float(oldest), bool(complete))
+            logger.info(f'Converted {symbol}: {rows} rows.')
+
+    logger.info(f'Converted {exchange} to columnar storage in {round(time.time() - start, 2)} seconds.')
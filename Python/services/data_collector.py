@@ -2,123 +2,145 @@ from typing import Union
 import logging
 import time
 
+import numpy as np
+
+from exchanges.base import ExchangeRequestError
 from exchanges.binance import BinanceClient
 from exchanges.okx import OkxClient
+from common.config import ONE_MINUTE_MS
 from common.utils import ms_to_datetime
-from services.database import Hdf5Client
+from services.async_collector import WRITE_BATCH_CANDLES
+from services.storage import get_storage_client
 
 logger = logging.getLogger()
 
-ONE_MINUTE_MS = 60000
-
-def collect_all(client: Union[BinanceClient, OkxClient], exchange: str, symbol: str) -> None:
-
-    hdf5_client = Hdf5Client(exchange)
-    hdf5_client.create_dataset(symbol)
-
+def collect_all(client: Union[BinanceClient, OkxClient], exchange: str, symbol: str) -> int:
     """
     Collects all available historical kline data for a symbol from the given exchange.
-    First fetches the latest data chunk to establish a baseline, then fills forwards (recent)
-    and backwards (historical).
+    First fetches the latest data chunk to establish a baseline, then fills backwards (historical)
+    and forwards (recent). Returns the number of candles written.
+
+    Backfilled pages are written in batches of WRITE_BATCH_CANDLES, each followed by a checkpoint
+    of the oldest fetched timestamp, so memory stays bounded and an interrupted run resumes from
+    the last checkpoint. Pacing is left to the client's rate limiter.
     """
-    
+    storage = get_storage_client(exchange)
+    storage.create_dataset(symbol)
+    storage.start_swmr()
+
     # 1. Initial Request
     current_time = int(time.time() * 1000)
-    initial_candles = client.get_historical_data(symbol, end_time=current_time)
+    try:
+        initial_candles = client.get_historical_data(symbol, end_time=current_time)
+    except ExchangeRequestError as e:
+        logger.error(f'Could not fetch the latest candles of {exchange} {symbol}: {e}')
+        return 0
 
-    if not initial_candles:
+    if initial_candles is None:
         logger.warning(f'No data found for {exchange} {symbol}.')
-        return
+        return 0
 
-    if initial_candles[0][0] > initial_candles[-1][0]:
-        initial_candles.reverse()
+    oldest_db, recent_db = storage.get_first_last_candle(symbol)
+    checkpoint, backfill_complete = storage.get_checkpoint(symbol)
 
-    oldest_db, recent_db = hdf5_client.get_first_last_candle(symbol)
-    
     if oldest_db is None or recent_db is None:
         logger.info(f"No existing data for {symbol} in database. Starting fresh.")
         oldest_candle_time = initial_candles[0][0]
         recent_candle_time = initial_candles[-1][0]
     else:
         logger.info(f"Found existing data for {symbol}. Resuming...")
-        oldest_candle_time = oldest_db
+        oldest_candle_time = oldest_db if checkpoint is None else min(checkpoint, oldest_db)
         recent_candle_time = recent_db
 
     logger.info(f'Current range: {ms_to_datetime(oldest_candle_time)} to {ms_to_datetime(recent_candle_time)}.')
-    
-    all_history_candles = list(initial_candles)
 
+    written = storage.write_data(symbol, initial_candles)
+
+    # 2. Collect Older Data (Backfill)
+    if backfill_complete:
+        logger.info(f"Backfill already complete for {symbol}.")
+    else:
+        written += _backfill(client, storage, symbol, oldest_candle_time)
+
+    # 3. Collect Recent Data (Forward fill)
+    logger.info("Starting forward fill (recent data)...")
+    try:
+        while True:
+            target_start = int(recent_candle_time + ONE_MINUTE_MS)
+            candles = client.get_historical_data(symbol, start_time=target_start)
+
+            if candles is None:
+                break
+
+            # Deduplicate
+            candles = candles[candles[:, 0] > recent_candle_time]
+
+            if len(candles) == 0:
+                break
+
+            recent_candle_time = candles[-1][0]
+            logger.info(f'Forward fill found {len(candles)} candles. '
+                        f'New recent: {ms_to_datetime(recent_candle_time)}.')
+
+            # Write directly (Appends)
+            written += storage.write_data(symbol, candles)
+
+    except KeyboardInterrupt:
+        logger.warning("Forward fill interrupted by user.")
+
+    except ExchangeRequestError as e:
+        logger.error(f"Forward fill stopped before reaching the present: {e}")
+
+    return written
+
+
+def _backfill(client: Union[BinanceClient, OkxClient], storage, symbol: str, oldest_candle_time: float) -> int:
+    """Page backwards from oldest_candle_time until the exchange has no older candles."""
+    pages = []
+    buffered = 0
+    written = 0
+    complete = False
+
+    logger.info("Starting backfill (older data)...")
     try:
-        # 2. Collect Older Data (Backfill)
-        logger.info("Starting backfill (older data)...")
         while True:
             target_end = int(oldest_candle_time - ONE_MINUTE_MS)
             candles = client.get_historical_data(symbol, end_time=target_end)
 
-            if not candles:
+            if candles is None:
                 logger.info(f"Backfill complete for {symbol}. No older data returned.")
+                complete = True
                 break
-                
-            if candles[0][0] > candles[-1][0]:
-                candles.reverse()
 
             # Deduplicate
-            if candles[-1][0] >= oldest_candle_time:
-                candles = [c for c in candles if c[0] < oldest_candle_time]
-                
-            if not candles:
+            candles = candles[candles[:, 0] < oldest_candle_time]
+
+            if len(candles) == 0:
                 logger.info("Backfill: No new unique candles found, stopping.")
+                complete = True
                 break
 
             oldest_candle_time = candles[0][0]
-            
-            # Prepend to history
-            all_history_candles = candles + all_history_candles
-            
+            pages.append(candles)
+            buffered += len(candles)
+
             logger.info(f'Backfill found {len(candles)} candles. '
                         f'New oldest: {ms_to_datetime(oldest_candle_time)}.')
-            
-            time.sleep(0.5)
+
+            if buffered >= WRITE_BATCH_CANDLES:
+                # Pages arrive newest first; reversing keeps the batch in timestamp order
+                written += storage.write_data(symbol, np.concatenate(pages[::-1]))
+                storage.set_checkpoint(symbol, oldest_candle_time)
+                pages, buffered = [], 0
 
     except KeyboardInterrupt:
         logger.warning("Backfill interrupted by user. Saving collected data...")
-    
+
     except Exception as e:
         logger.error(f"An error occurred during backfill: {e}")
 
-    # Write all history (Backfill + Initial) to DB once
-    if all_history_candles:
-        logger.info(f"Writing {len(all_history_candles)} historical candles to database...")
-        hdf5_client.write_data(symbol, all_history_candles)
-    
-    # 3. Collect Recent Data (Forward fill)
-    logger.info("Starting forward fill (recent data)...")
-    try:
-        while True:
-            target_start = int(recent_candle_time + ONE_MINUTE_MS)
-            candles = client.get_historical_data(symbol, start_time=target_start)
-
-            if not candles:
-                break
-                
-            if candles[0][0] > candles[-1][0]:
-                candles.reverse()
-
-            # Deduplicate
-            if candles[0][0] <= recent_candle_time:
-                candles = [c for c in candles if c[0] > recent_candle_time]
-                
-            if not candles:
-                break
+    if pages:
+        written += storage.write_data(symbol, np.concatenate(pages[::-1]))
+    storage.set_checkpoint(symbol, oldest_candle_time, complete)
 
-            recent_candle_time = candles[-1][0]
-            logger.info(f'Forward fill found {len(candles)} candles. '
-                        f'New recent: {ms_to_datetime(recent_candle_time)}.')
-            
-            # Write directly (Appends)
-            hdf5_client.write_data(symbol, candles)
-            
-            time.sleep(0.5)
-            
-    except KeyboardInterrupt:
-        logger.warning("Forward fill interrupted by user.")
+    return written
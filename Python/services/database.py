@@ -1,83 +1,691 @@
-from typing import Tuple, Union
+from typing import Callable, Dict, Sequence, Tuple, Union
 import logging
 import h5py
 import numpy as np
 import pandas as pd
 import time
 import os
-from common.config import DATA_DIR
+from common.config import DATA_DIR, ONE_MINUTE_MS, TIMEFRAMES
+from common.utils import resample_timeframe
 
 logger = logging.getLogger()
 
+# Storage layout: version 2 keeps rows sorted by timestamp in compressed chunks
+LAYOUT_VERSION = 2
+CHUNK_ROWS = 4096  # 4096 x 6 float64 = 192 KiB per chunk before compression
+CHUNK_CACHE_BYTES = 32 * 1024 * 1024
+
+
+# Fixed-width timeframes are pre-aggregated next to the 1m rows, under
+# /_timeframes/<symbol>/<timeframe>. Calendar timeframes (1w, 1M) are resampled from 1d.
+TIMEFRAME_GROUP = '_timeframes'
+PYRAMID_TIMEFRAMES = {
+    timeframe: int(pd.Timedelta(TIMEFRAMES[timeframe]).total_seconds() * 1000)
+    for timeframe in ('5m', '15m', '30m', '1h', '4h', '1d')
+}
+MINUTES_PER_DAY = 1440
+DAY_MS = PYRAMID_TIMEFRAMES['1d']
+
+# Stored rows merged per step when new candles land before existing ones: 64Ki rows x 6 float64 = 3 MiB
+MERGE_CHUNK_ROWS = 16 * CHUNK_ROWS
+
+# Per-symbol summary kept in dataset attributes so writers and planners never scan
+METADATA_ATTRS = ('first_timestamp', 'last_timestamp', 'row_count', 'gap_count', 'missing_candles')
+
+# Backfill progress per symbol as [oldest fetched timestamp, listing date reached]. Kept in a small
+# dataset rather than attributes: SWMR writers cannot grow an object header to add attributes.
+CHECKPOINT_GROUP = '_checkpoints'
+
+# Missing 1m ranges per symbol as rows of [first missing, last missing, unfillable], where
+# unfillable marks holes a repair already requested that the exchange has no candles for
+GAP_GROUP = '_gaps'
+
+
+def gap_summary(timestamps: np.ndarray) -> Tuple[int, int]:
+    """Count holes between consecutive sorted timestamps and the 1m candles missing in them."""
+    steps = np.diff(timestamps)
+    gaps = steps[steps > ONE_MINUTE_MS]
+    return len(gaps), int(((gaps - ONE_MINUTE_MS) // ONE_MINUTE_MS).sum())
+
+
+def find_gaps(timestamps: np.ndarray) -> np.ndarray:
+    """Return the missing 1m candles between sorted timestamps as (n, 2) inclusive ranges."""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    holes = np.flatnonzero(np.diff(timestamps) > ONE_MINUTE_MS)
+    return np.column_stack([timestamps[holes] + ONE_MINUTE_MS, timestamps[holes + 1] - ONE_MINUTE_MS])
+
+
+def index_gaps(timestamps: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """Build the gap index of sorted timestamps, keeping unfillable flags of unchanged holes."""
+    gaps = find_gaps(timestamps)
+    flags = np.zeros(len(gaps))
+    if len(gaps) and len(previous):
+        slots = np.minimum(np.searchsorted(previous[:, 0], gaps[:, 0]), len(previous) - 1)
+        same = (previous[slots, 0] == gaps[:, 0]) & (previous[slots, 1] == gaps[:, 1])
+        flags[same] = previous[slots[same], 2]
+    return np.column_stack([gaps, flags])
+
+
+def _compute_metadata(timestamps: np.ndarray) -> dict:
+    """Compute all metadata attributes from the full, sorted timestamp column."""
+    gap_count, missing_candles = gap_summary(timestamps)
+    return {
+        'first_timestamp': timestamps[0] if len(timestamps) else np.nan,
+        'last_timestamp': timestamps[-1] if len(timestamps) else np.nan,
+        'row_count': len(timestamps),
+        'gap_count': gap_count,
+        'missing_candles': missing_candles,
+    }
+
+
+def _write_metadata(dataset: h5py.Dataset, timestamps: np.ndarray) -> None:
+    dataset.attrs.update(_compute_metadata(timestamps))
+
+
+def _modify_attrs(dataset: h5py.Dataset, values: dict) -> None:
+    """Overwrite existing attributes in place. Assignment recreates them, which SWMR writers cannot do."""
+    for name, value in values.items():
+        dataset.attrs.modify(name, value)
+
+
+def to_candle_array(data: Union[np.ndarray, Sequence[Sequence]]) -> np.ndarray:
+    """Convert candles (array, tuples or raw exchange kline rows) to a float64 (n, 6) array."""
+    if isinstance(data, np.ndarray):
+        return np.asarray(data[:, :6], dtype=np.float64).reshape(-1, 6)
+    if len(data) == 0:
+        return np.empty((0, 6))
+    # Exchanges send numbers as strings and extra trailing fields; numpy parses both
+    return np.array([row[:6] for row in data], dtype=np.float64)
+
+
+def unique_candles(data: Union[np.ndarray, Sequence[Sequence]]) -> np.ndarray:
+    """Convert candles to an array sorted by timestamp, keeping the last copy of each timestamp."""
+    data_array = to_candle_array(data)[::-1]
+    _, last_rows = np.unique(data_array[:, 0], return_index=True)
+    return data_array[last_rows]
+
+
+def _create_candle_dataset(file: h5py.File, path: str, rows: int = 0) -> h5py.Dataset:
+    return file.create_dataset(path, (rows, 6), maxshape=(None, 6), dtype='float64',
+                               chunks=(CHUNK_ROWS, 6), compression='gzip', compression_opts=1,
+                               shuffle=True)
+
+
+def _create_symbol_dataset(file: h5py.File, symbol: str, rows: int = 0) -> h5py.Dataset:
+    dataset = _create_candle_dataset(file, symbol, rows)
+    dataset.attrs['layout_version'] = LAYOUT_VERSION
+    _write_metadata(dataset, np.empty(0))
+    return dataset
+
+
+def _create_gap_dataset(file: h5py.File, symbol: str, gaps: np.ndarray = np.empty((0, 3)),
+                        row_count: int = -1) -> h5py.Dataset:
+    dataset = file.create_dataset(f'{GAP_GROUP}/{symbol}', data=gaps, maxshape=(None, 3), chunks=(256, 3))
+    # Symbol row count the index was built from; -1 until the first scan
+    dataset.attrs['row_count'] = row_count
+    return dataset
+
+
+def _timeframe_path(symbol: str, timeframe: str) -> str:
+    return f'{TIMEFRAME_GROUP}/{symbol}/{timeframe}'
+
+
+def aggregate_candles(rows: np.ndarray, width: int) -> np.ndarray:
+    """Aggregate sorted 1m rows into OHLCV buckets of `width` ms aligned to the epoch."""
+    if len(rows) == 0:
+        return np.empty((0, 6))
+
+    buckets = rows[:, 0] - rows[:, 0] % width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(rows)]
+
+    aggregated = np.empty((len(starts), 6))
+    aggregated[:, 0] = buckets[starts]
+    aggregated[:, 1] = rows[starts, 1]
+    aggregated[:, 2] = np.maximum.reduceat(rows[:, 2], starts)
+    aggregated[:, 3] = np.minimum.reduceat(rows[:, 3], starts)
+    aggregated[:, 4] = rows[ends - 1, 4]
+    aggregated[:, 5] = np.add.reduceat(rows[:, 5], starts)
+    return aggregated
+
+
+def clip_buckets(buckets: np.ndarray, width: int, from_time: float, to_time: float,
+                 minute_rows: Callable[[float, float], np.ndarray]) -> np.ndarray:
+    """
+    Restrict stored `width` buckets to [from_time, to_time]: the first and last bucket, when they
+    reach past either end, are re-aggregated from the 1m rows inside the range that
+    `minute_rows(first, last)` returns, so no candle outside the range leaks into them.
+    """
+    if len(buckets) == 0:
+        return buckets
+
+    start = 1 if buckets[0, 0] < from_time else 0
+    end = len(buckets) - 1 if buckets[-1, 0] + width - 1 > to_time else len(buckets)
+    if start >= end:
+        # No stored bucket lies wholly inside the range
+        return aggregate_candles(minute_rows(from_time, to_time), width)
+
+    head = aggregate_candles(minute_rows(from_time, buckets[start, 0] - 1), width) if start else buckets[:0]
+    tail = aggregate_candles(minute_rows(buckets[end - 1, 0] + width, to_time), width) \
+        if end < len(buckets) else buckets[:0]
+    return np.concatenate([head, buckets[start:end], tail])
+
+
+def stored_mask(timestamps: np.ndarray, new_timestamps: np.ndarray) -> np.ndarray:
+    """True for the entries of `new_timestamps` already present in the sorted `timestamps`."""
+    if len(timestamps) == 0:
+        return np.zeros(len(new_timestamps), dtype=bool)
+    slots = np.minimum(np.searchsorted(timestamps, new_timestamps), len(timestamps) - 1)
+    return timestamps[slots] == new_timestamps
+
+
+def gap_change(timestamps: np.ndarray, new_timestamps: np.ndarray) -> Tuple[int, int]:
+    """
+    Change of gap_summary() when sorted `new_timestamps`, none of them stored, are merged into
+    sorted `timestamps`. Only the stored neighbours of the new timestamps are looked at.
+    """
+    slots = np.searchsorted(timestamps, new_timestamps)
+    neighbours = np.unique(np.concatenate([timestamps[slots[slots > 0] - 1],
+                                           timestamps[slots[slots < len(timestamps)]]]))
+    # Spans between untouched neighbours appear on both sides and cancel out
+    before = gap_summary(neighbours)
+    after = gap_summary(np.union1d(neighbours, new_timestamps))
+    return after[0] - before[0], after[1] - before[1]
+
+
+def merge_rows(timestamps: np.ndarray, rows: np.ndarray, read: Callable[[int, int], np.ndarray],
+               write: Callable[[int, np.ndarray], None], chunk_rows: int = MERGE_CHUNK_ROWS) -> None:
+    """
+    Merge sorted `rows` into a sorted store whose timestamp column is `timestamps`; a row whose
+    timestamp is stored replaces the stored row. `read(start, end)` returns stored rows and
+    `write(start, rows)` writes merged rows into a store already sized for the result.
+
+    The stored rows after the insert position are merged from the end backwards, one chunk at a
+    time. No merged block lands before the stored rows it was read from, so the merge can run in
+    place, and memory stays within one chunk plus `rows` however long the history is.
+    """
+    new_timestamps = rows[:, 0]
+    start = int(np.searchsorted(timestamps, new_timestamps[0]))
+    end = len(timestamps)
+    out = end + len(rows) - int(stored_mask(timestamps, new_timestamps).sum())
+    remaining = len(rows)
+
+    while end > start:
+        lo = max(end - chunk_rows, start)
+        stored = read(lo, end)
+        first = int(np.searchsorted(new_timestamps[:remaining], stored[0, 0]))
+        block = rows[first:remaining]
+        merged = np.concatenate([stored[~stored_mask(block[:, 0], stored[:, 0])], block])
+        merged = merged[np.argsort(merged[:, 0], kind='stable')]
+        out -= len(merged)
+        write(out, merged)
+        end, remaining = lo, first
+
+    if remaining:
+        write(out - remaining, rows[:remaining])
+
+
+def day_rows(timestamps: np.ndarray, rows: np.ndarray, read: Callable[[int, int], np.ndarray]) -> np.ndarray:
+    """
+    Sorted 1m rows of every day holding one of the new `rows`: the stored rows of those days,
+    read by position in the sorted `timestamps`, merged with `rows`. Every pyramid bucket of
+    these days can be re-aggregated from them.
+    """
+    days = np.unique(rows[:, 0] - rows[:, 0] % DAY_MS)
+    starts = np.searchsorted(timestamps, days)
+    ends = np.searchsorted(timestamps, days + DAY_MS)
+    # Consecutive days without stored rows between them are read in one go
+    breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+    stored = [read(int(first), int(last))
+              for first, last in zip(starts[np.r_[0, breaks]], ends[np.r_[breaks - 1, len(days) - 1]])
+              if last > first]
+    merged = np.concatenate(stored + [rows])
+    return merged[np.argsort(merged[:, 0], kind='stable')]
+
+
+def _merge_dataset(dataset: h5py.Dataset, rows: np.ndarray, offset: int, timestamps: np.ndarray) -> None:
+    """Merge sorted rows into a sorted dataset whose rows from `offset` on have the given timestamps."""
+    dataset.resize(offset + len(timestamps) + int((~stored_mask(timestamps, rows[:, 0])).sum()), axis=0)
+
+    def write(start: int, block: np.ndarray) -> None:
+        dataset[offset + start:offset + start + len(block)] = block
+
+    merge_rows(timestamps, rows, lambda start, end: dataset[offset + start:offset + end], write)
+
+
+def _build_timeframes(file: h5py.File, symbol: str, data: np.ndarray) -> None:
+    """(Re)create every materialized timeframe of a symbol from its full, sorted 1m rows."""
+    for timeframe, width in PYRAMID_TIMEFRAMES.items():
+        path = _timeframe_path(symbol, timeframe)
+        if path in file:
+            del file[path]
+
+        aggregated = aggregate_candles(data, width)
+        dataset = _create_candle_dataset(file, path, len(aggregated))
+        if len(aggregated):
+            dataset[:] = aggregated
+
+
+def to_dataframe(data: np.ndarray) -> pd.DataFrame:
+    df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df = df.rename(columns={'timestamp': 'date'})
+    return df.set_index('date')
+
+
+def complete_timeframe(df: pd.DataFrame, base: str, timeframe: str) -> pd.DataFrame:
+    """Turn stored `base` buckets into `timeframe` rows shaped like resample_timeframe() output."""
+    # Empty buckets are absent on disk; restore them as resample() would
+    df = df.asfreq(TIMEFRAMES[base])
+    df['volume'] = df['volume'].fillna(0.0)
+    if base != timeframe:
+        df = resample_timeframe(df, timeframe)
+    return df
+
+
+# Per-process pool of open files: (path, readonly) -> (file, inode)
+_FILE_POOL: Dict[Tuple[str, bool], Tuple[h5py.File, int]] = {}
+_POOL_PID = os.getpid()
+
+
+def _open_file(path: str, readonly: bool) -> h5py.File:
+    """
+    Return the pooled handle for a file, opening it on first use.
+
+    Writers open with the latest file format so SWMR can be enabled; readers open in SWMR
+    mode when the file supports it; a writer request closes the process's reader handle, which
+    readers then share. Handles are reopened when the file was replaced on disk (compaction) and
+    are never shared with forked children.
+    """
+    global _POOL_PID
+    if _POOL_PID != os.getpid():
+        _FILE_POOL.clear()
+        _POOL_PID = os.getpid()
+
+    inode = os.stat(path).st_ino if os.path.exists(path) else None
+    pooled = _FILE_POOL.get((path, readonly))
+    if pooled is not None and pooled[0].id.valid and pooled[1] == inode:
+        return pooled[0]
+
+    if readonly:
+        writer = _FILE_POOL.get((path, False))
+        if writer is not None and writer[0].id.valid and writer[1] == inode:
+            # HDF5 refuses a second handle on a file this process already writes
+            return writer[0]
+        try:
+            file = h5py.File(path, 'r', libver='latest', swmr=True, rdcc_nbytes=CHUNK_CACHE_BYTES)
+        except OSError:
+            # Files written before the latest format was used cannot be read in SWMR mode
+            file = h5py.File(path, 'r', rdcc_nbytes=CHUNK_CACHE_BYTES)
+    else:
+        reader = _FILE_POOL.pop((path, True), None)
+        if reader is not None and reader[0].id.valid:
+            # HDF5 cannot reopen a file read-write while this process holds it read-only; readers
+            # share the writer's handle from now on
+            reader[0].close()
+        file = h5py.File(path, 'a', libver='latest', rdcc_nbytes=CHUNK_CACHE_BYTES)
+
+    _FILE_POOL[(path, readonly)] = (file, os.stat(path).st_ino)
+    return file
+
+
 class Hdf5Client:
+    """
+    HDF5 candle store for one exchange.
 
-    def __init__(self, exchange: str):
+    The collector is the single writer (readonly=False). Backtests and the optimizer open the
+    file read-only in SWMR mode, so they can run while the collector appends, and see new rows
+    on their next query. Handles come from a per-process pool and are shared between clients.
+    """
+
+    def __init__(self, exchange: str, readonly: bool = False):
         self.exchange = exchange
-        self.file = h5py.File(os.path.join(DATA_DIR, f'{exchange}.h5'), 'a')
-        self.file.flush()
+        self.readonly = readonly
+        self.path = os.path.join(DATA_DIR, f'{exchange}.h5')
+        # Open eagerly so a missing file fails here rather than on the first query
+        _open_file(self.path, readonly)
+
+        # path -> (timestamp column, is_sorted), invalidated on every write
+        self._indexes = {}
+
+    @property
+    def file(self) -> h5py.File:
+        return _open_file(self.path, self.readonly)
+
+    def _dataset(self, path: str) -> h5py.Dataset:
+        dataset = self.file[path]
+        if self.readonly and self.file.swmr_mode:
+            # Pick up rows and attributes appended by the writer since the last query
+            dataset.refresh()
+        return dataset
 
     def create_dataset(self, symbol: str):
-        if symbol not in self.file:
-            self.file.create_dataset(symbol, (0, 6), maxshape=(None, 6), dtype='float64')
+        """
+        Create the symbol dataset with its timeframe pyramid and metadata. HDF5 cannot create
+        objects in SWMR mode, so a writer already switched to it (an earlier symbol collected by
+        this process) is reopened without SWMR; call start_swmr() again once the datasets exist.
+        """
+        needs_pyramid = symbol in self.file and f'{TIMEFRAME_GROUP}/{symbol}' not in self.file \
+            and self.file[symbol].attrs.get('layout_version') == LAYOUT_VERSION
+        needs_metadata = symbol in self.file \
+            and self.file[symbol].attrs.get('row_count') != self.file[symbol].shape[0]
+        needs_checkpoint = f'{CHECKPOINT_GROUP}/{symbol}' not in self.file
+        needs_gaps = f'{GAP_GROUP}/{symbol}' not in self.file
+
+        if symbol not in self.file or needs_pyramid or needs_metadata or needs_checkpoint or needs_gaps:
+            if self.file.swmr_mode:
+                logger.info(f'Reopening {self.exchange}.h5 without SWMR to create {symbol}.')
+                self.file.close()
+
+            if symbol not in self.file:
+                _create_symbol_dataset(self.file, symbol)
+                _build_timeframes(self.file, symbol, np.empty((0, 6)))
+            elif needs_pyramid:
+                _build_timeframes(self.file, symbol, self.file[symbol][:])
+            self.get_metadata(symbol)
+            if needs_checkpoint:
+                self.file.create_dataset(f'{CHECKPOINT_GROUP}/{symbol}', data=np.array([np.nan, 0.0]))
+            if needs_gaps:
+                _create_gap_dataset(self.file, symbol)
             self.file.flush()
 
-    def write_data(self, symbol: str, data: list[Tuple]):
+    def start_swmr(self) -> None:
+        """Switch the writer to SWMR mode so readers can open the file while it is appended to."""
+        if self.file.swmr_mode:
+            return
+        try:
+            self.file.swmr_mode = True
+        except (ValueError, RuntimeError) as e:
+            logger.warning(f'{self.exchange}.h5 does not support SWMR writing ({e}); '
+                           f'readers may not see new rows until the file is compacted.')
+
+    def write_data(self, symbol: str, data: Union[np.ndarray, Sequence[Sequence]]) -> int:
+        """
+        Merge candles into the symbol dataset, keeping it sorted by timestamp.
 
-        min_time, max_time = self.get_first_last_candle(symbol)
+        Accepts an (n, 6+) array, (timestamp, open, high, low, close, volume) tuples or raw
+        kline rows as returned by the exchange APIs. Candles whose timestamp is already stored
+        are ignored; new ones are inserted wherever they belong, including inside existing
+        holes, by a chunked in-place merge (merge_rows), so memory does not grow with the
+        stored history. Returns the number of rows written.
+        """
+        data_array = unique_candles(data)
 
-        if min_time is None or max_time is None:
-            min_time = float('inf')
-            max_time = 0
+        dataset = self._dataset(symbol)
+        metadata = self.get_metadata(symbol)
+        row_count = int(metadata['row_count'])
+        is_sorted = True
 
-        filtered_data = []
-        
-        for d in data:
-            if d[0] > max_time:
-                filtered_data.append(d)
-            elif d[0] < min_time:
-                filtered_data.append(d)
+        if row_count > 0:
+            inside = (data_array[:, 0] >= metadata['first_timestamp']) & \
+                     (data_array[:, 0] <= metadata['last_timestamp'])
+            if inside.any():
+                timestamps, is_sorted = self._get_index(symbol)
+                if is_sorted:
+                    stored = stored_mask(timestamps, data_array[:, 0])
+                else:
+                    stored = np.isin(data_array[:, 0], timestamps)
+                data_array = data_array[~stored]
 
-        if len(filtered_data) == 0:
+        if len(data_array) == 0:
             logger.warning(f'No new data found for {symbol}.')
-            return
+            return 0
 
-        data_array = np.array(filtered_data)
+        new_rows = len(data_array)
+        if row_count > 0 and data_array[0, 0] <= metadata['last_timestamp']:
+            _, is_sorted = self._get_index(symbol)
+
+        touched = None
+        if is_sorted:
+            # Every stored row of the first new candle's day is part of the suffix searched
+            first = data_array[0, 0]
+            offset, timestamps = self._suffix_index(symbol, first - first % DAY_MS)
+            gaps = gap_change(timestamps, data_array[:, 0])
+            touched = day_rows(timestamps, data_array, lambda start, end: dataset[offset + start:offset + end])
+            _merge_dataset(dataset, data_array, offset, timestamps)
+        else:
+            # Older files have backfilled candles appended after newer ones; keep appending
+            gaps = gap_change(dataset[-1:, 0], data_array[:, 0])
+            dataset.resize(row_count + new_rows, axis=0)
+            dataset[row_count:] = data_array
+
+        _modify_attrs(dataset, {
+            'first_timestamp': np.fmin(metadata['first_timestamp'], data_array[0, 0]),
+            'last_timestamp': np.fmax(metadata['last_timestamp'], data_array[-1, 0]),
+            'row_count': dataset.shape[0],
+            'gap_count': metadata['gap_count'] + gaps[0],
+            'missing_candles': metadata['missing_candles'] + gaps[1],
+        })
+        self._indexes.pop(symbol, None)
+
+        if touched is not None and dataset.attrs.get('layout_version') == LAYOUT_VERSION:
+            self._update_timeframes(symbol, touched)
 
-        self.file[symbol].resize((self.file[symbol].shape[0] + data_array.shape[0]), axis=0)
-        self.file[symbol][-data_array.shape[0]:] = data_array
         self.file.flush()
 
-    def get_data(self, symbol: str, from_time: int, to_time: int) -> Union[None, pd.DataFrame]:
+        return new_rows
+
+    def _suffix_index(self, path: str, since: float) -> Tuple[int, np.ndarray]:
+        """
+        Offset and timestamps of the rows of a sorted dataset from `offset` on, where every row
+        before `offset` is older than `since`. Writes usually land at the end, so two days of rows
+        are tried before the full cached index.
+        """
+        dataset = self._dataset(path)
+        offset = dataset.shape[0] - 2 * MINUTES_PER_DAY
+        if offset > 0:
+            timestamps = dataset[offset:, 0]
+            if timestamps[0] < since:
+                return offset, timestamps
+        return 0, self._get_index(path)[0]
+
+    def _update_timeframes(self, symbol: str, rows: np.ndarray) -> None:
+        """Re-aggregate the buckets of the days covered by `rows`, which hold every 1m candle of them."""
+        if f'{TIMEFRAME_GROUP}/{symbol}' not in self.file:
+            self.create_dataset(symbol)
+        else:
+            for timeframe, width in PYRAMID_TIMEFRAMES.items():
+                path = _timeframe_path(symbol, timeframe)
+                buckets = aggregate_candles(rows, width)
+                offset, timestamps = self._suffix_index(path, buckets[0, 0])
+                _merge_dataset(self.file[path], buckets, offset, timestamps)
+
+        for timeframe in PYRAMID_TIMEFRAMES:
+            self._indexes.pop(_timeframe_path(symbol, timeframe), None)
+
+    def get_metadata(self, symbol: str) -> dict:
+        """Return first/last timestamp, row count and gap summary without reading the rows."""
+        dataset = self._dataset(symbol)
+
+        if dataset.attrs.get('row_count') != dataset.shape[0]:
+            # Datasets written before metadata was kept (or by an older writer) get a one-off scan
+            timestamps = np.sort(dataset[:, 0])
+            if self.readonly:
+                return _compute_metadata(timestamps)
+            _write_metadata(dataset, timestamps)
+            self.file.flush()
+
+        return {attr: dataset.attrs[attr] for attr in METADATA_ATTRS}
+
+    def _get_index(self, path: str) -> Tuple[np.ndarray, bool]:
+        """Return the cached timestamp column of a dataset and whether it is sorted."""
+        dataset = self._dataset(path)
+        if path not in self._indexes or len(self._indexes[path][0]) != dataset.shape[0]:
+            timestamps = dataset[:, 0]
+            is_sorted = bool(np.all(timestamps[1:] >= timestamps[:-1]))
+            self._indexes[path] = (timestamps, is_sorted)
+        return self._indexes[path]
+
+    def _minute_rows(self, symbol: str, from_time: float, to_time: float) -> np.ndarray:
+        """Read the sorted 1m rows between from_time and to_time (inclusive)."""
+        timestamps, _ = self._get_index(symbol)
+        start = np.searchsorted(timestamps, from_time, side='left')
+        end = np.searchsorted(timestamps, to_time, side='right')
+        return self.file[symbol][start:end]
+
+    def get_data(self, symbol: str, from_time: int, to_time: int,
+                 timeframe: str = '1m') -> Union[None, pd.DataFrame]:
+        """
+        Return candles between from_time and to_time (ms, inclusive). Timeframes other than 1m
+        are served from the pre-aggregated datasets when they exist, with one row per bucket
+        like common.utils.resample_timeframe of the 1m candles in the range: buckets cut by
+        either end only aggregate the candles inside it.
+        """
+        if timeframe != '1m':
+            return self._get_timeframe_data(symbol, from_time, to_time, timeframe)
 
         start_query = time.time()
 
-        existing_data = self.file[symbol][:]
-        
-        if len(existing_data) == 0:
+        timestamps, is_sorted = self._get_index(symbol)
+
+        if len(timestamps) == 0:
             return None
-        
-        data = sorted(existing_data, key=lambda x: x[0])
-        data = np.array(data)
 
-        df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df = df[(df['timestamp'] >= from_time) & (df['timestamp'] <= to_time)]
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df.rename(columns={'timestamp': 'date'})
-        df = df.set_index('date')
+        if is_sorted:
+            # Binary search the row bounds and read only that hyperslab
+            data = self._minute_rows(symbol, from_time, to_time)
+            rows_scanned = len(data)
+        else:
+            # Older files have backfilled candles appended after newer ones
+            existing_data = self.file[symbol][:]
+            existing_data = existing_data[np.argsort(existing_data[:, 0], kind='stable')]
+            mask = (existing_data[:, 0] >= from_time) & (existing_data[:, 0] <= to_time)
+            data = existing_data[mask]
+            rows_scanned = len(existing_data)
+
+        df = to_dataframe(data)
 
         query_time = round(time.time() - start_query, 2)
-        logger.info(f'Retrieved {len(df)} candles for {symbol} from {from_time} to {to_time} in {query_time} seconds.')
+        logger.info(f'Retrieved {len(df)} candles for {symbol} from {from_time} to {to_time} '
+                    f'({rows_scanned} rows scanned) in {query_time} seconds.')
+
+        return df
+
+    def _get_timeframe_data(self, symbol: str, from_time: int, to_time: int,
+                            timeframe: str) -> Union[None, pd.DataFrame]:
+        base = timeframe if timeframe in PYRAMID_TIMEFRAMES else '1d'
+        path = _timeframe_path(symbol, base)
+
+        if path not in self.file:
+            # Files that predate the pyramid (or were never compacted) resample on the fly
+            df = self.get_data(symbol, from_time, to_time)
+            return None if df is None else resample_timeframe(df, timeframe)
+
+        start_query = time.time()
+
+        width = PYRAMID_TIMEFRAMES[base]
+        timestamps, _ = self._get_index(path)
+
+        if len(timestamps) == 0:
+            return None
+
+        start = np.searchsorted(timestamps, from_time - from_time % width, side='left')
+        end = np.searchsorted(timestamps, to_time, side='right')
+        buckets = clip_buckets(self.file[path][start:end], width, from_time, to_time,
+                               lambda first, last: self._minute_rows(symbol, first, last))
+        df = complete_timeframe(to_dataframe(buckets), base, timeframe)
+
+        query_time = round(time.time() - start_query, 2)
+        logger.info(f'Retrieved {len(df)} {timeframe} candles for {symbol} from {from_time} to {to_time} '
+                    f'({end - start} rows scanned) in {query_time} seconds.')
 
         return df
 
     def get_first_last_candle(self, symbol: str) -> Union[Tuple[None, None], Tuple[float, float]]:
-        
-        existing_data = self.file[symbol][:]
 
-        if len(existing_data) == 0:
+        metadata = self.get_metadata(symbol)
+
+        if metadata['row_count'] == 0:
             return None, None
-        
-        first_candle = min(existing_data, key=lambda x: x[0])[0]
-        last_candle = max(existing_data, key=lambda x: x[0])[0]
 
-        return first_candle, last_candle
+        return metadata['first_timestamp'], metadata['last_timestamp']
+
+    def get_symbols(self) -> list:
+        """Return the symbols stored in this file."""
+        return [name for name, item in self.file.items() if isinstance(item, h5py.Dataset)]
+
+    def get_gaps(self, symbol: str) -> np.ndarray:
+        """
+        Return the gap index of a symbol as rows of [first missing, last missing, unfillable].
+        The stored index is rescanned from the timestamp column whenever rows were added since.
+        """
+        path = f'{GAP_GROUP}/{symbol}'
+        previous = self._dataset(path)[:] if path in self.file else np.empty((0, 3))
+        row_count = int(self.get_metadata(symbol)['row_count'])
+
+        if path in self.file and self.file[path].attrs['row_count'] == row_count:
+            return previous
+
+        start_scan = time.time()
+        timestamps, is_sorted = self._get_index(symbol)
+        gaps = index_gaps(timestamps if is_sorted else np.sort(timestamps), previous)
+        logger.info(f'Scanned {row_count} rows of {symbol}: {len(gaps)} gaps, '
+                    f'{int(((gaps[:, 1] - gaps[:, 0]) // ONE_MINUTE_MS + 1).sum())} missing candles '
+                    f'in {round(time.time() - start_scan, 2)} seconds.')
+
+        if not self.readonly and path in self.file:
+            self.set_gaps(symbol, gaps, row_count)
+        return gaps
+
+    def set_gaps(self, symbol: str, gaps: np.ndarray, row_count: int) -> None:
+        """Store the gap index of a symbol, built from its first `row_count` rows."""
+        dataset = self.file[f'{GAP_GROUP}/{symbol}']
+        dataset.resize(len(gaps), axis=0)
+        if len(gaps):
+            dataset[:] = gaps
+        _modify_attrs(dataset, {'row_count': row_count})
+        self.file.flush()
+
+    def get_checkpoint(self, symbol: str) -> Tuple[Union[None, float], bool]:
+        """Return the backfill checkpoint: oldest fetched timestamp (None if never set) and completion."""
+        path = f'{CHECKPOINT_GROUP}/{symbol}'
+        oldest, complete = self._dataset(path)[:] if path in self.file else (np.nan, 0.0)
+        return (None if np.isnan(oldest) else float(oldest)), bool(complete)
+
+    def set_checkpoint(self, symbol: str, oldest: float, complete: bool = False) -> None:
+        """Record backfill progress. Call only after the candles up to `oldest` are written."""
+        self.file[f'{CHECKPOINT_GROUP}/{symbol}'][:] = [oldest, float(complete)]
+        self.file.flush()
+
+def compact_file(exchange: str) -> None:
+    """
+    Rewrite data/<exchange>.h5 in the current layout: rows sorted and deduplicated
+    by timestamp, chunked and compressed. The new file is built next to the old one
+    and swapped in atomically, so readers holding the old file keep a valid handle.
+    """
+    path = os.path.join(DATA_DIR, f'{exchange}.h5')
+    tmp_path = path + '.compact'
+
+    if not os.path.exists(path):
+        logger.warning(f'No data file found for {exchange}.')
+        return
+
+    start = time.time()
+    size_before = os.path.getsize(path)
+
+    with h5py.File(path, 'r') as src, h5py.File(tmp_path, 'w', libver='latest') as dst:
+        for symbol, dataset in src.items():
+            if not isinstance(dataset, h5py.Dataset):
+                continue
+
+            # Same rule as write_data: the last stored copy of a timestamp wins
+            data = unique_candles(dataset[:])
+            timestamps = data[:, 0]
+
+            compacted = _create_symbol_dataset(dst, symbol, len(data))
+            for offset in range(0, len(data), CHUNK_ROWS):
+                compacted[offset:offset + CHUNK_ROWS] = data[offset:offset + CHUNK_ROWS]
+            _write_metadata(compacted, timestamps)
+            if f'{CHECKPOINT_GROUP}/{symbol}' in src:
+                dst.create_dataset(f'{CHECKPOINT_GROUP}/{symbol}', data=src[f'{CHECKPOINT_GROUP}/{symbol}'][:])
+            previous = src[f'{GAP_GROUP}/{symbol}'][:] if f'{GAP_GROUP}/{symbol}' in src else np.empty((0, 3))
+            _create_gap_dataset(dst, symbol, index_gaps(timestamps, previous), len(data))
+            _build_timeframes(dst, symbol, data)
+
+            logger.info(f'Compacted {symbol}: {dataset.shape[0]} rows -> {len(data)} rows.')
+
+    os.replace(tmp_path, path)
+
+    size_after = os.path.getsize(path)
+    logger.info(f'Compacted {exchange} in {round(time.time() - start, 2)} seconds: '
+                f'{size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB.')
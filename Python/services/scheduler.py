@@ -0,0 +1,130 @@
+"""Collects many symbols across exchanges in parallel, with resumable progress."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fnmatch import fnmatch
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+from exchanges.binance import BinanceClient
+from exchanges.okx import OkxClient
+from common.config import DATA_DIR, RATE_LIMITS
+from services.data_collector import collect_all
+from services.storage import get_storage_client
+
+logger = logging.getLogger()
+
+CLIENT_MAP = {'binance': BinanceClient, 'okx': OkxClient}
+
+# Kept in DATA_DIR
+PROGRESS_FILE = 'collection_progress.json'
+
+
+class CollectionProgress:
+    """
+    Per-symbol status of the current collection run, saved to disk after every change so
+    an interrupted run can skip the symbols it already finished. A run that finishes every
+    symbol archives the file, so the next run collects them all again.
+    """
+
+    def __init__(self, path: Optional[str] = None, resume: bool = True):
+        self.path = path or os.path.join(DATA_DIR, PROGRESS_FILE)
+        self._lock = threading.Lock()
+        self.state = {'started': int(time.time()), 'symbols': {}}
+
+        if resume and os.path.exists(self.path):
+            with open(self.path) as f:
+                self.state = json.load(f)
+
+    def is_done(self, exchange: str, symbol: str) -> bool:
+        return self.state['symbols'].get(f'{exchange}:{symbol}', {}).get('status') == 'done'
+
+    def update(self, exchange: str, symbol: str, status: str, candles: int = 0) -> None:
+        with self._lock:
+            self.state['symbols'][f'{exchange}:{symbol}'] = {
+                'status': status, 'candles': candles, 'updated': int(time.time())
+            }
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+
+    def archive(self) -> None:
+        """Close the run: move the file to <name>.last.json, out of the way of the next resume."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.replace(self.path, os.path.splitext(self.path)[0] + '.last.json')
+
+
+def resolve_symbols(available: List[str], patterns: List[str]) -> List[str]:
+    """Expand exact symbols and shell-style patterns (e.g. '*USDT') against the exchange list."""
+    return [symbol for symbol in available if any(fnmatch(symbol, pattern) for pattern in patterns)]
+
+
+def _collect_exchange(exchange: str, patterns: List[str], progress: CollectionProgress) -> None:
+    client = CLIENT_MAP[exchange](futures=True)
+    symbols = [s for s in resolve_symbols(client.symbols, patterns) if not progress.is_done(exchange, s)]
+
+    if not symbols:
+        logger.info(f'{exchange}: nothing to collect.')
+        return
+
+    # Datasets cannot be created once the writer is in SWMR mode, so create them all first
+    storage = get_storage_client(exchange)
+    for symbol in symbols:
+        storage.create_dataset(symbol)
+
+    workers = RATE_LIMITS[exchange]['parallel_symbols']
+    logger.info(f'{exchange}: collecting {len(symbols)} symbols with {workers} workers.')
+
+    start = time.time()
+    requests_before = client.rate_limiter.requests
+    candles = 0
+    completed = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'collect-{exchange}') as pool:
+        futures = {}
+        for symbol in symbols:
+            progress.update(exchange, symbol, 'pending')
+            futures[pool.submit(collect_all, client, exchange, symbol)] = symbol
+
+        for future in as_completed(futures):
+            symbol = futures[future]
+            completed += 1
+            try:
+                written = future.result()
+            except Exception as e:
+                logger.error(f'{exchange} {symbol}: collection failed: {e}')
+                progress.update(exchange, symbol, 'failed')
+                continue
+
+            candles += written
+            progress.update(exchange, symbol, 'done', written)
+
+            elapsed = max(time.time() - start, 1e-9)
+            logger.info(f'{exchange}: {completed}/{len(symbols)} symbols, '
+                        f'{candles / elapsed:.0f} candles/s, '
+                        f'{(client.rate_limiter.requests - requests_before) / elapsed:.1f} requests/s.')
+
+
+def run_schedule(jobs: Dict[str, List[str]], resume: bool = True) -> None:
+    """
+    Collect every symbol matching jobs[exchange] (symbols or patterns), running the exchanges
+    side by side and up to RATE_LIMITS[exchange]['parallel_symbols'] symbols per exchange at
+    once. All workers of an exchange share its client, session and rate limiter.
+    """
+    progress = CollectionProgress(resume=resume)
+
+    threads = [threading.Thread(target=_collect_exchange, args=(exchange, patterns, progress), name=exchange)
+               for exchange, patterns in jobs.items() if patterns]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    failed = [key for key, entry in progress.state['symbols'].items() if entry['status'] != 'done']
+    if failed:
+        logger.warning(f'{len(failed)} symbols not completed: {", ".join(failed)}. Run again to resume.')
+    else:
+        progress.archive()
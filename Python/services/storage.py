@@ -0,0 +1,16 @@
+"""Selects the candle storage backend configured in common.config."""
+from typing import Union
+
+from common.config import STORAGE_BACKEND
+from services.columnar import ColumnarClient
+from services.database import Hdf5Client
+
+STORAGE_CLIENTS = {
+    'hdf5': Hdf5Client,
+    'columnar': ColumnarClient,
+}
+
+
+def get_storage_client(exchange: str, readonly: bool = False) -> Union[Hdf5Client, ColumnarClient]:
+    """Open the configured store; backtests and optimizations should pass readonly=True."""
+    return STORAGE_CLIENTS[STORAGE_BACKEND](exchange, readonly=readonly)
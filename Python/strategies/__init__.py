@@ -0,0 +1,50 @@
+"""
+Strategy registry. Strategy modules are imported on first use, so a run only pays for the
+libraries its own strategy needs (pandas_ta is only loaded for OBV).
+
+Third-party packages can add strategies through the 'backtesting.strategies' entry point
+group, e.g. in pyproject.toml:
+
+    [project.entry-points."backtesting.strategies"]
+    my_strategy = "my_package.strategy:MyStrategy"
+"""
+from importlib import import_module
+from importlib.metadata import entry_points
+from typing import Dict, List, Type
+
+ENTRY_POINT_GROUP = 'backtesting.strategies'
+
+# name -> (module, class) of the strategies shipped with this package
+BUILTIN_STRATEGIES = {
+    'obv': ('strategies.obv', 'ObvStrategy'),
+    'ichimoku': ('strategies.ichimoku', 'IchimokuStrategy'),
+    'support_resistance': ('strategies.support_resistance', 'SupResStrategy'),
+    'sma': ('strategies.sma', 'SmaStrategy'),
+    'psar': ('strategies.psar', 'PsarStrategy'),
+}
+
+_loaded: Dict[str, Type] = {}
+
+
+def _plugins() -> dict:
+    # Reads installed package metadata only; plugin modules are not imported here
+    return {entry_point.name: entry_point for entry_point in entry_points(group=ENTRY_POINT_GROUP)}
+
+
+def available_strategies() -> List[str]:
+    """Names of the built-in strategies followed by those registered through entry points."""
+    return list(BUILTIN_STRATEGIES) + [name for name in _plugins() if name not in BUILTIN_STRATEGIES]
+
+
+def get_strategy(name: str) -> Type:
+    """Return the strategy class registered under `name`, importing its module on first use."""
+    if name not in _loaded:
+        if name in BUILTIN_STRATEGIES:
+            module, cls = BUILTIN_STRATEGIES[name]
+            _loaded[name] = getattr(import_module(module), cls)
+        else:
+            plugins = _plugins()
+            if name not in plugins:
+                raise KeyError(f'Strategy {name} not found.')
+            _loaded[name] = plugins[name].load()
+    return _loaded[name]
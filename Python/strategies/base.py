@@ -1,14 +1,41 @@
-from abc import ABC, abstractmethod
+from abc import ABC
 import typing
+import numpy as np
 import pandas as pd
 
+from .candles import CandleArrays, candle_arrays
+from .metrics import performance
+
 class AbstractStrategy(ABC):
+    """
+    Strategies implement compute_positions() on read-only CandleArrays and are scored by the
+    shared metrics kernel; backtest() adapts a DataFrame to that contract. Strategies that
+    cannot express themselves as positions override backtest_arrays() (or, for older code,
+    backtest()) instead; a subclass overriding none of them is rejected when it is defined.
+    """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if all(getattr(cls, name) is getattr(AbstractStrategy, name)
+               for name in ('compute_positions', 'backtest_arrays', 'backtest')):
+            raise TypeError(f'{cls.__name__} must override compute_positions(), backtest_arrays() or backtest()')
+
     def __init__(self):
         self.params: typing.Dict[str, typing.Dict] = {}
 
-    @abstractmethod
+    def compute_positions(self, candles: CandleArrays, **kwargs) -> np.ndarray:
+        """Position held after each close: 1 = long, -1 = short, 0 = flat."""
+        raise NotImplementedError(f'{type(self).__name__} does not implement compute_positions()')
+
+    def backtest_arrays(self, candles: CandleArrays, **kwargs) -> typing.Tuple[float, float]:
+        """PnL % and max drawdown % of the positions of these parameters."""
+        cls = type(self)
+        if cls.compute_positions is AbstractStrategy.compute_positions and cls.backtest is not AbstractStrategy.backtest:
+            return self.backtest(candles.frame, **kwargs)
+        metrics = performance(candles.close, self.compute_positions(candles, **kwargs))
+        return metrics.pnl, metrics.max_drawdown
+
     def backtest(self, df: pd.DataFrame, **kwargs) -> typing.Tuple[float, float]:
-        pass
+        return self.backtest_arrays(candle_arrays(df), **kwargs)
 
     def get_params(self) -> typing.Dict[str, typing.Dict]:
         return self.params
@@ -16,3 +43,8 @@ class AbstractStrategy(ABC):
     def validate_params(self, params: typing.Dict) -> typing.Dict:
         """Override this method to add custom constraint validation logic"""
         return params
+
+    def backtest_batch(self, candles: CandleArrays,
+                       params_list: typing.List[typing.Dict]) -> typing.List[typing.Tuple[float, float]]:
+        """Backtest many parameter sets on the same data. Override when they can share work."""
+        return [self.backtest_arrays(candles, **params) for params in params_list]
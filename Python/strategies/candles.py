@@ -0,0 +1,71 @@
+"""
+Candle arrays handed to array-native strategies.
+
+CandleArrays exposes the columns of a candle DataFrame as read-only, contiguous float64
+arrays (timestamps as int64 ms). They are views of the DataFrame's own memory whenever its
+columns already have that layout, so building them copies nothing; the optimizer builds
+them once per dataset and every backtest of the run reads the same arrays.
+"""
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from .indicators import cached
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _read_only(values: np.ndarray, dtype) -> np.ndarray:
+    array = np.ascontiguousarray(values, dtype=dtype)
+    if array is values:
+        array = array.view()
+    array.flags.writeable = False
+    return array
+
+
+class CandleArrays:
+    __slots__ = ('timestamps', 'open', 'high', 'low', 'close', 'volume', 'nbytes', '_frame', '__weakref__')
+
+    def __init__(self, timestamps: np.ndarray, open: np.ndarray, high: np.ndarray, low: np.ndarray,
+                 close: np.ndarray, volume: np.ndarray, frame: pd.DataFrame = None):
+        self.timestamps = _read_only(timestamps, np.int64)
+        self.open = _read_only(open, np.float64)
+        self.high = _read_only(high, np.float64)
+        self.low = _read_only(low, np.float64)
+        self.close = _read_only(close, np.float64)
+        self.volume = _read_only(volume, np.float64)
+        # Memory owned by the arrays; views of the inputs count for nothing
+        self.nbytes = sum(array.nbytes for array, source in zip(self.arrays(), (timestamps, open, high, low, close, volume))
+                          if not np.may_share_memory(array, source))
+        # Weak, so that caching the arrays does not keep their DataFrame alive
+        self._frame = weakref.ref(frame) if frame is not None else None
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'CandleArrays':
+        timestamps = df.index.values.astype('datetime64[ms]').view(np.int64)
+        return cls(timestamps, *(df[column].values for column in COLUMNS), frame=df)
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """DataFrame the arrays were taken from, for strategies that only implement backtest()."""
+        frame = self._frame() if self._frame is not None else None
+        if frame is None:
+            frame = pd.DataFrame({column: getattr(self, column) for column in COLUMNS},
+                                 index=pd.to_datetime(self.timestamps, unit='ms').rename('date'))
+        return frame
+
+    def arrays(self) -> tuple:
+        return self.timestamps, self.open, self.high, self.low, self.close, self.volume
+
+    def complete(self) -> np.ndarray:
+        """True for candles without a missing value."""
+        return ~np.isnan(np.column_stack([getattr(self, column) for column in COLUMNS])).any(axis=1)
+
+
+def candle_arrays(df: pd.DataFrame) -> CandleArrays:
+    """CandleArrays of `df`, shared by every caller while `df` is alive."""
+    return cached(df, 'candles', None, lambda: CandleArrays.from_dataframe(df))
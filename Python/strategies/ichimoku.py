@@ -1,8 +1,77 @@
 import typing
-import pandas as pd
 import numpy as np
 
 from .base import AbstractStrategy
+from .candles import CandleArrays
+from .indicators import donchian_midline, donchian_table
+from .metrics import performance
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    shifted = np.full(len(values), np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def _positions(close: np.ndarray, complete: np.ndarray, tenkan_sen: np.ndarray, kijun_sen: np.ndarray,
+               span_b: np.ndarray, kijun_period: int) -> np.ndarray:
+    """Positions of one (tenkan_period, kijun_period) pair from its Donchian midlines; `complete` flags candles without NaN."""
+    senkou_span_a = _shift((tenkan_sen + kijun_sen) / 2, kijun_period)
+    senkou_span_b = _shift(span_b, kijun_period)
+    chikou_span = _shift(close, kijun_period)
+
+    # Rows where every component is defined
+    rows = np.flatnonzero(complete & ~(np.isnan(tenkan_sen) | np.isnan(kijun_sen) | np.isnan(senkou_span_a)
+                                       | np.isnan(senkou_span_b) | np.isnan(chikou_span)))
+    positions = np.zeros(len(close), dtype=np.int64)
+    if len(rows) == 0:
+        return positions
+
+    price = close[rows]
+    tk_diff = tenkan_sen[rows] - kijun_sen[rows]
+    tk_cross_up = np.zeros(len(rows), dtype=bool)
+    tk_cross_down = np.zeros(len(rows), dtype=bool)
+    tk_cross_up[1:] = (tk_diff[1:] > 0) & (tk_diff[:-1] < 0)
+    tk_cross_down[1:] = (tk_diff[1:] < 0) & (tk_diff[:-1] > 0)
+
+    buy = tk_cross_up & (price > senkou_span_a[rows]) & (price > senkou_span_b[rows]) & (price > chikou_span[rows])
+    sell = tk_cross_down & (price < senkou_span_a[rows]) & (price < senkou_span_b[rows]) & (price < chikou_span[rows])
+
+    # Hold each signal until the next one, as the original backtest scored the moves between
+    # signal rows only: flat before the first signal and from the last one, which has no exit
+    positions[rows] = np.where(buy, 1, np.where(sell, -1, 0))
+    signals = np.flatnonzero(positions)
+    if len(signals) == 0:
+        return positions
+    last = np.maximum.accumulate(np.where(positions != 0, np.arange(len(positions)), 0))
+    positions = positions[last]
+    positions[signals[-1]:] = 0
+    return positions
+
+
+def ichimoku_batch(candles: CandleArrays, pairs: typing.Iterable[typing.Tuple[int, int]]) -> typing.List[typing.Tuple[float, float]]:
+    """
+    Backtest many (tenkan_period, kijun_period) pairs on one dataset. Every period needs a
+    single Donchian midline, taken from the shared table.
+
+    Scores follow strategies.metrics: PnL is the sum of the per-bar returns while a signal is
+    held. The original backtest summed one close-to-close return per signal, which compounds the
+    bars of each holding, so PnL values differ from it even where the positions are the same.
+    """
+    pairs = [(int(tenkan), int(kijun)) for tenkan, kijun in pairs]
+    periods = {period for tenkan, kijun in pairs for period in (tenkan, kijun, kijun * 2)}
+    midlines = donchian_table(candles, periods)
+    complete = candles.complete()
+
+    scores = {}
+    for tenkan, kijun in pairs:
+        if (tenkan, kijun) not in scores:
+            positions = _positions(candles.close, complete, midlines[tenkan], midlines[kijun], midlines[kijun * 2], kijun)
+            metrics = performance(candles.close, positions)
+            scores[tenkan, kijun] = (metrics.pnl, metrics.max_drawdown)
+    return [scores[pair] for pair in pairs]
+
 
 class IchimokuStrategy(AbstractStrategy):
     def __init__(self):
@@ -12,10 +81,6 @@ class IchimokuStrategy(AbstractStrategy):
             'kijun_period': {'name': 'Kijun Period', 'type': int, 'default': 26, 'min': 1, 'max': 200}
         }
 
-    def _donchian(self, high: pd.Series, low: pd.Series, period: int) -> pd.Series:
-        """Calculate Donchian Channel midline (used for Ichimoku components)."""
-        return (high.rolling(period).max() + low.rolling(period).min()) / 2
-
     def validate_params(self, params: typing.Dict) -> typing.Dict:
         if 'kijun' in params and 'tenkan' in params:
             pass
@@ -23,49 +88,15 @@ class IchimokuStrategy(AbstractStrategy):
         params['kijun_period'] = max(params.get('kijun_period', 0), params.get('tenkan_period', 0))
         return params
 
-    def backtest(self, df: pd.DataFrame, **kwargs) -> typing.Tuple[float, float]:
+    def compute_positions(self, candles: CandleArrays, **kwargs) -> np.ndarray:
         tenkan_period = kwargs.get('tenkan_period', self.params['tenkan_period']['default'])
         kijun_period = kwargs.get('kijun_period', self.params['kijun_period']['default'])
-        
-        data = df.copy()
-        
-        # Ichimoku Components
-        data['tenkan_sen'] = self._donchian(data['high'], data['low'], tenkan_period)
-        data['kijun_sen'] = self._donchian(data['high'], data['low'], kijun_period)
-        data['senkou_span_a'] = ((data['tenkan_sen'] + data['kijun_sen']) / 2).shift(kijun_period)
-        data['senkou_span_b'] = self._donchian(data['high'], data['low'], kijun_period * 2).shift(kijun_period)
-        data['chikou_span'] = data['close'].shift(kijun_period)
-        
-        data.dropna(inplace=True)
-        
-        if len(data) == 0:
-            return 0.0, 0.0
 
-        # Crossover Detection
-        tk_diff = data['tenkan_sen'] - data['kijun_sen']
-        tk_cross_up = (tk_diff > 0) & (tk_diff.shift(1) < 0)
-        tk_cross_down = (tk_diff < 0) & (tk_diff.shift(1) > 0)
-        
-        # Cloud & Chikou Confirmation
-        above_cloud = (data['close'] > data['senkou_span_a']) & (data['close'] > data['senkou_span_b'])
-        below_cloud = (data['close'] < data['senkou_span_a']) & (data['close'] < data['senkou_span_b'])
-        chikou_bullish = data['close'] > data['chikou_span']
-        chikou_bearish = data['close'] < data['chikou_span']
-        
-        # Generate Signals: 1 = Buy, -1 = Sell
-        data['signal'] = np.where(tk_cross_up & above_cloud & chikou_bullish, 1,
-                                  np.where(tk_cross_down & below_cloud & chikou_bearish, -1, 0))
-        
-        # Calculate PnL on signal rows only
-        signals = data[data['signal'] != 0].copy()
-        
-        if len(signals) == 0:
-            return 0.0, 0.0
-            
-        signals['pnl'] = signals['close'].pct_change() * signals['signal'].shift(1)
-        signals['cumulative_pnl'] = (1 + signals['pnl']).cumprod()
-        signals['max_cumulative_pnl'] = signals['cumulative_pnl'].cummax()
-        signals['drawdown'] = (signals['cumulative_pnl'] - signals['max_cumulative_pnl']) / signals['max_cumulative_pnl']
-        
-        return signals['pnl'].sum(), signals['drawdown'].max()
+        return _positions(candles.close, candles.complete(), donchian_midline(candles, tenkan_period),
+                          donchian_midline(candles, kijun_period), donchian_midline(candles, kijun_period * 2), kijun_period)
 
+    def backtest_batch(self, candles: CandleArrays, params_list: typing.List[typing.Dict]) -> typing.List[typing.Tuple[float, float]]:
+        """Backtest many period pairs with ichimoku_batch, sharing the Donchian midlines."""
+        pairs = [(params.get('tenkan_period', self.params['tenkan_period']['default']),
+                  params.get('kijun_period', self.params['kijun_period']['default'])) for params in params_list]
+        return ichimoku_batch(candles, pairs)
@@ -0,0 +1,176 @@
+"""
+Memoized indicators shared by every backtest of a process.
+
+During an optimization thousands of individuals backtest the same candles with a few hundred
+distinct windows, so each (dataset, indicator, params) result is computed once and kept in an
+LRU cache bounded by INDICATOR_CACHE_BYTES. Datasets (a DataFrame or its CandleArrays) are
+identified by object identity: entries are dropped when their dataset is garbage collected, and a
+dataset must not be modified in place once indicators were computed from it. Cached values are
+shared and must be treated as read-only.
+"""
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, Iterable, Union
+import logging
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from common.config import INDICATOR_CACHE_BYTES
+from common.jit import NUMBA_AVAILABLE, njit
+
+if TYPE_CHECKING:
+    from .candles import CandleArrays
+
+logger = logging.getLogger()
+
+Indicator = Union[pd.Series, np.ndarray]
+
+
+def _nbytes(value: Indicator) -> int:
+    if isinstance(value, pd.Series):
+        # The index is shared with the dataset, so only the values count against the budget
+        return int(value.memory_usage(index=False, deep=False))
+    return int(getattr(value, 'nbytes', 0))
+
+
+class IndicatorCache:
+    """LRU cache of indicator results keyed by (dataset, indicator name, params)."""
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[tuple, Indicator]' = OrderedDict()
+        # id(dataset) -> weak reference, to tell a live dataset from a new one reusing its id
+        self._datasets = {}
+
+    def _dataset_key(self, dataset: object) -> int:
+        key = id(dataset)
+        ref = self._datasets.get(key)
+        if ref is None or ref() is not dataset:
+            if ref is not None:
+                self._drop_dataset(key)
+            self._datasets[key] = weakref.ref(dataset, lambda _, key=key: self._drop_dataset(key))
+        return key
+
+    def _drop_dataset(self, dataset: int) -> None:
+        self._datasets.pop(dataset, None)
+        # Held until the count is updated: releasing a cached dataset (CandleArrays) drops its own entries
+        dropped = [self._entries.pop(key) for key in [key for key in self._entries if key[0] == dataset]]
+        self.bytes -= sum(_nbytes(value) for value in dropped)
+
+    def get(self, dataset: object, name: str, params: Hashable, compute: Callable[[], Indicator]) -> Indicator:
+        """Return the cached indicator `name` of `dataset` for `params`, computing it on a miss."""
+        key = (self._dataset_key(dataset), name, params)
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return value
+
+        while self.bytes + size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= _nbytes(evicted)
+            self.evictions += 1
+        self._entries[key] = value
+        self.bytes += size
+        return value
+
+    def clear(self) -> None:
+        # Forget the datasets first: releasing a cached CandleArrays would otherwise run its drop
+        # callback on entries in the middle of being cleared
+        self._datasets.clear()
+        entries, self._entries = self._entries, OrderedDict()
+        self.bytes = 0
+        entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries), 'megabytes': self.bytes / 1e6}
+
+
+INDICATOR_CACHE = IndicatorCache()
+
+
+def cached(dataset: object, name: str, params: Hashable, compute: Callable[[], Indicator]) -> Indicator:
+    """Look up an indicator in the process-wide cache."""
+    return INDICATOR_CACHE.get(dataset, name, params, compute)
+
+
+@njit(cache=True)
+def _sliding_extreme_kernel(values, window, highest):
+    # Monotonic deque of indices: values along it decrease (max) or increase (min)
+    n = len(values)
+    out = np.full(n, np.nan)
+    queue = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    for i in range(n):
+        value = values[i]
+        while tail > head and (values[queue[tail - 1]] <= value if highest else values[queue[tail - 1]] >= value):
+            tail -= 1
+        queue[tail] = i
+        tail += 1
+        if queue[head] <= i - window:
+            head += 1
+        if i >= window - 1:
+            out[i] = values[queue[head]]
+    return out
+
+
+def _sliding_extreme_numpy(values: np.ndarray, window: int, highest: bool) -> np.ndarray:
+    # van Herk/Gil-Werman: a window is covered by the suffix of one block and the prefix of the next
+    accumulate = np.maximum.accumulate if highest else np.minimum.accumulate
+    n = len(values)
+    blocks = np.full(-(-n // window) * window, -np.inf if highest else np.inf)
+    blocks[:n] = values
+    blocks = blocks.reshape(-1, window)
+    prefix = accumulate(blocks, axis=1).ravel()
+    suffix = accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    out = np.full(n, np.nan)
+    if window <= n:
+        out[window - 1:] = (np.maximum if highest else np.minimum)(suffix[:n - window + 1], prefix[window - 1:n])
+    return out
+
+
+def sliding_extreme(values: np.ndarray, window: int, highest: bool) -> np.ndarray:
+    """
+    Highest (or lowest) value of every `window` bars in O(n), NaN until the first full window;
+    the same values as pandas' rolling(window).max() / .min().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).any():
+        rolling = pd.Series(values).rolling(window)
+        return (rolling.max() if highest else rolling.min()).values
+    if NUMBA_AVAILABLE:
+        return _sliding_extreme_kernel(values, window, highest)
+    return _sliding_extreme_numpy(values, window, highest)
+
+
+def rolling_mean(candles: 'CandleArrays', column: str, window: int) -> np.ndarray:
+    """Mean of the last `window` values of a CandleArrays column, as pandas' rolling().mean()."""
+    return cached(candles, 'rolling_mean', (column, window),
+                  lambda: pd.Series(getattr(candles, column)).rolling(window=window).mean().values)
+
+
+def donchian_midline(candles: 'CandleArrays', period: int) -> np.ndarray:
+    """Midpoint of the highest high and lowest low over `period` bars."""
+    return cached(candles, 'donchian_midline', period,
+                  lambda: (sliding_extreme(candles.high, period, True) + sliding_extreme(candles.low, period, False)) / 2)
+
+
+def donchian_table(candles: 'CandleArrays', periods: Iterable[int]) -> Dict[int, np.ndarray]:
+    """Donchian midlines of `candles` for every period, filled from the cache and computed on a miss."""
+    return {period: donchian_midline(candles, period) for period in set(periods)}
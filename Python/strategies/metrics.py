@@ -0,0 +1,144 @@
+"""
+Performance metrics shared by every strategy.
+
+A backtest is described by the close prices and the position held after each close (1 = long,
+-1 = short, 0 = flat; fractions scale the exposure). The position of bar t earns the return of
+bar t + 1, so the last position earns nothing. Conventions:
+
+- pnl: sum of the per-bar returns, in %
+- max_drawdown: largest drop of the compounded equity from its peak (starting equity included),
+  as a positive %
+- trades: number of times a position is opened or reversed
+- exposure: fraction of the bars spent in a position
+- sharpe / sortino: mean per-bar return over its standard deviation / downside deviation,
+  not annualized; 0 when undefined
+
+A missing close is carried forward from the last known one, so a position earns the whole move
+across a gap on the bar the price comes back; bars before the first close earn nothing.
+"""
+import typing
+
+import numpy as np
+
+from common.config import BATCH_MEMORY_BYTES
+from common.jit import NUMBA_AVAILABLE, njit, prange
+
+
+class Metrics(typing.NamedTuple):
+    pnl: float
+    max_drawdown: float
+    trades: int
+    exposure: float
+    sharpe: float
+    sortino: float
+
+
+@njit(cache=True, parallel=True)
+def _metrics_kernel(close, positions, results):
+    n = len(close)
+    for row in prange(positions.shape[0]):
+        position = positions[row]
+        total = 0.0
+        cumulative = 1.0
+        max_cumulative = 1.0
+        max_drawdown = 0.0
+        trades = 0
+        held = 0
+        previous = 0.0
+        mean = 0.0
+        m2 = 0.0
+        downside = 0.0
+        for t in range(1, n):
+            side = position[t - 1]
+            if side != 0:
+                held += 1
+                if side != previous:
+                    trades += 1
+            previous = side
+
+            pnl = (close[t] / close[t - 1] - 1) * side
+            if pnl != pnl:
+                pnl = 0.0
+            total += pnl
+            cumulative *= 1 + pnl
+            if cumulative > max_cumulative:
+                max_cumulative = cumulative
+            else:
+                max_drawdown = min(max_drawdown, (cumulative - max_cumulative) / max_cumulative)
+
+            # Welford's running variance
+            delta = pnl - mean
+            mean += delta / t
+            m2 += delta * (pnl - mean)
+            if pnl < 0:
+                downside += pnl * pnl
+
+        bars = max(n - 1, 1)
+        std = np.sqrt(m2 / bars)
+        downside_std = np.sqrt(downside / bars)
+        results[row, 0] = total * 100
+        results[row, 1] = abs(max_drawdown) * 100
+        results[row, 2] = trades
+        results[row, 3] = held / bars
+        results[row, 4] = mean / std if std > 0 else 0.0
+        results[row, 5] = mean / downside_std if downside_std > 0 else 0.0
+
+
+def _metrics_numpy(close, positions, results, memory_bytes):
+    returns = close[1:] / close[:-1] - 1
+    bars = len(returns)
+    block = max(1, memory_bytes // (8 * 4 * bars))
+    for start in range(0, len(positions), block):
+        held = positions[start:start + block, :-1]
+        pnl = np.nan_to_num(returns * held, nan=0.0)
+        cumulative = np.cumprod(1 + pnl, axis=1)
+        max_cumulative = np.maximum(np.maximum.accumulate(cumulative, axis=1), 1)
+        drawdown = np.minimum(((cumulative - max_cumulative) / max_cumulative).min(axis=1), 0)
+        del cumulative, max_cumulative
+
+        previous = np.zeros_like(held)
+        previous[:, 1:] = held[:, :-1]
+        mean = pnl.mean(axis=1)
+        std = pnl.std(axis=1)
+        downside_std = np.sqrt((np.minimum(pnl, 0) ** 2).mean(axis=1))
+
+        rows = results[start:start + block]
+        rows[:, 0] = pnl.sum(axis=1) * 100
+        rows[:, 1] = np.abs(drawdown) * 100
+        rows[:, 2] = ((held != 0) & (held != previous)).sum(axis=1)
+        rows[:, 3] = (held != 0).mean(axis=1)
+        rows[:, 4] = np.divide(mean, std, out=np.zeros_like(mean), where=std > 0)
+        rows[:, 5] = np.divide(mean, downside_std, out=np.zeros_like(mean), where=downside_std > 0)
+
+
+def performance_batch(close: np.ndarray, positions: np.ndarray,
+                      memory_bytes: int = BATCH_MEMORY_BYTES) -> np.ndarray:
+    """
+    Metrics of many position series on the same prices: `positions` has one row per series and
+    the result one row of Metrics fields per series. NaN positions count as flat; NaN closes
+    are forward-filled.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    missing = np.isnan(close)
+    if missing.any():
+        # Forward-fill, as pandas' pct_change() of the original backtests did
+        close = close[np.maximum.accumulate(np.where(missing, 0, np.arange(len(close))))]
+    positions = np.asarray(positions)
+    if positions.dtype.kind == 'f' and np.isnan(positions).any():
+        positions = np.nan_to_num(positions, nan=0.0)
+    positions = positions.reshape(-1, len(close))
+    results = np.zeros((len(positions), len(Metrics._fields)))
+    if len(close) < 2:
+        return results
+
+    if NUMBA_AVAILABLE:
+        _metrics_kernel(close, positions, results)
+    else:
+        _metrics_numpy(close, positions.astype(np.float64, copy=False), results, memory_bytes)
+    return results
+
+
+def performance(close: np.ndarray, positions: np.ndarray) -> Metrics:
+    """Metrics of holding `positions[t]` from close t to close t + 1."""
+    row = performance_batch(close, np.asarray(positions)[np.newaxis])[0]
+    return Metrics(float(row[0]), float(row[1]), int(row[2]), float(row[3]), float(row[4]), float(row[5]))
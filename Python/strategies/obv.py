@@ -1,8 +1,10 @@
-import typing
+import numpy as np
 import pandas as pd
 import pandas_ta as ta
 
 from .base import AbstractStrategy
+from .candles import CandleArrays
+from .indicators import cached
 
 class ObvStrategy(AbstractStrategy):
     def __init__(self):
@@ -11,20 +13,12 @@ class ObvStrategy(AbstractStrategy):
             'ma_period': {'name': 'MA Period', 'type': int, 'default': 9, 'min': 1, 'max': 200}
         }
 
-    def backtest(self, df: pd.DataFrame, **kwargs) -> typing.Tuple[float, float]:
+    def compute_positions(self, candles: CandleArrays, **kwargs) -> np.ndarray:
         ma_period = kwargs.get('ma_period', self.params['ma_period']['default'])
         
-        df = df.copy()
-        df['obv'] = ta.obv(df['close'], df['volume'])
-        df['obv_ma'] = ta.sma(df['obv'], length=ma_period)
-        
-        df['signal'] = 0
-        df.loc[df['obv'] > df['obv_ma'], 'signal'] = 1
-        df.loc[df['obv'] <= df['obv_ma'], 'signal'] = -1
+        # OBV does not depend on any parameter, so every individual shares one series
+        obv = cached(candles, 'obv', None, lambda: ta.obv(pd.Series(candles.close), pd.Series(candles.volume)).values)
+        obv_ma = cached(candles, 'obv_sma', ma_period, lambda: ta.sma(pd.Series(obv), length=ma_period).values)
 
-        df['pnl'] = df['close'].pct_change() * df['signal'].shift(1)
-        df['cumulative_pnl'] = (1 + df['pnl']).cumprod()
-        df['max_cumulative_pnl'] = df['cumulative_pnl'].cummax()
-        df['drawdown'] = (df['cumulative_pnl'] - df['max_cumulative_pnl']) / df['max_cumulative_pnl']
-        
-        return df['pnl'].sum(), df['drawdown'].max()
\ No newline at end of file
+        # 1 = long, -1 = short, 0 (flat) until the average is defined
+        return np.where(obv > obv_ma, 1, np.where(obv <= obv_ma, -1, 0))
@@ -1,10 +1,143 @@
 """Parabolic SAR Strategy"""
 import numpy as np
-import pandas as pd
 import typing
 from typing import Tuple
 
+from common.jit import NUMBA_AVAILABLE, njit
 from .base import AbstractStrategy
+from .candles import CandleArrays
+from .metrics import performance_batch
+
+
+@njit(cache=True)
+def _psar_kernel(high, low, close, initial_af, max_af, increment, trend):
+    """Fill `trend` for one parameter set, carrying SAR, AF and extreme point as scalars."""
+    n = len(close)
+    trend[0] = 1 if close[1] > close[0] else -1
+    psar = low[0] if trend[0] > 0 else high[0]
+    ep = high[0] if trend[0] > 0 else low[0]
+    af = initial_af
+
+    for i in range(1, n):
+        psar = psar + af * (ep - psar)
+        if trend[i - 1] > 0:
+            psar = min(psar, low[i - 1], low[i - 2] if i > 1 else low[i - 1])
+            if low[i] < psar:
+                trend[i] = -1
+                psar = ep
+                ep = low[i]
+                af = initial_af
+            else:
+                trend[i] = trend[i - 1]
+                if high[i] > ep:
+                    ep = high[i]
+                    af = min(max_af, af + increment)
+        else:
+            psar = max(psar, high[i - 1], high[i - 2] if i > 1 else high[i - 1])
+            if high[i] > psar:
+                trend[i] = 1
+                psar = ep
+                ep = high[i]
+                af = initial_af
+            else:
+                trend[i] = trend[i - 1]
+                if low[i] < ep:
+                    ep = low[i]
+                    af = min(max_af, af + increment)
+
+
+@njit(cache=True)
+def _psar_batch_kernel(high, low, close, params, trends):
+    """Fill one trend row per (initial_af, max_af, increment) row of `params` in a single pass over the bars."""
+    k = params.shape[0]
+    psar = np.empty(k)
+    ep = np.empty(k)
+    af = params[:, 0].copy()
+    start = 1 if close[1] > close[0] else -1
+
+    for j in range(k):
+        trends[j, 0] = start
+        psar[j] = low[0] if start > 0 else high[0]
+        ep[j] = high[0] if start > 0 else low[0]
+
+    for i in range(1, len(close)):
+        low_floor = min(low[i - 1], low[i - 2] if i > 1 else low[i - 1])
+        high_ceiling = max(high[i - 1], high[i - 2] if i > 1 else high[i - 1])
+        for j in range(k):
+            sar = psar[j] + af[j] * (ep[j] - psar[j])
+            if trends[j, i - 1] > 0:
+                sar = min(sar, low_floor)
+                if low[i] < sar:
+                    trends[j, i] = -1
+                    sar = ep[j]
+                    ep[j] = low[i]
+                    af[j] = params[j, 0]
+                else:
+                    trends[j, i] = 1
+                    if high[i] > ep[j]:
+                        ep[j] = high[i]
+                        af[j] = min(params[j, 1], af[j] + params[j, 2])
+            else:
+                sar = max(sar, high_ceiling)
+                if high[i] > sar:
+                    trends[j, i] = 1
+                    sar = ep[j]
+                    ep[j] = high[i]
+                    af[j] = params[j, 0]
+                else:
+                    trends[j, i] = -1
+                    if low[i] < ep[j]:
+                        ep[j] = low[i]
+                        af[j] = min(params[j, 1], af[j] + params[j, 2])
+            psar[j] = sar
+
+
+def _psar_batch_numpy(high, low, close, params, trends):
+    """_psar_batch_kernel without numba: each bar updates every parameter set with vector operations."""
+    initial_af, max_af, increment = params[:, 0], params[:, 1], params[:, 2]
+    up = np.full(len(params), close[1] > close[0])
+    psar = np.where(up, low[0], high[0])
+    ep = np.where(up, high[0], low[0])
+    af = initial_af.copy()
+    trends[:, 0] = np.where(up, 1, -1)
+
+    for i in range(1, len(close)):
+        low_floor = min(low[i - 1], low[i - 2] if i > 1 else low[i - 1])
+        high_ceiling = max(high[i - 1], high[i - 2] if i > 1 else high[i - 1])
+
+        psar = psar + af * (ep - psar)
+        psar = np.where(up, np.minimum(psar, low_floor), np.maximum(psar, high_ceiling))
+        reverse = np.where(up, low[i] < psar, high[i] > psar)
+        extends = ~reverse & np.where(up, high[i] > ep, low[i] < ep)
+
+        psar = np.where(reverse, ep, psar)
+        af = np.where(reverse, initial_af, np.where(extends, np.minimum(max_af, af + increment), af))
+        ep = np.where(reverse | extends, np.where(up != reverse, high[i], low[i]), ep)
+        up = up != reverse
+        trends[:, i] = np.where(up, 1, -1)
+
+
+def psar_trend(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+               initial_af: float, max_af: float, increment: float) -> np.ndarray:
+    """Parabolic SAR trend of every bar (1 = up, -1 = down). Needs at least two bars."""
+    trend = np.zeros(len(close), dtype=np.int64)
+    _psar_kernel(np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64),
+                 np.asarray(close, dtype=np.float64), float(initial_af), float(max_af), float(increment), trend)
+    return trend
+
+
+def psar_trend_batch(high: np.ndarray, low: np.ndarray, close: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """
+    Parabolic SAR trends for many parameter sets at once: `params` has one
+    (initial_af, max_af, increment) row per set and the result one trend row per set,
+    identical to psar_trend of that set.
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 3)
+    trends = np.zeros((len(params), len(close)), dtype=np.int64)
+    kernel = _psar_batch_kernel if NUMBA_AVAILABLE else _psar_batch_numpy
+    kernel(np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64),
+           np.asarray(close, dtype=np.float64), params, trends)
+    return trends
 
 class PsarStrategy(AbstractStrategy):
     def __init__(self):
@@ -32,75 +165,27 @@ class PsarStrategy(AbstractStrategy):
 
     def _calculate_psar(self, high: np.ndarray, low: np.ndarray, close: np.ndarray,
                         initial_af: float, max_af: float, increment: float) -> np.ndarray:
-        """Calculate Parabolic SAR values."""
-        n = len(close)
-        psar = np.zeros(n)
-        trend = np.zeros(n, dtype=int)
-        af = np.full(n, initial_af)
-        ep = np.zeros(n)
-        
-        # Initialize
-        trend[0] = 1 if close[1] > close[0] else -1
-        psar[0] = low[0] if trend[0] > 0 else high[0]
-        ep[0] = high[0] if trend[0] > 0 else low[0]
-        
-        for i in range(1, n):
-            # Calculate new PSAR
-            psar[i] = psar[i-1] + af[i-1] * (ep[i-1] - psar[i-1])
-            
-            # Check for trend reversal
-            if trend[i-1] > 0:
-                psar[i] = min(psar[i], low[i-1], low[i-2] if i > 1 else low[i-1])
-                if low[i] < psar[i]:
-                    trend[i] = -1
-                    psar[i] = ep[i-1]
-                    ep[i] = low[i]
-                    af[i] = initial_af
-                else:
-                    trend[i] = trend[i-1]
-                    ep[i] = max(ep[i-1], high[i])
-                    af[i] = min(max_af, af[i-1] + increment) if ep[i] > ep[i-1] else af[i-1]
-            else:
-                psar[i] = max(psar[i], high[i-1], high[i-2] if i > 1 else high[i-1])
-                if high[i] > psar[i]:
-                    trend[i] = 1
-                    psar[i] = ep[i-1]
-                    ep[i] = high[i]
-                    af[i] = initial_af
-                else:
-                    trend[i] = trend[i-1]
-                    ep[i] = min(ep[i-1], low[i])
-                    af[i] = min(max_af, af[i-1] + increment) if ep[i] < ep[i-1] else af[i-1]
-        
-        return trend
+        """Calculate the Parabolic SAR trend (1 = up, -1 = down) of every bar."""
+        return psar_trend(high, low, close, initial_af, max_af, increment)
 
-
-    def backtest(self, df: pd.DataFrame, **kwargs) -> Tuple[float, float]:
+    def compute_positions(self, candles: CandleArrays, **kwargs) -> np.ndarray:
         initial_af = kwargs.get('initial_af', self.params['initial_af']['default'])
         max_af = kwargs.get('max_af', self.params['max_af']['default'])
         increment = kwargs.get('increment', self.params['increment']['default'])
-        
-        data = df.copy()
-        
-        if len(data) < 3:
-            return 0.0, 0.0
-        
-        high = data['high'].values
-        low = data['low'].values
-        close = data['close'].values
-        
-        # Calculate PSAR trend
-        trend = self._calculate_psar(high, low, close, initial_af, max_af, increment)
-        data['signal'] = trend
-        
-        # Calculate returns
-        data['pnl'] = data['close'].pct_change() * data['signal'].shift(1)
-        data['cumulative'] = (1 + data['pnl']).cumprod()
-        data['max_cumulative'] = data['cumulative'].cummax()
-        data['drawdown'] = (data['cumulative'] - data['max_cumulative']) / data['max_cumulative']
-        
-        total_pnl = data['pnl'].sum() * 100
-        max_drawdown = abs(data['drawdown'].min()) * 100
-        
-        return total_pnl, max_drawdown
 
+        if len(candles) < 3:
+            return np.zeros(len(candles), dtype=np.int64)
+
+        # Hold the PSAR trend
+        return self._calculate_psar(candles.high, candles.low, candles.close, initial_af, max_af, increment)
+
+    def backtest_batch(self, candles: CandleArrays, params_list: typing.List[typing.Dict]) -> typing.List[Tuple[float, float]]:
+        """Backtest a whole population with one psar_trend_batch pass over the prices."""
+        if len(candles) < 3:
+            return [(0.0, 0.0)] * len(params_list)
+
+        params = np.array([[params.get(key, self.params[key]['default']) for key in ('initial_af', 'max_af', 'increment')]
+                           for params in params_list], dtype=np.float64)
+        trends = psar_trend_batch(candles.high, candles.low, candles.close, params)
+
+        return [(pnl, max_drawdown) for pnl, max_drawdown in performance_batch(candles.close, trends)[:, :2].tolist()]
@@ -1,10 +1,124 @@
 """SMA Crossover Strategy"""
 import numpy as np
-import pandas as pd
 import typing
 from typing import Tuple
 
+from common.config import BATCH_MEMORY_BYTES
+from common.jit import NUMBA_AVAILABLE, njit, prange
 from .base import AbstractStrategy
+from .candles import CandleArrays
+from .indicators import rolling_mean
+
+
+@njit(cache=True, parallel=True)
+def _sma_batch_kernel(returns, averages, fast_rows, slow_rows, starts, results):
+    """Score each pair in one pass over the bars; pairs run in parallel."""
+    n = len(returns)
+    for row in prange(len(starts)):
+        fast_ma = averages[fast_rows[row]]
+        slow_ma = averages[slow_rows[row]]
+        start = starts[row]
+
+        total = 0.0
+        cumulative = 1.0
+        max_cumulative = 1.0
+        max_drawdown = 0.0
+        signal = 0
+        for t in range(start, n):
+            if t > start:
+                pnl = returns[t] * signal
+                total += pnl
+                cumulative *= 1 + pnl
+                if cumulative > max_cumulative:
+                    max_cumulative = cumulative
+                else:
+                    max_drawdown = min(max_drawdown, (cumulative - max_cumulative) / max_cumulative)
+            signal = 1 if fast_ma[t] > slow_ma[t] else -1
+
+        results[row, 0] = total * 100
+        results[row, 1] = abs(max_drawdown) * 100
+
+
+def _score_blocks(returns, averages, fast_rows, slow_rows, starts, results, memory_bytes):
+    """NumPy version of _sma_batch_kernel: pairs starting on the same bar are scored as one matrix."""
+    n = len(returns)
+    for start in np.unique(starts):
+        group = np.flatnonzero(starts == start)
+        bars = n - start
+        block = max(1, memory_bytes // (8 * 5 * bars))
+
+        for offset in range(0, len(group), block):
+            rows = group[offset:offset + block]
+            up = averages[fast_rows[rows], start:-1] > averages[slow_rows[rows], start:-1]
+
+            # Column 0 is the first bar with a signal, which has no return yet
+            pnl = np.zeros((len(rows), bars))
+            pnl[:, 1:] = np.where(up, returns[start + 1:], -returns[start + 1:])
+            del up
+
+            cumulative = np.cumprod(1 + pnl[:, 1:], axis=1)
+            max_cumulative = np.maximum(np.maximum.accumulate(cumulative, axis=1), 1)
+            drawdown = np.minimum(((cumulative - max_cumulative) / max_cumulative).min(axis=1), 0)
+
+            results[rows, 0] = pnl.sum(axis=1) * 100
+            results[rows, 1] = np.abs(drawdown) * 100
+
+
+def sma_batch(close: np.ndarray, pairs: np.ndarray,
+              memory_bytes: int = BATCH_MEMORY_BYTES) -> np.ndarray:
+    """
+    Backtest many (fast_ma, slow_ma) pairs on one close series; returns (pnl %, max drawdown %)
+    rows in the order of `pairs`, as SmaStrategy.backtest computes them.
+
+    Every moving average is a difference of one cumulative sum (of prices centred on their
+    mean, to keep the sums small), so averages may differ from pandas' rolling means in the
+    last bits. Averages are tabulated for as many windows as fit in `memory_bytes` at a time.
+    With numba each pair is then scored in one compiled pass; otherwise pairs are scored in
+    NumPy blocks within the same budget. `close` must not contain NaN.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    pairs, order = np.unique(np.asarray(pairs, dtype=np.int64).reshape(-1, 2), axis=0, return_inverse=True)
+    n = len(close)
+    results = np.zeros((len(pairs), 2))
+
+    offset = close.mean()
+    sums = np.concatenate([[0.0], np.cumsum(close - offset)])
+    # returns[t] is the return into bar t
+    returns = np.zeros(n)
+    returns[1:] = close[1:] / close[:-1] - 1
+
+    # The first bar with both averages; a pair needs two bars from there on to trade
+    starts = pairs.max(axis=1) - 1
+    todo = np.flatnonzero(starts <= n - 2)
+
+    max_windows = max(2, memory_bytes // (2 * 8 * n))
+    while len(todo):
+        # Take pairs in (fast, slow) order until their windows fill the table
+        windows = {}
+        taken = 0
+        for fast, slow in pairs[todo]:
+            if len(windows | {fast: 0, slow: 0}) > max_windows:
+                break
+            windows.setdefault(fast, len(windows))
+            windows.setdefault(slow, len(windows))
+            taken += 1
+        rows, todo = todo[:taken], todo[taken:]
+
+        averages = np.zeros((len(windows), n))
+        for window, index in windows.items():
+            averages[index, window - 1:] = (sums[window:] - sums[:n + 1 - window]) / window + offset
+
+        fast_rows = np.array([windows[fast] for fast in pairs[rows, 0]])
+        slow_rows = np.array([windows[slow] for slow in pairs[rows, 1]])
+        scores = np.zeros((len(rows), 2))
+        if NUMBA_AVAILABLE:
+            _sma_batch_kernel(returns, averages, fast_rows, slow_rows, starts[rows], scores)
+        else:
+            _score_blocks(returns, averages, fast_rows, slow_rows, starts[rows], scores, memory_bytes)
+        results[rows] = scores
+
+    return results[order.ravel()]
+
 
 class SmaStrategy(AbstractStrategy):
     def __init__(self):
@@ -19,31 +133,18 @@ class SmaStrategy(AbstractStrategy):
              params['slow_ma'] = max(params['slow_ma'], params['fast_ma'])
         return params
 
-    def backtest(self, df: pd.DataFrame, **kwargs) -> Tuple[float, float]:
-        fast_ma_param = kwargs.get('fast_ma', self.params['fast_ma']['default'])
-        slow_ma_param = kwargs.get('slow_ma', self.params['slow_ma']['default'])
-
-        data = df.copy()
-        
-        # Calculate moving averages
-        data['fast_ma'] = data['close'].rolling(window=fast_ma_param).mean()
-        data['slow_ma'] = data['close'].rolling(window=slow_ma_param).mean()
-        data.dropna(inplace=True)
-        
-        if len(data) < 2:
-            return 0.0, 0.0
-        
-        # Generate signals: 1 = long, -1 = short
-        data['signal'] = np.where(data['fast_ma'] > data['slow_ma'], 1, -1)
-        
-        # Calculate returns
-        data['pnl'] = data['close'].pct_change() * data['signal'].shift(1)
-        data['cumulative'] = (1 + data['pnl']).cumprod()
-        data['max_cumulative'] = data['cumulative'].cummax()
-        data['drawdown'] = (data['cumulative'] - data['max_cumulative']) / data['max_cumulative']
-        
-        total_pnl = data['pnl'].sum() * 100
-        max_drawdown = abs(data['drawdown'].min()) * 100
-        
-        return total_pnl, max_drawdown
+    def compute_positions(self, candles: CandleArrays, **kwargs) -> np.ndarray:
+        fast_ma = rolling_mean(candles, 'close', kwargs.get('fast_ma', self.params['fast_ma']['default']))
+        slow_ma = rolling_mean(candles, 'close', kwargs.get('slow_ma', self.params['slow_ma']['default']))
+
+        # 1 = long, -1 = short, flat until both averages exist
+        return np.where(np.isnan(fast_ma) | np.isnan(slow_ma), 0, np.where(fast_ma > slow_ma, 1, -1))
+
+    def backtest_batch(self, candles: CandleArrays, params_list: typing.List[typing.Dict]) -> typing.List[Tuple[float, float]]:
+        """Backtest many (fast_ma, slow_ma) pairs with sma_batch; data with gaps (NaN) is backtested one pair at a time."""
+        if np.isnan(candles.close).any():
+            return super().backtest_batch(candles, params_list)
 
+        pairs = [(params.get('fast_ma', self.params['fast_ma']['default']),
+                  params.get('slow_ma', self.params['slow_ma']['default'])) for params in params_list]
+        return [tuple(row) for row in sma_batch(candles.close, pairs).tolist()]
@@ -1,134 +1,158 @@
-import numpy as np
-import pandas as pd
-import typing
-from typing import Tuple
-
-from .base import AbstractStrategy
-
-class SupResStrategy(AbstractStrategy):
-    def __init__(self):
-        super().__init__()
-        self.params = {
-            'min_points': {'name': 'Min Points', 'type': int, 'default': 3, 'min': 1, 'max': 200},
-            'min_diff_points': {'name': 'Min Difference between touches', 'type': int, 'default': 7, 'min': 1, 'max': 200},
-            'rounding_nb': {'name': 'Rounding', 'type': int, 'default': 200, 'min': 1, 'max': 200, 'decimal': 2},
-            'take_profit': {'name': 'Take Profit', 'type': int, 'default': 10, 'min': 1, 'max': 200, 'decimal': 2},
-            'stop_loss': {'name': 'Stop Loss', 'type': int, 'default': 5, 'min': 1, 'max': 200, 'decimal': 2}
-        }
-
-    def backtest(self, df: pd.DataFrame, **kwargs) -> Tuple[float, float]:
-        min_points = kwargs.get('min_points', self.params['min_points']['default'])
-        min_diff_points = kwargs.get('min_diff_points', self.params['min_diff_points']['default'])
-        rounding_nb = kwargs.get('rounding_nb', self.params['rounding_nb']['default'])
-        take_profit = kwargs.get('take_profit', self.params['take_profit']['default'])
-        stop_loss = kwargs.get('stop_loss', self.params['stop_loss']['default'])
-
-        candle_length = df.iloc[1].name - df.iloc[0].name
-        
-        # State
-        pnl_list = []
-        trade_side = 0
-        entry_price = None
-        
-        # Round prices for level detection
-        df = df.copy()
-        df['rounded_high'] = (df['high'] / rounding_nb).round() * rounding_nb
-        df['rounded_low'] = (df['low'] / rounding_nb).round() * rounding_nb
-        
-        # Convert to numpy for performance
-        highs = df['high'].values
-        lows = df['low'].values
-        rounded_highs = df['rounded_high'].values
-        rounded_lows = df['rounded_low'].values
-        closes = df['close'].values
-        times = df.index.values
-        
-        price_groups = {'supports': {}, 'resistances': {}}
-        levels = {'supports': [], 'resistances': []}
-        last_hl = {'supports': [], 'resistances': []}
-        
-        for i in range(len(highs)):
-            timestamp = times[i]
-            
-            for side in ['resistances', 'supports']:
-                is_res = (side == 'resistances')
-                price = highs[i] if is_res else lows[i]
-                rounded = rounded_highs[i] if is_res else rounded_lows[i]
-                close = closes[i]
-                
-                # Count breaks in recent history
-                breaks = sum(1 for p in last_hl[side] if (p > price if is_res else p < price))
-                
-                # Update or create price group
-                if rounded in price_groups[side]:
-                    grp = price_groups[side][rounded]
-                    
-                    if grp['start_time'] is None and breaks < 3:
-                        grp['start_time'] = timestamp
-                    
-                    if breaks < 3 and (grp['last'] is None or timestamp >= grp['last'] + min_diff_points * candle_length):
-                        grp['prices'].append(price)
-                        grp['last'] = timestamp
-                        
-                        if len(grp['prices']) >= min_points:
-                            extreme = max(grp['prices']) if is_res else min(grp['prices'])
-                            levels[side].append({'price': extreme, 'broken': False})
-                else:
-                    if breaks < 3:
-                        price_groups[side][rounded] = {'prices': [price], 'start_time': timestamp, 'last': timestamp}
-                
-                # Invalidate broken groups
-                for grp in price_groups[side].values():
-                    if grp['prices']:
-                        extreme = max(grp['prices']) if is_res else min(grp['prices'])
-                        if (is_res and price > extreme) or (not is_res and price < extreme):
-                            grp['prices'] = []
-                            grp['start_time'] = None
-                            grp['last'] = None
-                
-                # Update history (keep last 10)
-                last_hl[side].append(price)
-                if len(last_hl[side]) > 10:
-                    last_hl[side].pop(0)
-                
-                # Check for breakout entry
-                for level in levels[side]:
-                    if not level['broken']:
-                        breakout = close > level['price'] if is_res else close < level['price']
-                        if breakout:
-                            level['broken'] = True
-                            if trade_side == 0:
-                                entry_price = close
-                                trade_side = 1 if is_res else -1
-                
-                # Check TP/SL
-                if trade_side != 0 and entry_price:
-                    tp_pct = take_profit / 100
-                    sl_pct = stop_loss / 100
-                    
-                    if trade_side == 1:
-                        hit_tp = close >= entry_price * (1 + tp_pct)
-                        hit_sl = close <= entry_price * (1 - sl_pct)
-                        if hit_tp or hit_sl:
-                            pnl_list.append((close / entry_price - 1) * 100)
-                            trade_side = 0
-                            entry_price = None
-                    elif trade_side == -1:
-                        hit_tp = close <= entry_price * (1 - tp_pct)
-                        hit_sl = close >= entry_price * (1 + sl_pct)
-                        if hit_tp or hit_sl:
-                            pnl_list.append((entry_price / close - 1) * 100)
-                            trade_side = 0
-                            entry_price = None
-        
-        # Calculate drawdown
-        if pnl_list:
-            cumulative = np.cumprod(1 + np.array(pnl_list) / 100)
-            running_max = np.maximum.accumulate(cumulative)
-            drawdowns = (cumulative - running_max) / running_max
-            max_drawdown = drawdowns.min()
-        else:
-            max_drawdown = 0.0
-        
-        return sum(pnl_list), max_drawdown
-
+from collections import deque
+import bisect
+import heapq
+
+import numpy as np
+import typing
+from typing import Tuple
+
+from .base import AbstractStrategy
+from .candles import CandleArrays
+
+class SupResStrategy(AbstractStrategy):
+    def __init__(self):
+        super().__init__()
+        self.params = {
+            'min_points': {'name': 'Min Points', 'type': int, 'default': 3, 'min': 1, 'max': 200},
+            'min_diff_points': {'name': 'Min Difference between touches', 'type': int, 'default': 7, 'min': 1, 'max': 200},
+            'rounding_nb': {'name': 'Rounding', 'type': int, 'default': 200, 'min': 1, 'max': 200, 'decimal': 2},
+            'take_profit': {'name': 'Take Profit', 'type': int, 'default': 10, 'min': 1, 'max': 200, 'decimal': 2},
+            'stop_loss': {'name': 'Stop Loss', 'type': int, 'default': 5, 'min': 1, 'max': 200, 'decimal': 2}
+        }
+
+    def backtest_arrays(self, candles: CandleArrays, **kwargs) -> Tuple[float, float]:
+        """Trades are scored on their own entry and exit prices rather than as positions."""
+        min_points = kwargs.get('min_points', self.params['min_points']['default'])
+        min_diff_points = kwargs.get('min_diff_points', self.params['min_diff_points']['default'])
+        rounding_nb = kwargs.get('rounding_nb', self.params['rounding_nb']['default'])
+        take_profit = kwargs.get('take_profit', self.params['take_profit']['default'])
+        stop_loss = kwargs.get('stop_loss', self.params['stop_loss']['default'])
+
+        pnl_list = self._trades(candles, min_points, min_diff_points, rounding_nb, take_profit, stop_loss)
+
+        # Drawdown over the closed trades, with the conventions of strategies.metrics
+        if pnl_list:
+            cumulative = np.cumprod(1 + np.array(pnl_list) / 100)
+            running_max = np.maximum(np.maximum.accumulate(cumulative), 1)
+            max_drawdown = abs(min(((cumulative - running_max) / running_max).min(), 0)) * 100
+        else:
+            max_drawdown = 0.0
+
+        return sum(pnl_list), max_drawdown
+
+    def _trades(self, candles: CandleArrays, min_points: int, min_diff_points: int, rounding_nb: int,
+                take_profit: int, stop_loss: int) -> typing.List[float]:
+        """
+        Return the PnL % of every closed trade, in order.
+
+        Price groups collect the highs (resistances) or lows (supports) that round to the same
+        price. Each group keeps its touch count and running extreme rather than its prices,
+        groups the price moves beyond come off a lazy heap ordered by extreme, and unbroken
+        levels stay sorted so a breakout removes a tail found by bisection. Resistance keys are
+        negated so both sides share the same orderings.
+        """
+        times = candles.timestamps
+        candle_length = times[1] - times[0]
+        min_diff = min_diff_points * candle_length
+        tp_pct = take_profit / 100
+        sl_pct = stop_loss / 100
+
+        # State
+        pnl_list = []
+        trade_side = 0
+        entry_price = None
+
+        # Round prices for level detection
+        highs = candles.high
+        lows = candles.low
+        rounded_highs = np.round(highs / rounding_nb) * rounding_nb
+        rounded_lows = np.round(lows / rounding_nb) * rounding_nb
+        closes = candles.close
+
+        sides = []
+        for is_res in (True, False):
+            sides.append({
+                'is_res': is_res,
+                'sign': -1 if is_res else 1,
+                'prices': highs if is_res else lows,
+                'rounded': rounded_highs if is_res else rounded_lows,
+                # rounded price -> [touches, extreme, last touch time, version]; 0 touches = broken
+                'groups': {},
+                # (-sign * extreme, version, rounded price); entries of an older version are stale
+                'extremes': [],
+                # sign * price of every unbroken level, ascending
+                'levels': [],
+                'last_hl': deque(maxlen=10),
+            })
+
+        for i in range(len(highs)):
+            timestamp = times[i]
+            close = closes[i]
+
+            for side in sides:
+                is_res = side['is_res']
+                sign = side['sign']
+                price = side['prices'][i]
+                rounded = side['rounded'][i]
+                groups = side['groups']
+                extremes = side['extremes']
+
+                # Count breaks in recent history
+                breaks = sum(1 for p in side['last_hl'] if (p > price if is_res else p < price))
+
+                # Update or create price group
+                grp = groups.get(rounded)
+                if grp is not None:
+                    if breaks < 3 and (grp[2] is None or timestamp >= grp[2] + min_diff):
+                        grp[0] += 1
+                        grp[2] = timestamp
+                        if grp[0] == 1 or (price > grp[1] if is_res else price < grp[1]):
+                            grp[1] = price
+                            grp[3] += 1
+                            heapq.heappush(extremes, (-sign * price, grp[3], rounded))
+
+                        if grp[0] >= min_points:
+                            bisect.insort(side['levels'], sign * grp[1])
+                elif breaks < 3:
+                    groups[rounded] = [1, price, timestamp, 0]
+                    heapq.heappush(extremes, (-sign * price, 0, rounded))
+
+                # Invalidate broken groups
+                while extremes and extremes[0][0] < -sign * price:
+                    _, version, key = heapq.heappop(extremes)
+                    grp = groups[key]
+                    if grp[3] == version and grp[0]:
+                        grp[0] = 0
+                        grp[2] = None
+                        grp[3] += 1
+
+                # Update history (keep last 10)
+                side['last_hl'].append(price)
+
+                # Check for breakout entry
+                levels = side['levels']
+                broken = bisect.bisect_right(levels, sign * close)
+                if broken < len(levels):
+                    del levels[broken:]
+                    if trade_side == 0:
+                        entry_price = close
+                        trade_side = 1 if is_res else -1
+
+                # Check TP/SL
+                if trade_side != 0 and entry_price:
+                    if trade_side == 1:
+                        hit_tp = close >= entry_price * (1 + tp_pct)
+                        hit_sl = close <= entry_price * (1 - sl_pct)
+                        if hit_tp or hit_sl:
+                            pnl_list.append((close / entry_price - 1) * 100)
+                            trade_side = 0
+                            entry_price = None
+                    elif trade_side == -1:
+                        hit_tp = close <= entry_price * (1 - tp_pct)
+                        hit_sl = close >= entry_price * (1 + sl_pct)
+                        if hit_tp or hit_sl:
+                            pnl_list.append((entry_price / close - 1) * 100)
+                            trade_side = 0
+                            entry_price = None
+
+        return pnl_list
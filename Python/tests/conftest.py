@@ -0,0 +1,37 @@
+"""Shared fixtures: an isolated data directory and synthetic candles."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import exchanges.base
+import services.columnar
+import services.database
+import services.scheduler
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point every store and cache at a temporary data directory."""
+    for module in (services.database, services.columnar, services.scheduler, exchanges.base):
+        monkeypatch.setattr(module, 'DATA_DIR', str(tmp_path))
+    yield tmp_path
+    for file, _ in services.database._FILE_POOL.values():
+        if file.id.valid:
+            file.close()
+    services.database._FILE_POOL.clear()
+
+
+def random_walk(size: int, seed: int = 0, freq: str = '1min') -> pd.DataFrame:
+    """Candles of a random walk around 30000, volatile enough to form and break levels."""
+    rng = np.random.default_rng(seed)
+    close = np.cumsum(rng.normal(0, 20, size)) + 30000
+    return pd.DataFrame({'open': close, 'high': close + rng.random(size) * 30, 'low': close - rng.random(size) * 30,
+                         'close': close, 'volume': rng.random(size)},
+                        index=pd.date_range('2023-01-01', periods=size, freq=freq, name='date'))
+
+
+def minute_rows(size: int, seed: int = 0, start: int = 1_600_000_000_000) -> np.ndarray:
+    """(size, 6) array of consecutive 1m candles starting at `start` (ms, aligned to the minute)."""
+    candles = random_walk(size, seed)
+    timestamps = start - start % 60000 + np.arange(size) * 60000
+    return np.column_stack([timestamps, candles[['open', 'high', 'low', 'close', 'volume']].values])
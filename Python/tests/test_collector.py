@@ -0,0 +1,337 @@
+"""Concurrent collection against a local fake exchange."""
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import services.async_collector
+import services.data_collector
+import services.scheduler
+from common.config import ONE_MINUTE_MS
+from conftest import minute_rows
+from exchanges.base import ExchangeRequestError
+from exchanges.binance import BinanceClient
+from exchanges.okx import OkxClient
+from exchanges.rate_limit import TokenBucket
+from services.async_collector import collect_range, collect_windows, repair_gaps, split_windows
+from services.database import Hdf5Client
+from services.data_collector import collect_all
+from services.scheduler import resolve_symbols, run_schedule
+from services.storage import get_storage_client
+
+
+class FakeExchange(ThreadingHTTPServer):
+    """
+    Serves Binance futures klines from `candles`, whatever the symbol, and lists `symbols` as
+    exchange info. Each response comes after a random delay of up to `delay` seconds so
+    concurrent requests complete out of order. Responses queued in `script` as (status,
+    headers, body) are served first, whatever the endpoint, and every request after the first
+    `fail_after` gets HTTP 400.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, candles: np.ndarray):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.candles = candles
+        self.symbols = ['BTCUSDT']
+        self.delay = 0.0
+        self.script = []
+        self.fail_after = None
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def kline_requests(self) -> list:
+        return [params for path, params in self.requests if path == '/fapi/v1/klines']
+
+    def klines(self, params: dict) -> list:
+        timestamps = self.candles[:, 0]
+        limit = int(params.get('limit', 500))
+        mask = np.ones(len(timestamps), dtype=bool)
+        if 'startTime' in params:
+            mask &= timestamps >= int(params['startTime'])
+        if 'endTime' in params:
+            mask &= timestamps <= int(params['endTime'])
+        rows = self.candles[mask]
+        # Without a start, Binance returns the latest page before the end
+        rows = rows[:limit] if 'startTime' in params else rows[-limit:]
+        return [[int(row[0]), *(repr(float(value)) for value in row[1:]), int(row[0]) + ONE_MINUTE_MS - 1]
+                for row in rows]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        with server.lock:
+            server.requests.append((url.path, params))
+            scripted = server.script.pop(0) if server.script else None
+        time.sleep(random.uniform(0, server.delay))
+
+        if scripted is not None:
+            status, headers, body = scripted
+        elif server.fail_after is not None and len(server.requests) > server.fail_after:
+            status, headers, body = 400, {}, {'code': -1000, 'msg': 'An unknown error occurred.'}
+        elif url.path == '/fapi/v1/klines':
+            status, headers, body = 200, {'X-MBX-USED-WEIGHT-1M': '10'}, server.klines(params)
+        elif url.path == '/fapi/v1/exchangeInfo':
+            status, headers, body = 200, {}, {'symbols': [{'symbol': symbol} for symbol in server.symbols]}
+        else:
+            status, headers, body = 404, {}, {'msg': 'not found'}
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def exchange():
+    server = FakeExchange(minute_rows(1000, seed=3))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def binance_client(exchange: FakeExchange, page_size: int = 50) -> BinanceClient:
+    client = BinanceClient(futures=True, base_url=exchange.url)
+    client.page_size = page_size
+    # A private budget, so tests do not drain or pause the process-wide one
+    client.rate_limiter = TokenBucket(10_000)
+    return client
+
+
+def test_split_windows_cover_the_range_in_pages():
+    first = 1_600_000_020_000 - 1_600_000_020_000 % ONE_MINUTE_MS
+    last = first + 9 * ONE_MINUTE_MS
+
+    windows = split_windows(first, last, page_size=3)
+
+    assert windows == [(first + start * ONE_MINUTE_MS, first + end * ONE_MINUTE_MS)
+                       for start, end in [(0, 2), (3, 5), (6, 8), (9, 9)]]
+    assert split_windows(first, first, page_size=3) == [(first, first)]
+    assert split_windows(last, first, page_size=3) == []
+
+
+def test_collect_range_stores_every_candle_in_order(data_dir, exchange, monkeypatch):
+    # Several write batches, with responses completing out of order within each
+    monkeypatch.setattr(services.async_collector, 'WRITE_BATCH_CANDLES', 200)
+    exchange.delay = 0.02
+    candles = exchange.candles
+    client = binance_client(exchange)
+    storage = get_storage_client('binance')
+    storage.create_dataset('BTCUSDT')
+
+    written = asyncio.run(collect_range(client, storage, 'BTCUSDT', int(candles[0, 0]), int(candles[-1, 0]),
+                                        concurrency=4))
+
+    assert written == len(candles)
+    stored = storage.get_data('BTCUSDT', int(candles[0, 0]), int(candles[-1, 0]))
+    assert stored.index.is_monotonic_increasing
+    assert stored.index.equals(pd.DatetimeIndex(pd.to_datetime(candles[:, 0], unit='ms'), name='date'))
+    assert np.array_equal(stored.values, candles[:, 1:])
+    assert len(exchange.kline_requests()) == len(candles) // client.page_size
+    assert client.rate_limiter.requests == len(exchange.kline_requests())
+
+
+def test_rate_limited_request_pauses_and_retries(exchange):
+    candles = exchange.candles
+    client = binance_client(exchange)
+    exchange.script = [(429, {'Retry-After': '0.3'}, {'code': -1003, 'msg': 'Too many requests'})]
+
+    start = time.monotonic()
+    fetched = client.get_candles_between('BTCUSDT', int(candles[0, 0]), int(candles[9, 0]))
+
+    assert time.monotonic() - start >= 0.25
+    assert np.array_equal(fetched, candles[:10])
+    assert len(exchange.kline_requests()) == 2
+    assert client.rate_limiter.paused_until > 0
+
+
+@pytest.mark.parametrize('status', [418, 429, 503])
+def test_request_succeeds_after_a_failed_attempt(exchange, status):
+    # 418/429 are retried by the client through the limiter, 5xx by the session
+    candles = exchange.candles
+    client = binance_client(exchange)
+    exchange.script = [(status, {'Retry-After': '0'}, {'code': -1003, 'msg': 'Try again later'})]
+
+    fetched = client.get_candles_between('BTCUSDT', int(candles[0, 0]), int(candles[9, 0]))
+
+    assert np.array_equal(fetched, candles[:10])
+    assert len(exchange.kline_requests()) == 2
+    assert client.rate_limiter.requests == (2 if status in (418, 429) else 1)
+
+
+def test_empty_and_malformed_kline_pages(exchange):
+    client = binance_client(exchange)
+    exchange.script = [(200, {}, [])]
+    assert client.get_historical_data('BTCUSDT', end_time=int(exchange.candles[-1, 0])) is None
+
+    exchange.script = [(200, {}, [[1_600_000_000_000, '1', '2']])]
+    with pytest.raises(ExchangeRequestError, match='Malformed klines'):
+        client.get_historical_data('BTCUSDT', end_time=int(exchange.candles[-1, 0]))
+
+
+def test_window_still_rate_limited_after_retries_is_reported(data_dir, exchange):
+    limited = (429, {'Retry-After': '0'}, {'code': -1003, 'msg': 'Too many requests'})
+    candles = exchange.candles
+    client = binance_client(exchange)
+    storage = get_storage_client('binance')
+    storage.create_dataset('BTCUSDT')
+    windows = split_windows(int(candles[0, 0]), int(candles[199, 0]), client.page_size)
+
+    exchange.script = [limited] * 5
+    with pytest.raises(ExchangeRequestError):
+        client.get_candles_between('BTCUSDT', *windows[0])
+    exchange.script = [limited] * 5
+    written, failed = asyncio.run(collect_windows(client, storage, 'BTCUSDT', windows, concurrency=1))
+
+    assert failed == windows[:1]
+    assert written == 150
+    assert storage.get_first_last_candle('BTCUSDT') == (candles[50, 0], candles[199, 0])
+
+
+def test_okx_error_code_raises(exchange):
+    client = OkxClient(base_url=exchange.url)
+    client.rate_limiter = TokenBucket(10_000)
+    exchange.script = [(200, {}, {'code': '50011', 'msg': 'Too Many Requests', 'data': []})]
+
+    with pytest.raises(ExchangeRequestError, match='50011'):
+        client.get_historical_data('BTC-USDT', end_time=int(exchange.candles[-1, 0]))
+
+
+def test_collect_all_logs_a_failed_initial_fetch(data_dir, exchange, caplog):
+    client = binance_client(exchange)
+    exchange.script = [(400, {}, {'code': -1121, 'msg': 'Invalid symbol.'})]
+
+    with caplog.at_level(logging.ERROR):
+        written = collect_all(client, 'binance', 'BTCUSDT')
+
+    assert written == 0
+    assert 'Could not fetch the latest candles' in caplog.text
+
+
+def test_interrupted_backfill_resumes_from_its_checkpoint(data_dir, exchange, monkeypatch):
+    monkeypatch.setattr(services.data_collector, 'WRITE_BATCH_CANDLES', 200)
+    batches = []
+    write_data = Hdf5Client.write_data
+
+    def record(storage, symbol, data):
+        batches.append(len(data))
+        return write_data(storage, symbol, data)
+
+    monkeypatch.setattr(Hdf5Client, 'write_data', record)
+    candles = exchange.candles
+    client = binance_client(exchange)
+    exchange.requests.clear()
+
+    # The latest page and seven backfill pages, then the exchange fails
+    exchange.fail_after = 8
+    assert collect_all(client, 'binance', 'BTCUSDT') == 400
+    storage = get_storage_client('binance')
+    assert storage.get_first_last_candle('BTCUSDT') == (candles[600, 0], candles[-1, 0])
+    assert storage.get_checkpoint('BTCUSDT') == (candles[600, 0], False)
+
+    exchange.fail_after = None
+    exchange.requests.clear()
+    assert collect_all(client, 'binance', 'BTCUSDT') == 600
+
+    # The second run pages back from the checkpoint instead of refetching what is stored
+    assert int(exchange.requests[1][1]['endTime']) == candles[600, 0] - ONE_MINUTE_MS
+    assert max(batches) <= 200
+    assert storage.get_checkpoint('BTCUSDT') == (candles[0, 0], True)
+    stored = storage.get_data('BTCUSDT', 0, 10 ** 14)
+    assert stored.index.equals(pd.DatetimeIndex(pd.to_datetime(candles[:, 0], unit='ms'), name='date'))
+    assert np.array_equal(stored.values, candles[:, 1:])
+
+
+def test_repair_fills_holes_and_flags_the_ones_missing_on_the_exchange(data_dir, exchange):
+    candles = exchange.candles
+    # Rows 600-609 are missing on the exchange too
+    exchange.candles = np.delete(candles, np.arange(600, 610), axis=0)
+    storage = get_storage_client('binance')
+    storage.create_dataset('BTCUSDT')
+    storage.write_data('BTCUSDT', np.delete(candles, np.r_[300:450, 600:610], axis=0))
+    assert np.array_equal(storage.get_gaps('BTCUSDT'), [[candles[300, 0], candles[449, 0], 0],
+                                                        [candles[600, 0], candles[609, 0], 0]])
+    client = binance_client(exchange)
+
+    assert repair_gaps(client, 'binance', 'BTCUSDT', concurrency=2) == 150
+
+    stored = storage.get_data('BTCUSDT', 0, 10 ** 14)
+    assert np.array_equal(stored.values, exchange.candles[:, 1:])
+    assert np.array_equal(storage.get_gaps('BTCUSDT'), [[candles[600, 0], candles[609, 0], 1]])
+    assert storage.get_metadata('BTCUSDT')['missing_candles'] == 10
+
+    # A confirmed hole is not requested again
+    exchange.requests.clear()
+    assert repair_gaps(client, 'binance', 'BTCUSDT', concurrency=2) == 0
+    assert exchange.requests == []
+
+
+def test_resolve_symbols_expands_patterns():
+    available = ['BTCUSDT', 'ETHUSDT', 'BTCUSDC', 'ETHBTC']
+
+    assert resolve_symbols(available, ['*USDT', 'ETHBTC']) == ['BTCUSDT', 'ETHUSDT', 'ETHBTC']
+    assert resolve_symbols(available, ['SOLUSDT']) == []
+
+
+def test_schedule_resumes_the_symbols_that_failed(data_dir, exchange, monkeypatch):
+    exchange.symbols = ['BTCUSDT', 'ETHUSDT', 'BTCUSDC']
+    monkeypatch.setitem(services.scheduler.CLIENT_MAP, 'binance', lambda futures: binance_client(exchange))
+    collected = []
+    failing = {'ETHUSDT'}
+
+    def collect(client, exchange_name, symbol):
+        collected.append(symbol)
+        if symbol in failing:
+            raise RuntimeError('connection reset')
+        return collect_all(client, exchange_name, symbol)
+
+    monkeypatch.setattr(services.scheduler, 'collect_all', collect)
+    progress_file = data_dir / 'collection_progress.json'
+
+    run_schedule({'binance': ['*USDT']})
+
+    with open(progress_file) as f:
+        symbols = json.load(f)['symbols']
+    assert sorted(collected) == ['BTCUSDT', 'ETHUSDT']
+    assert symbols['binance:BTCUSDT']['status'] == 'done'
+    assert symbols['binance:BTCUSDT']['candles'] == len(exchange.candles)
+    assert symbols['binance:ETHUSDT']['status'] == 'failed'
+    assert not (data_dir / 'collection_progress.last.json').exists()
+
+    failing.clear()
+    collected.clear()
+    run_schedule({'binance': ['*USDT']})
+
+    assert collected == ['ETHUSDT']
+    assert not progress_file.exists()
+    with open(data_dir / 'collection_progress.last.json') as f:
+        symbols = json.load(f)['symbols']
+    assert {key: entry['status'] for key, entry in symbols.items()} == {'binance:BTCUSDT': 'done',
+                                                                        'binance:ETHUSDT': 'done'}
+    storage = get_storage_client('binance')
+    assert storage.get_first_last_candle('ETHUSDT') == (exchange.candles[0, 0], exchange.candles[-1, 0])
@@ -0,0 +1,87 @@
+"""Exchange clients: kline decoding and the cached symbol catalogue."""
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+import requests
+
+from common.config import SYMBOL_CACHE_TTL
+from exchanges.base import ExchangeRequestError, decode_klines
+from exchanges.binance import BinanceClient
+
+
+def test_decode_klines_reads_numbers_and_numeric_strings():
+    rows = [[1_600_000_060_000, '2.5', '3', '1', '2', '10.5', 1_600_000_119_999],
+            [1_600_000_000_000, 1, 2, 0.5, 1.5, 7]]
+
+    decoded = decode_klines(rows, newest_first=True)
+
+    assert decoded.dtype == np.float64
+    assert np.array_equal(decoded, [[1_600_000_000_000, 1, 2, 0.5, 1.5, 7],
+                                    [1_600_000_060_000, 2.5, 3, 1, 2, 10.5]])
+    assert decode_klines([]).shape == (0, 6)
+
+
+@pytest.mark.parametrize('payload', [
+    [[1_600_000_000_000, '1', '2', '0.5', '1.5']],  # a field short
+    [[1_600_000_000_000, '1', '2', 'n/a', '1.5', '7']],
+    [None],
+    {'code': -1121, 'msg': 'Invalid symbol.'},
+])
+def test_decode_klines_rejects_malformed_payloads(payload):
+    with pytest.raises(ExchangeRequestError, match='Malformed klines'):
+        decode_klines(payload)
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Fail every HTTP request the way an unreachable exchange does, and count them."""
+    calls = []
+
+    def get(session, url, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError('offline')
+
+    monkeypatch.setattr(requests.Session, 'get', get)
+    return calls
+
+
+def write_catalogue(data_dir, symbols: list, age: float = 0) -> str:
+    path = os.path.join(data_dir, 'symbols_binance_futures.json')
+    with open(path, 'w') as f:
+        json.dump(symbols, f)
+    os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def test_clients_start_without_a_request(data_dir, offline):
+    BinanceClient(futures=True)
+
+    assert offline == []
+
+
+def test_fresh_catalogue_is_read_from_disk(data_dir, offline):
+    write_catalogue(data_dir, ['BTCUSDT', 'ETHUSDT'])
+
+    assert BinanceClient(futures=True).symbols == ['BTCUSDT', 'ETHUSDT']
+    assert offline == []
+
+
+def test_expired_catalogue_is_refetched(data_dir, monkeypatch):
+    path = write_catalogue(data_dir, ['BTCUSDT'], age=SYMBOL_CACHE_TTL + 60)
+    client = BinanceClient(futures=True)
+    monkeypatch.setattr(client, '_get_symbols', lambda: ['BTCUSDT', 'SOLUSDT'])
+
+    assert client.symbols == ['BTCUSDT', 'SOLUSDT']
+    with open(path) as f:
+        assert json.load(f) == ['BTCUSDT', 'SOLUSDT']
+    assert time.time() - os.path.getmtime(path) < 60
+
+
+def test_expired_catalogue_is_used_offline(data_dir, offline):
+    write_catalogue(data_dir, ['BTCUSDT'], age=SYMBOL_CACHE_TTL + 60)
+
+    assert BinanceClient(futures=True).symbols == ['BTCUSDT']
+    assert len(offline) == 1
@@ -0,0 +1,86 @@
+"""NSGA-II selection: sweep sorting and NumPy crowding distance against the pairwise and loop versions."""
+import copy
+
+import numpy as np
+import pytest
+
+from core.genetic_utils import (calculate_crowding_distance, calculate_crowding_distance_loop,
+                                non_dominated_sorting, non_dominated_sorting_pairwise)
+from models.result import BacktestResult
+
+
+def random_population(size: int, seed: int, nan_share: float = 0.03) -> list:
+    """
+    Rounded objectives, so there are ties, a share of penalized (-inf, inf) individuals and a
+    share with a NaN objective.
+    """
+    rng = np.random.default_rng(seed)
+    pnls = np.round(rng.normal(0, 20, size), 1)
+    drawdowns = np.round(np.abs(rng.normal(0, 10, size)), 1)
+    pnls[rng.random(size) < nan_share] = np.nan
+    drawdowns[rng.random(size) < nan_share] = np.nan
+    population = []
+    for pnl, drawdown, penalized in zip(pnls.tolist(), drawdowns.tolist(), rng.random(size) < 0.05):
+        individual = BacktestResult()
+        individual.pnl, individual.max_drawdown = (-float('inf'), float('inf')) if penalized else (pnl, drawdown)
+        population.append(individual)
+    return population
+
+
+def positions(fronts: list, population: list) -> list:
+    index = {id(individual): i for i, individual in enumerate(population)}
+    return [[index[id(individual)] for individual in front] for front in fronts]
+
+
+@pytest.mark.parametrize('size, seed', [(1, 0), (2, 0), (50, 1), (300, 2), (1000, 3)])
+def test_sweep_sorting_matches_pairwise(size, seed):
+    reference = random_population(size, seed)
+    population = copy.deepcopy(reference)
+
+    expected = non_dominated_sorting_pairwise(dict(enumerate(reference)))
+    fronts = non_dominated_sorting(dict(enumerate(population)))
+
+    assert positions(fronts, population) == positions(expected, reference)
+    assert [x.rank for x in population] == [x.rank for x in reference]
+
+
+@pytest.mark.parametrize('size, seed', [(1, 0), (2, 0), (3, 1), (50, 1), (300, 2)])
+def test_numpy_crowding_distance_matches_loop(size, seed):
+    # The loop reference leaves NaN wherever sorted() puts it, so compare fronts without NaN
+    reference = random_population(size, seed, nan_share=0)
+    population = copy.deepcopy(reference)
+
+    for front in non_dominated_sorting_pairwise(dict(enumerate(reference))):
+        calculate_crowding_distance_loop(front)
+    for front in non_dominated_sorting(dict(enumerate(population))):
+        calculate_crowding_distance(front)
+
+    # Fronts of tied penalized individuals get NaN distances (inf - inf) in both versions
+    assert np.array_equal([x.crowding_distance for x in population], [x.crowding_distance for x in reference],
+                          equal_nan=True)
+
+
+def test_nan_objectives_add_no_crowding_distance():
+    population = []
+    for pnl, drawdown in [(1.0, 5.0), (float('nan'), 1.0), (2.0, 4.0), (3.0, float('nan')), (4.0, 2.0), (5.0, 1.0)]:
+        individual = BacktestResult()
+        individual.pnl, individual.max_drawdown = pnl, drawdown
+        population.append(individual)
+
+    ordered = calculate_crowding_distance(population)
+
+    # pnl spaces 0, 2, 3, 4, 5 over a range of 4; drawdown spaces 5, 1, 4, 2, 0 over a range of 4
+    assert [x.crowding_distance for x in population] == pytest.approx(
+        [float('inf'), (2 - 1) / 4, (3 - 1) / 4 + (5 - 2) / 4, (4 - 2) / 4, (5 - 3) / 4 + (4 - 1) / 4, float('inf')])
+    # Sorted by the last objective, NaN last
+    assert ordered == [population[i] for i in (5, 1, 4, 2, 0, 3)]
+
+
+def test_front_without_values_has_no_distance():
+    population = [BacktestResult() for _ in range(3)]
+    for individual in population:
+        individual.pnl, individual.max_drawdown = float('nan'), float('nan')
+
+    calculate_crowding_distance(population)
+
+    assert [x.crowding_distance for x in population] == [0, 0, 0]
@@ -0,0 +1,75 @@
+"""Shared performance metrics against the pandas computation of the original backtests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategies.metrics
+from strategies.metrics import performance, performance_batch
+
+
+def reference(close: np.ndarray, positions: np.ndarray) -> tuple:
+    """PnL % and max drawdown % as the original pandas backtests computed them."""
+    data = pd.DataFrame({'close': close, 'signal': positions})
+    pnl = (data['close'].ffill().pct_change() * data['signal'].shift(1)).fillna(0.0)
+    cumulative = (1 + pnl).cumprod()
+    drawdown = (cumulative - np.maximum(cumulative.cummax(), 1)) / np.maximum(cumulative.cummax(), 1)
+    return pnl.sum() * 100, abs(min(drawdown.min(), 0)) * 100
+
+
+@pytest.fixture(params=[True, False], ids=['numba', 'numpy'])
+def kernel(request, monkeypatch):
+    if request.param and not strategies.metrics.NUMBA_AVAILABLE:
+        pytest.skip('numba is not installed')
+    monkeypatch.setattr(strategies.metrics, 'NUMBA_AVAILABLE', request.param)
+
+
+def test_metrics_match_pandas(kernel):
+    rng = np.random.default_rng(0)
+    close = np.cumsum(rng.normal(0, 1, 500)) + 100
+    positions = rng.integers(-1, 2, (20, 500))
+
+    results = performance_batch(close, positions)
+
+    for row, series in zip(results, positions):
+        assert row[:2] == pytest.approx(reference(close, series), rel=1e-9, abs=1e-12)
+
+
+def test_missing_closes_are_forward_filled(kernel):
+    close = np.array([np.nan, 100.0, np.nan, np.nan, 110.0, 99.0, np.nan])
+    positions = np.array([1, 1, 1, 1, -1, -1, 0])
+
+    metrics = performance(close, positions)
+
+    # Long across the gap earns 100 -> 110, short then earns 110 -> 99
+    assert metrics.pnl == pytest.approx(10.0 + 10.0)
+    assert (metrics.pnl, metrics.max_drawdown) == pytest.approx(reference(close, positions))
+
+
+def test_every_field_of_a_hand_computed_series(kernel):
+    close = np.array([100.0, 110.0, 99.0, 99.0, 108.9])
+    positions = np.array([1, 1, 0, -1, 0])
+
+    metrics = performance(close, positions)
+
+    # Bar returns +10%, -10%, 0, +10% held long, long, flat, short: pnl +10%, -10%, 0, -10%
+    pnl = np.array([0.1, -0.1, 0.0, -0.1])
+    assert metrics.pnl == pytest.approx(-10.0)
+    # Equity 1.1, 0.99, 0.99, 0.891 against the 1.1 peak
+    assert metrics.max_drawdown == pytest.approx((1.1 - 0.891) / 1.1 * 100)
+    assert metrics.trades == 2
+    assert metrics.exposure == 0.75
+    assert metrics.sharpe == pytest.approx(pnl.mean() / pnl.std())
+    assert metrics.sortino == pytest.approx(pnl.mean() / np.sqrt((np.minimum(pnl, 0) ** 2).mean()))
+
+
+def test_batch_rows_and_undefined_ratios(kernel):
+    close = np.array([100.0, 110.0, 99.0, 99.0, 108.9])
+    positions = np.array([[0, 0, 0, 0, 0], [1, 1, 0, -1, 0], [-1, 1, -1, 1, 1], [0, 0, 0, 1, 0]])
+
+    results = performance_batch(close, positions)
+
+    assert np.array_equal(results[0], np.zeros(6))
+    assert results[1] == pytest.approx(performance(close, positions[1]))
+    # Reversals count as trades; a series that never loses has no downside deviation
+    assert results[2, 2] == 4
+    assert tuple(results[3]) == pytest.approx((10.0, 0.0, 1, 0.25, np.mean([0, 0, 0, 0.1]) / np.std([0, 0, 0, 0.1]), 0.0))
@@ -0,0 +1,137 @@
+"""NSGA-II runs: parallel evaluation, the persistent fitness cache and checkpoints."""
+import random
+import sys
+import types
+import zipfile
+
+import numpy as np
+import pytest
+
+from conftest import minute_rows, random_walk
+from core.fitness_cache import code_version
+from core.optimizer import Nsga2
+from core.parallel import PopulationPool
+import strategies
+from services.storage import get_storage_client
+from strategies.base import AbstractStrategy
+from strategies.candles import candle_arrays
+from strategies.psar import PsarStrategy
+from strategies.sma import SmaStrategy
+
+ROWS = minute_rows(3000, seed=8)
+FIRST, LAST = int(ROWS[0, 0]), int(ROWS[-1, 0])
+
+
+@pytest.fixture
+def market(data_dir):
+    storage = get_storage_client('binance')
+    storage.create_dataset('BTCUSDT')
+    storage.write_data('BTCUSDT', ROWS)
+    return data_dir
+
+
+def optimizer(market, to_time: int = LAST, population_size: int = 10, name: str = 'run') -> Nsga2:
+    return Nsga2('binance', 'BTCUSDT', 'sma', '1m', FIRST, to_time, population_size, workers=1,
+                 fitness_store=str(market / f'{name}.sqlite'), checkpoint_path=str(market / f'{name}.json'))
+
+
+def test_pool_results_match_serial_evaluation_in_order():
+    candles = candle_arrays(random_walk(3000, seed=9))
+    strategy = SmaStrategy()
+    rng = random.Random(9)
+    params = [strategy.validate_params({'fast_ma': rng.randint(1, 200), 'slow_ma': rng.randint(1, 200)})
+              for _ in range(37)]
+
+    with PopulationPool('sma', candles, workers=2) as pool:
+        assert pool.evaluate(params) == strategy.backtest_batch(candles, params)
+
+
+def test_stored_results_are_reused_whatever_the_requested_end(market):
+    with optimizer(market) as first:
+        first.run(generations=2, mutation_rate=0.1)
+        known = len(first.fitness)
+
+    # A later end with no newer candles is the same data
+    with optimizer(market, to_time=LAST + 86_400_000) as second:
+        assert second.fitness.context == first.fitness.context
+        assert len(second.fitness) == known
+
+    with optimizer(market, to_time=LAST - 60_000) as shorter:
+        assert shorter.fitness.context != first.fitness.context
+        assert len(shorter.fitness) == 0
+
+
+def test_results_are_keyed_by_the_strategy_code():
+    assert code_version(SmaStrategy) == code_version(SmaStrategy)
+    assert code_version(SmaStrategy) != code_version(PsarStrategy)
+
+
+def compiled_strategy(monkeypatch, version=None) -> type:
+    """A strategy whose module has no source file, as with a compiled plugin."""
+    module = types.ModuleType('compiled_strategy')
+    if version is not None:
+        module.__version__ = version
+
+    class CompiledStrategy(AbstractStrategy):
+        def compute_positions(self, candles, **kwargs):
+            return np.zeros(len(candles.close))
+
+    CompiledStrategy.__module__ = module.__name__
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    return CompiledStrategy
+
+
+def test_strategies_without_source_are_keyed_by_their_version(tmp_path, monkeypatch):
+    archive = tmp_path / 'plugin.zip'
+    with zipfile.ZipFile(archive, 'w') as f:
+        f.writestr('zipped_strategy.py', 'from strategies.sma import SmaStrategy\n\n'
+                                         'class ZippedStrategy(SmaStrategy):\n    pass\n')
+    monkeypatch.syspath_prepend(str(archive))
+    monkeypatch.delitem(sys.modules, 'zipped_strategy', raising=False)
+    from zipped_strategy import ZippedStrategy
+
+    assert code_version(ZippedStrategy) not in (None, code_version(SmaStrategy))
+    assert code_version(compiled_strategy(monkeypatch, '1.0')) != code_version(compiled_strategy(monkeypatch, '1.1'))
+    assert code_version(compiled_strategy(monkeypatch)) is None
+
+
+def test_results_without_a_code_version_are_not_stored(market, monkeypatch):
+    monkeypatch.setitem(strategies._loaded, 'compiled', compiled_strategy(monkeypatch))
+
+    with Nsga2('binance', 'BTCUSDT', 'compiled', '1m', FIRST, LAST, 10, workers=1,
+               fitness_store=str(market / 'run.sqlite'), checkpoint_path=str(market / 'run.json')) as nsga2:
+        assert nsga2.fitness._db is None
+
+
+def test_close_releases_the_fitness_store(market):
+    with optimizer(market) as nsga2:
+        pass
+
+    assert nsga2.fitness._db is None
+
+
+def test_resumed_run_continues_as_if_never_stopped(market):
+    random.seed(0)
+    with optimizer(market, name='straight') as nsga2:
+        expected = [bt.parameters for bt in nsga2.run(generations=4, mutation_rate=0.1)]
+
+    random.seed(0)
+    with optimizer(market, name='stopped') as nsga2:
+        nsga2.run(generations=2, mutation_rate=0.1)
+    random.seed(1)
+    with optimizer(market, name='stopped') as nsga2:
+        resumed = [bt.parameters for bt in nsga2.run(generations=4, mutation_rate=0.1, resume=True)]
+
+    assert resumed == expected
+
+
+@pytest.mark.parametrize('population_size, mutation_rate', [(12, 0.1), (10, 0.2)])
+def test_resume_rejects_other_settings(market, population_size, mutation_rate):
+    with optimizer(market) as nsga2:
+        nsga2.run(generations=1, mutation_rate=0.1)
+        assert nsga2.checkpoint_mismatch(nsga2.load_checkpoint(), 0.1) is None
+
+    with optimizer(market, population_size=population_size) as nsga2:
+        assert nsga2.checkpoint_mismatch(nsga2.load_checkpoint(), mutation_rate) is not None
+        with pytest.raises(ValueError, match='Cannot resume'):
+            nsga2.run(generations=2, mutation_rate=mutation_rate, resume=True)
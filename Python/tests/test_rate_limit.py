@@ -0,0 +1,65 @@
+"""Token-bucket request budget."""
+import threading
+import time
+
+import pytest
+
+from exchanges.rate_limit import TokenBucket, get_rate_limiter
+
+
+def timed(function, *args) -> float:
+    start = time.monotonic()
+    function(*args)
+    return time.monotonic() - start
+
+
+def test_acquire_within_capacity_does_not_wait():
+    bucket = TokenBucket(10, period=1.0)
+
+    assert timed(lambda: [bucket.acquire(2) for _ in range(5)]) < 0.05
+    assert bucket.requests == 5
+
+
+def test_acquire_waits_for_the_refill():
+    bucket = TokenBucket(10, period=1.0)
+    bucket.acquire(10)
+
+    # 10 units per second: 3 more units take 0.3 s
+    assert timed(bucket.acquire, 3) == pytest.approx(0.3, abs=0.1)
+
+
+def test_pause_blocks_every_acquisition():
+    bucket = TokenBucket(1000, period=1.0)
+    bucket.pause(0.3)
+
+    assert timed(bucket.acquire, 1) >= 0.29
+    assert timed(bucket.acquire, 1) < 0.05
+
+
+def test_sync_used_drains_the_reported_weight():
+    bucket = TokenBucket(100, period=1.0)
+    bucket.sync_used(95)
+
+    assert bucket.tokens == 5
+    # 100 units per second: the 10 units lacking after the drain take about 0.1 s
+    assert timed(bucket.acquire, 15) == pytest.approx(0.1, abs=0.07)
+
+
+def test_threads_share_one_budget():
+    bucket = TokenBucket(10, period=1.0)
+    threads = [threading.Thread(target=bucket.acquire, args=(5,)) for _ in range(4)]
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 20 units from a bucket of 10 refilling 10 per second
+    assert time.monotonic() - start >= 0.95
+    assert bucket.requests == 4
+
+
+def test_clients_of_an_exchange_share_its_limiter():
+    assert get_rate_limiter('binance') is get_rate_limiter('binance')
+    assert get_rate_limiter('binance') is not get_rate_limiter('okx')
@@ -0,0 +1,43 @@
+"""Strategy registry: lazy imports and entry-point plugins."""
+import os
+import subprocess
+import sys
+from importlib.metadata import EntryPoint
+
+import pytest
+
+import strategies
+from strategies.sma import SmaStrategy
+
+
+@pytest.fixture
+def plugins(monkeypatch):
+    """Install `my_sma` (and a plugin shadowing the built-in `psar`) as entry points."""
+    monkeypatch.setattr(strategies, '_loaded', {})
+    registered = [EntryPoint('my_sma', 'strategies.sma:SmaStrategy', strategies.ENTRY_POINT_GROUP),
+                  EntryPoint('psar', 'strategies.sma:SmaStrategy', strategies.ENTRY_POINT_GROUP)]
+    monkeypatch.setattr(strategies, 'entry_points', lambda group: [ep for ep in registered if ep.group == group])
+
+
+def test_strategy_modules_are_imported_on_first_use():
+    code = ('import sys, strategies; '
+            'assert not [m for m in sys.modules if m.startswith("strategies.")], sys.modules; '
+            'strategies.get_strategy("sma"); '
+            'assert "strategies.sma" in sys.modules and "strategies.obv" not in sys.modules')
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(strategies.__file__)))
+
+
+def test_plugins_are_listed_after_the_builtins(plugins):
+    assert strategies.available_strategies() == [*strategies.BUILTIN_STRATEGIES, 'my_sma']
+
+
+def test_get_strategy_loads_builtins_and_plugins(plugins):
+    assert strategies.get_strategy('my_sma') is SmaStrategy
+    # A built-in name is never taken over by a plugin
+    assert strategies.get_strategy('psar').__name__ == 'PsarStrategy'
+    assert set(strategies._loaded) == {'my_sma', 'psar'}
+
+
+def test_unknown_strategy_raises(plugins):
+    with pytest.raises(KeyError, match='Strategy missing not found'):
+        strategies.get_strategy('missing')
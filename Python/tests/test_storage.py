@@ -0,0 +1,169 @@
+"""HDF5 and columnar candle stores."""
+import h5py
+import numpy as np
+import pytest
+
+from common.utils import resample_timeframe
+from conftest import minute_rows
+from services.columnar import ColumnarClient
+from services.database import (PYRAMID_TIMEFRAMES, Hdf5Client, _timeframe_path, aggregate_candles, compact_file,
+                               gap_summary, merge_rows)
+
+STORES = [Hdf5Client, ColumnarClient]
+
+
+def stored_rows(storage, timeframe: str = '1m') -> np.ndarray:
+    if isinstance(storage, Hdf5Client):
+        path = 'S' if timeframe == '1m' else _timeframe_path('S', timeframe)
+        return storage.file[path][:]
+    return storage._rows(storage._columns('S', timeframe), 0, 10 ** 9)
+
+
+def test_merge_rows_in_small_chunks():
+    rng = np.random.default_rng(0)
+    rows = minute_rows(500)
+    for _ in range(20):
+        stored = rows[np.sort(rng.choice(len(rows), int(rng.integers(0, 400)), replace=False))]
+        new = rows[np.sort(rng.choice(len(rows), int(rng.integers(1, 100)), replace=False))].copy()
+        new[:, 5] += 1  # a new row replaces the stored one
+        expected = np.concatenate([stored[~np.isin(stored[:, 0], new[:, 0])], new])
+        expected = expected[np.argsort(expected[:, 0])]
+
+        store = np.full((len(expected), 6), np.nan)
+        store[:len(stored)] = stored
+
+        def write(start, block):
+            store[start:start + len(block)] = block
+
+        merge_rows(stored[:, 0], new, lambda start, end: store[start:end].copy(), write, chunk_rows=7)
+
+        assert np.array_equal(store, expected)
+
+
+@pytest.mark.parametrize('store', STORES)
+def test_writes_in_any_order_keep_rows_metadata_and_pyramid(data_dir, store):
+    rng = np.random.default_rng(1)
+    rows = minute_rows(3 * 1440 + 100, start=1_600_000_000_000 + 7 * 60000)
+    storage = store('binance')
+    storage.create_dataset('S')
+    present = np.zeros(len(rows), dtype=bool)
+
+    # A middle block, appends, backfills, scattered fills and a full overlapping rewrite
+    batches = [np.arange(2000, 2500), np.arange(2500, 3000), np.arange(800, 2000), np.arange(0, 300)]
+    batches += [np.sort(rng.choice(len(rows), 300, replace=False)) for _ in range(3)]
+    batches += [np.arange(3000, len(rows)), np.arange(len(rows))]
+    for batch in batches:
+        storage.write_data('S', rows[batch])
+        present[batch] = True
+        expected = rows[present]
+
+        assert np.array_equal(stored_rows(storage), expected)
+        metadata = storage.get_metadata('S')
+        assert (metadata['gap_count'], metadata['missing_candles']) == gap_summary(expected[:, 0])
+        assert metadata['row_count'] == len(expected)
+        assert (metadata['first_timestamp'], metadata['last_timestamp']) == (expected[0, 0], expected[-1, 0])
+        for timeframe, width in PYRAMID_TIMEFRAMES.items():
+            assert np.array_equal(stored_rows(storage, timeframe), aggregate_candles(expected, width)), timeframe
+
+
+@pytest.mark.parametrize('store', STORES)
+def test_timeframe_queries_match_resampled_minutes(data_dir, store):
+    rng = np.random.default_rng(2)
+    rows = minute_rows(4 * 1440)
+    rows = rows[(rng.random(len(rows)) > 0.02) & ((np.arange(len(rows)) < 1000) | (np.arange(len(rows)) > 1500))]
+    storage = store('binance')
+    storage.create_dataset('S')
+    storage.write_data('S', rows)
+
+    for _ in range(20):
+        from_time, to_time = sorted(int(value) for value in rng.integers(rows[0, 0] - 3600000, rows[-1, 0] + 3600000, 2))
+        minutes = storage.get_data('S', from_time, to_time)
+        if minutes is None or len(minutes) == 0:
+            continue
+        for timeframe in ('5m', '1h', '4h', '1d'):
+            expected = resample_timeframe(minutes, timeframe)
+            buckets = storage.get_data('S', from_time, to_time, timeframe)
+
+            assert buckets.index.equals(expected.index), timeframe
+            assert np.allclose(buckets.values, expected.values, equal_nan=True, rtol=1e-12), timeframe
+
+
+def test_columnar_reader_keeps_its_snapshot_across_rewrites(data_dir):
+    rows = minute_rows(3 * 1440)
+    writer = ColumnarClient('binance')
+    writer.create_dataset('S')
+    writer.write_data('S', rows[2000:2500])
+    reader = ColumnarClient('binance', readonly=True)
+    snapshot = reader._columns('S')
+
+    writer.write_data('S', rows[2500:])
+    writer.write_data('S', rows[:2000])
+
+    assert np.array_equal(snapshot['timestamp'], rows[2000:2500, 0])
+    assert np.array_equal(snapshot['close'], rows[2000:2500, 4])
+    assert np.array_equal(reader.get_data('S', 0, 10 ** 14).values, rows[:, 1:])
+
+
+def test_writer_opens_after_a_reader_in_the_same_process(data_dir):
+    rows = minute_rows(10)
+    writer = Hdf5Client('binance')
+    writer.create_dataset('S')
+    writer.write_data('S', rows[:5])
+    writer.file.close()
+
+    reader = Hdf5Client('binance', readonly=True)
+    assert len(reader.get_data('S', 0, 10 ** 14)) == 5
+    Hdf5Client('binance').write_data('S', rows[5:])
+    assert len(reader.get_data('S', 0, 10 ** 14)) == 10
+
+
+def test_swmr_writer_creates_symbols_back_to_back(data_dir):
+    rows = minute_rows(10)
+    writer = Hdf5Client('binance')
+    for symbol in ('A', 'B'):
+        writer.create_dataset(symbol)
+        writer.start_swmr()
+        writer.write_data(symbol, rows)
+
+    reader = Hdf5Client('binance', readonly=True)
+    for symbol in ('A', 'B'):
+        assert np.array_equal(reader.get_data(symbol, 0, 10 ** 14).values, rows[:, 1:])
+
+
+def test_compaction_keeps_the_last_duplicate(data_dir):
+    with h5py.File(data_dir / 'binance.h5', 'w') as file:
+        file.create_dataset('S', data=np.array([[120000, 1, 1, 1, 1, 1], [60000, 2, 2, 2, 2, 2],
+                                                [120000, 9, 9, 9, 9, 9]], dtype=float), maxshape=(None, 6))
+
+    compact_file('binance')
+
+    storage = Hdf5Client('binance', readonly=True)
+    assert np.array_equal(storage.file['S'][:], [[60000, 2, 2, 2, 2, 2], [120000, 9, 9, 9, 9, 9]])
+
+
+def test_columnar_appends_update_the_open_bucket_in_place(data_dir):
+    rows = minute_rows(1440)
+    storage = ColumnarClient('binance')
+    storage.create_dataset('S')
+    storage.write_data('S', rows[:700])
+
+    for end in range(710, 1441, 10):
+        storage.write_data('S', rows[end - 10:end])
+
+    for timeframe in ('1m', *PYRAMID_TIMEFRAMES):
+        assert storage._read_meta('S', timeframe)['generation'] == 0, timeframe
+    assert np.array_equal(stored_rows(storage, '1h'), aggregate_candles(rows, PYRAMID_TIMEFRAMES['1h']))
+
+    # Rows before the open bucket still move to a new generation
+    storage.write_data('S', minute_rows(10, start=rows[0, 0] - 600000))
+    assert storage._read_meta('S', '1h')['generation'] == 1
+
+
+def test_columnar_reader_reports_missing_column_files(data_dir):
+    storage = ColumnarClient('binance')
+    storage.create_dataset('S')
+    storage.write_data('S', minute_rows(10))
+    (data_dir / 'binance_columnar' / 'S' / '1m' / 'close.bin').unlink()
+
+    with pytest.raises(FileNotFoundError, match='close.bin is missing'):
+        ColumnarClient('binance', readonly=True).get_data('S', 0, 10 ** 14)
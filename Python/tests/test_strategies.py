@@ -0,0 +1,327 @@
+"""Batched and rewritten strategies against the implementations they replaced."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategies.indicators
+import strategies.sma
+from conftest import random_walk
+from strategies.base import AbstractStrategy
+from strategies.candles import candle_arrays
+from strategies.ichimoku import IchimokuStrategy, ichimoku_batch
+from strategies.indicators import INDICATOR_CACHE, _sliding_extreme_kernel, _sliding_extreme_numpy
+from strategies.psar import PsarStrategy, _psar_batch_kernel, _psar_batch_numpy, psar_trend, psar_trend_batch
+from strategies.sma import SmaStrategy, sma_batch
+from strategies.support_resistance import SupResStrategy
+
+
+@pytest.fixture(autouse=True)
+def clear_indicator_cache():
+    INDICATOR_CACHE.clear()
+    yield
+    INDICATOR_CACHE.clear()
+
+
+def reference_psar(high, low, close, initial_af, max_af, increment):
+    """The original per-bar PsarStrategy._calculate_psar."""
+    n = len(close)
+    psar = np.zeros(n)
+    trend = np.zeros(n, dtype=int)
+    af = np.full(n, initial_af)
+    ep = np.zeros(n)
+
+    trend[0] = 1 if close[1] > close[0] else -1
+    psar[0] = low[0] if trend[0] > 0 else high[0]
+    ep[0] = high[0] if trend[0] > 0 else low[0]
+
+    for i in range(1, n):
+        psar[i] = psar[i-1] + af[i-1] * (ep[i-1] - psar[i-1])
+        if trend[i-1] > 0:
+            psar[i] = min(psar[i], low[i-1], low[i-2] if i > 1 else low[i-1])
+            if low[i] < psar[i]:
+                trend[i] = -1
+                psar[i] = ep[i-1]
+                ep[i] = low[i]
+                af[i] = initial_af
+            else:
+                trend[i] = trend[i-1]
+                ep[i] = max(ep[i-1], high[i])
+                af[i] = min(max_af, af[i-1] + increment) if ep[i] > ep[i-1] else af[i-1]
+        else:
+            psar[i] = max(psar[i], high[i-1], high[i-2] if i > 1 else high[i-1])
+            if high[i] > psar[i]:
+                trend[i] = 1
+                psar[i] = ep[i-1]
+                ep[i] = high[i]
+                af[i] = initial_af
+            else:
+                trend[i] = trend[i-1]
+                ep[i] = min(ep[i-1], low[i])
+                af[i] = min(max_af, af[i-1] + increment) if ep[i] < ep[i-1] else af[i-1]
+
+    return trend
+
+
+def reference_supres_trades(df, min_points, min_diff_points, rounding_nb, take_profit, stop_loss):
+    """PnL % of every trade of the original SupResStrategy.backtest loop."""
+    candle_length = df.index[1] - df.index[0]
+    pnl_list = []
+    trade_side = 0
+    entry_price = None
+
+    highs = df['high'].values
+    lows = df['low'].values
+    rounded_highs = ((df['high'] / rounding_nb).round() * rounding_nb).values
+    rounded_lows = ((df['low'] / rounding_nb).round() * rounding_nb).values
+    closes = df['close'].values
+    times = df.index
+
+    price_groups = {'supports': {}, 'resistances': {}}
+    levels = {'supports': [], 'resistances': []}
+    last_hl = {'supports': [], 'resistances': []}
+
+    for i in range(len(highs)):
+        timestamp = times[i]
+        for side in ['resistances', 'supports']:
+            is_res = (side == 'resistances')
+            price = highs[i] if is_res else lows[i]
+            rounded = rounded_highs[i] if is_res else rounded_lows[i]
+            close = closes[i]
+
+            breaks = sum(1 for p in last_hl[side] if (p > price if is_res else p < price))
+
+            if rounded in price_groups[side]:
+                grp = price_groups[side][rounded]
+                if grp['start_time'] is None and breaks < 3:
+                    grp['start_time'] = timestamp
+                if breaks < 3 and (grp['last'] is None or timestamp >= grp['last'] + min_diff_points * candle_length):
+                    grp['prices'].append(price)
+                    grp['last'] = timestamp
+                    if len(grp['prices']) >= min_points:
+                        extreme = max(grp['prices']) if is_res else min(grp['prices'])
+                        levels[side].append({'price': extreme, 'broken': False})
+            else:
+                if breaks < 3:
+                    price_groups[side][rounded] = {'prices': [price], 'start_time': timestamp, 'last': timestamp}
+
+            for grp in price_groups[side].values():
+                if grp['prices']:
+                    extreme = max(grp['prices']) if is_res else min(grp['prices'])
+                    if (is_res and price > extreme) or (not is_res and price < extreme):
+                        grp['prices'] = []
+                        grp['start_time'] = None
+                        grp['last'] = None
+
+            last_hl[side].append(price)
+            if len(last_hl[side]) > 10:
+                last_hl[side].pop(0)
+
+            for level in levels[side]:
+                if not level['broken']:
+                    breakout = close > level['price'] if is_res else close < level['price']
+                    if breakout:
+                        level['broken'] = True
+                        if trade_side == 0:
+                            entry_price = close
+                            trade_side = 1 if is_res else -1
+
+            if trade_side != 0 and entry_price:
+                tp_pct = take_profit / 100
+                sl_pct = stop_loss / 100
+                if trade_side == 1:
+                    if close >= entry_price * (1 + tp_pct) or close <= entry_price * (1 - sl_pct):
+                        pnl_list.append((close / entry_price - 1) * 100)
+                        trade_side = 0
+                        entry_price = None
+                elif trade_side == -1:
+                    if close <= entry_price * (1 - tp_pct) or close >= entry_price * (1 + sl_pct):
+                        pnl_list.append((entry_price / close - 1) * 100)
+                        trade_side = 0
+                        entry_price = None
+
+    return pnl_list
+
+
+def reference_ichimoku_signals(df, tenkan_period, kijun_period) -> pd.Series:
+    """Buy (1) / sell (-1) / none (0) of the original IchimokuStrategy.backtest, on the rows it kept."""
+    def donchian(period):
+        return (df['high'].rolling(period).max() + df['low'].rolling(period).min()) / 2
+
+    data = df.copy()
+    data['tenkan_sen'] = donchian(tenkan_period)
+    data['kijun_sen'] = donchian(kijun_period)
+    data['senkou_span_a'] = ((data['tenkan_sen'] + data['kijun_sen']) / 2).shift(kijun_period)
+    data['senkou_span_b'] = donchian(kijun_period * 2).shift(kijun_period)
+    data['chikou_span'] = data['close'].shift(kijun_period)
+    data.dropna(inplace=True)
+
+    tk_diff = data['tenkan_sen'] - data['kijun_sen']
+    tk_cross_up = (tk_diff > 0) & (tk_diff.shift(1) < 0)
+    tk_cross_down = (tk_diff < 0) & (tk_diff.shift(1) > 0)
+    above_cloud = (data['close'] > data['senkou_span_a']) & (data['close'] > data['senkou_span_b'])
+    below_cloud = (data['close'] < data['senkou_span_a']) & (data['close'] < data['senkou_span_b'])
+    return pd.Series(np.where(tk_cross_up & above_cloud & (data['close'] > data['chikou_span']), 1,
+                              np.where(tk_cross_down & below_cloud & (data['close'] < data['chikou_span']), -1, 0)),
+                     index=data.index)
+
+
+def random_params(rng, strategy, count):
+    params = strategy.get_params()
+    return [strategy.validate_params({name: round(float(rng.uniform(spec['min'], spec['max'])), 2)
+                                      if spec['type'] is float else int(rng.integers(spec['min'], spec['max'] + 1))
+                                      for name, spec in params.items()})
+            for _ in range(count)]
+
+
+def test_psar_matches_the_original_loop():
+    df = random_walk(2000, seed=1)
+    high, low, close = df['high'].values, df['low'].values, df['close'].values
+    params = random_params(np.random.default_rng(1), PsarStrategy(), 20)
+
+    for p in params:
+        assert np.array_equal(psar_trend(high, low, close, **p), reference_psar(high, low, close, **p)), p
+
+    table = np.array([[p['initial_af'], p['max_af'], p['increment']] for p in params])
+    assert np.array_equal(psar_trend_batch(high, low, close, table),
+                          [reference_psar(high, low, close, **p) for p in params])
+    for kernel in (_psar_batch_kernel, _psar_batch_numpy):
+        trends = np.zeros((len(params), len(close)), dtype=np.int64)
+        kernel(high, low, close, table, trends)
+        assert np.array_equal(trends, psar_trend_batch(high, low, close, table))
+
+
+def test_psar_batch_matches_single_backtests():
+    df = random_walk(3000, seed=2)
+    strategy = PsarStrategy()
+    params = random_params(np.random.default_rng(2), strategy, 30)
+
+    assert strategy.backtest_batch(candle_arrays(df), params) == [strategy.backtest(df, **p) for p in params]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_supres_trades_match_the_original_loop(seed):
+    rng = np.random.default_rng(seed)
+    df = random_walk(2000, seed=seed)
+    candles = candle_arrays(df)
+    strategy = SupResStrategy()
+
+    for _ in range(4):
+        p = {'min_points': int(rng.integers(1, 6)), 'min_diff_points': int(rng.integers(1, 15)),
+             'rounding_nb': int(rng.integers(5, 200)), 'take_profit': int(rng.integers(1, 15)),
+             'stop_loss': int(rng.integers(1, 15))}
+        assert strategy._trades(candles, **p) == reference_supres_trades(df, **p), p
+
+
+@pytest.mark.parametrize('numba', [True, False])
+def test_sma_batch_matches_single_backtests(numba, monkeypatch):
+    if numba and not strategies.sma.NUMBA_AVAILABLE:
+        pytest.skip('numba is not installed')
+    monkeypatch.setattr(strategies.sma, 'NUMBA_AVAILABLE', numba)
+    df = random_walk(4000, seed=3, freq='1h')
+    strategy = SmaStrategy()
+    rng = np.random.default_rng(3)
+    params = [strategy.validate_params({'fast_ma': int(fast), 'slow_ma': int(slow)})
+              for fast, slow in rng.integers(1, 201, (100, 2))]
+    params += [{'fast_ma': 5, 'slow_ma': 5}, {'fast_ma': 1, 'slow_ma': 1}, {'fast_ma': 3, 'slow_ma': 4000}]
+
+    batch = strategy.backtest_batch(candle_arrays(df), params)
+
+    assert np.allclose(batch, [strategy.backtest(df, **p) for p in params], rtol=1e-9, atol=1e-9)
+    # Memory budgets that force several window tables and scoring blocks
+    pairs = [(p['fast_ma'], p['slow_ma']) for p in params]
+    assert np.allclose(sma_batch(df['close'].values, pairs, memory_bytes=2 ** 16), batch, rtol=1e-9, atol=1e-9)
+
+
+def test_sma_single_backtest_keeps_the_original_pnl():
+    df = random_walk(3000, seed=4, freq='1h')
+    strategy = SmaStrategy()
+
+    for fast, slow in [(9, 26), (1, 2), (50, 200)]:
+        data = df[['close']].copy()
+        data['fast_ma'] = data['close'].rolling(fast).mean()
+        data['slow_ma'] = data['close'].rolling(slow).mean()
+        data = data.dropna()
+        signal = pd.Series(np.where(data['fast_ma'] > data['slow_ma'], 1, -1), index=data.index)
+        expected = (data['close'].pct_change() * signal.shift(1)).sum() * 100
+
+        assert strategy.backtest(df, fast_ma=fast, slow_ma=slow)[0] == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.parametrize('window', [1, 2, 3, 7, 26, 400, 1000, 1005])
+@pytest.mark.parametrize('highest', [True, False])
+def test_sliding_extremes_match_pandas(window, highest):
+    values = random_walk(1000, seed=5)['high'].values
+    rolling = pd.Series(values).rolling(window)
+    expected = (rolling.max() if highest else rolling.min()).values
+
+    assert np.array_equal(_sliding_extreme_kernel(values, window, highest), expected, equal_nan=True)
+    assert np.array_equal(_sliding_extreme_numpy(values, window, highest), expected, equal_nan=True)
+    assert np.array_equal(strategies.indicators.sliding_extreme(values, window, highest), expected, equal_nan=True)
+
+
+def test_ichimoku_positions_follow_the_original_signals():
+    df = random_walk(5000, seed=6)
+    strategy = IchimokuStrategy()
+    candles = candle_arrays(df)
+    pairs = [(9, 26), (5, 10), (3, 7), (20, 60), (1, 1)]
+
+    traded = 0
+    for tenkan, kijun in pairs:
+        positions = pd.Series(strategy.compute_positions(candles, tenkan_period=tenkan, kijun_period=kijun),
+                              index=df.index)
+        signals = reference_ichimoku_signals(df, tenkan, kijun)
+        signals = signals[signals != 0]
+        traded += len(signals)
+
+        # Each signal is taken on its own row and held until the next one; the last one has no
+        # exit and is not scored
+        assert (positions[signals.index[:-1]] == signals.iloc[:-1]).all()
+        changes = positions.index[positions.diff().fillna(positions.iloc[0]) != 0]
+        assert changes.isin(signals.index).all()
+        if len(signals):
+            assert (positions[signals.index[-1]:] == 0).all()
+    assert traded > 0
+
+
+def test_ichimoku_pnl_sums_the_bar_returns_between_signals():
+    df = random_walk(5000, seed=6)
+    close = df['close']
+    signals = reference_ichimoku_signals(df, 9, 26)
+    signals = signals[signals != 0]
+    assert len(signals) > 2
+
+    pnl, _ = IchimokuStrategy().backtest(df, tenkan_period=9, kijun_period=26)
+
+    held = sum(close.loc[entry:exit].pct_change().sum() * side
+               for (entry, side), exit in zip(signals.items(), signals.index[1:]))
+    assert pnl == pytest.approx(held * 100, rel=1e-9)
+    # Not the original score: one close-to-close return per signal, compounded within each holding
+    signal_to_signal = (close[signals.index].pct_change() * signals.shift(1)).sum()
+    assert pnl != pytest.approx(signal_to_signal * 100, rel=1e-6)
+
+
+def test_ichimoku_batch_matches_single_backtests():
+    df = random_walk(5000, seed=7)
+    strategy = IchimokuStrategy()
+    rng = np.random.default_rng(7)
+    params = [strategy.validate_params({'tenkan_period': int(tenkan), 'kijun_period': int(kijun)})
+              for tenkan, kijun in rng.integers(1, 200, (40, 2))]
+    params += [{'tenkan_period': 9, 'kijun_period': 26}, {'tenkan_period': 3, 'kijun_period': 5000}]
+    single = [strategy.backtest(df, **p) for p in params]
+    INDICATOR_CACHE.clear()
+
+    assert ichimoku_batch(candle_arrays(df), [(p['tenkan_period'], p['kijun_period']) for p in params]) == single
+
+
+def test_strategies_must_implement_a_backtest():
+    with pytest.raises(TypeError, match='must override'):
+        class Incomplete(AbstractStrategy):
+            def validate_params(self, params):
+                return params
+
+    class Legacy(AbstractStrategy):
+        def backtest(self, df, **kwargs):
+            return float(df['close'].iloc[-1] - df['close'].iloc[0]), 0.0
+
+    df = random_walk(10)
+    assert Legacy().backtest_arrays(candle_arrays(df)) == Legacy().backtest(df)